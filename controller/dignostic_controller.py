@@ -1,4 +1,4 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Request, Query
 from schema.dignostic_schema import RisqueMammaire
 import services.dignostic_service as ds
 
@@ -7,4 +7,8 @@ dignostic_router = APIRouter(prefix="/diagnostic",tags=["Dignostic"])
 @dignostic_router.post("/")
 def effectuer_dignostic(data:RisqueMammaire):
     return ds.effectuer_dignostic(data)
-    
\ No newline at end of file
+    
+
+@dignostic_router.post("/batch")
+async def effectuer_dignostic_batch(request: Request, format_lot: str | None = Query(None, alias="format")):
+    return await ds.effectuer_dignostic_batch(request, format_lot)
@@ -1,12 +1,206 @@
-from fastapi import APIRouter, UploadFile, File
+from fastapi import APIRouter, Depends, UploadFile, Request, Query
+from fastapi.responses import JSONResponse, StreamingResponse
+from python_multipart.multipart import parse_options_header
+from starlette.datastructures import Headers, UploadFile as FichierRecu
+from starlette.exceptions import HTTPException
+from starlette.formparsers import MultiPartParser, MultiPartException
 import services.imagerie_service as im
+from services.travaux_analyse import travaux
+
+
+class PartieTropVolumineuse(MultiPartException):
+    """Fichier dépassant sa taille maximale pendant la lecture du formulaire"""
+
+
+class ParseurAnalyse(MultiPartParser):
+    """
+    Formulaire /analyse : fichiers gardés en mémoire, taille de chaque fichier
+    comptée au fil de la lecture (limite selon son format, DICOM compris)
+    """
+    # Uploads gardés en mémoire jusqu'à la taille maximale acceptée
+    # (Starlette les déverse sur disque au-delà de 1 Mo par défaut)
+    spool_max_size = max(MultiPartParser.spool_max_size, im.TAILLE_UPLOAD_MAX)
+
+    def on_part_begin(self):
+        super().on_part_begin()
+        self.octets_partie = 0
+        self.taille_max_partie = im.TAILLE_UPLOAD_MAX
+        self.entete = [b"", b""]
+
+    def on_header_field(self, data, start, end):
+        super().on_header_field(data, start, end)
+        self.entete[0] += data[start:end]
+
+    def on_header_value(self, data, start, end):
+        super().on_header_value(data, start, end)
+        self.entete[1] += data[start:end]
+
+    def on_header_end(self):
+        super().on_header_end()
+        if self.entete[0].lower() == b"content-disposition":
+            _, options = parse_options_header(self.entete[1])
+            if b"filename" in options:
+                self.taille_max_partie = im.taille_max_fichier(options[b"filename"].decode("latin-1"))
+        self.entete = [b"", b""]
+
+    def on_part_data(self, data, start, end):
+        self.octets_partie += end - start
+        if self.octets_partie > self.taille_max_partie:
+            # Sous-classe de MultiPartException : le parseur ferme les fichiers déjà ouverts
+            raise PartieTropVolumineuse(f"Fichier trop volumineux (max {self.taille_max_partie // (1024 * 1024)} Mo)")
+        super().on_part_data(data, start, end)
+
+
+async def _flux_compte(request: Request, taille_max):
+    """Blocs du corps de la requête ; 413 dès que `taille_max` octets sont dépassés"""
+    recu = 0
+    async for bloc in request.stream():
+        recu += len(bloc)
+        if recu > taille_max:
+            raise HTTPException(status_code=413, detail=f"Requête trop volumineuse (max {taille_max // (1024 * 1024)} Mo)")
+        yield bloc
+
+
+async def formulaire_analyse(request: Request):
+    """
+    Dépendance : formulaire multipart des routes /analyse, lu avec ParseurAnalyse
+
+    Les fichiers sont fermés une fois la requête traitée.
+    """
+    if not request.headers.get("content-type", "").startswith("multipart/form-data"):
+        raise HTTPException(status_code=400, detail="Formulaire multipart/form-data attendu")
+    try:
+        formulaire = await ParseurAnalyse(request.headers, _flux_compte(request, im.TAILLE_REQUETE_MAX)).parse()
+    except PartieTropVolumineuse as exc:
+        raise HTTPException(status_code=413, detail=exc.message)
+    except MultiPartException as exc:
+        raise HTTPException(status_code=400, detail=exc.message)
+
+    try:
+        yield formulaire
+    finally:
+        await formulaire.close()
+
+
+def fichiers_formulaire(champ, plusieurs=False):
+    """Dépendance : fichier(s) du champ `champ` du formulaire /analyse (422 si absent)"""
+
+    async def extraire(formulaire=Depends(formulaire_analyse)):
+        fichiers = [valeur for valeur in formulaire.getlist(champ) if isinstance(valeur, FichierRecu)]
+        if not fichiers:
+            raise HTTPException(status_code=422, detail=f"Fichier manquant: {champ}")
+        return fichiers if plusieurs else fichiers[0]
+
+    return extraire
+
 
 analyse_router = APIRouter(prefix="/analyse",tags=["Analyse"])
 
+
+class LimiteTailleUpload:
+    """
+    Middleware ASGI : rejette les requêtes /analyse trop volumineuses
+
+    Un Content-Length trop grand est refusé avant la lecture du corps ; sans
+    Content-Length (envoi chunked), les octets reçus sont comptés et la
+    lecture s'arrête avec une 413 dès que la limite est dépassée.
+    """
+
+    def __init__(self, app, prefixe=analyse_router.prefix, taille_max=im.TAILLE_REQUETE_MAX):
+        self.app = app
+        self.prefixe = prefixe
+        self.taille_max = taille_max
+
+    def _trop_volumineux(self):
+        return HTTPException(status_code=413, detail=f"Requête trop volumineuse (max {self.taille_max // (1024 * 1024)} Mo)")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.prefixe):
+            return await self.app(scope, receive, send)
+
+        longueur = Headers(scope=scope).get("content-length")
+        if longueur is not None:
+            if not longueur.strip().isdigit():
+                reponse = JSONResponse(status_code=400, content={"detail": "En-tête Content-Length invalide"})
+                return await reponse(scope, receive, send)
+            if int(longueur) > self.taille_max:
+                erreur = self._trop_volumineux()
+                reponse = JSONResponse(status_code=erreur.status_code, content={"detail": erreur.detail})
+                return await reponse(scope, receive, send)
+
+        recu = 0
+
+        async def recevoir():
+            nonlocal recu
+            message = await receive()
+            if message["type"] == "http.request":
+                recu += len(message.get("body", b""))
+                if recu > self.taille_max:
+                    # Relevée telle quelle par FastAPI pendant la lecture du formulaire
+                    raise self._trop_volumineux()
+            return message
+
+        await self.app(scope, recevoir, send)
+
 @analyse_router.post("/")
-async def effectuer_analyse(image: UploadFile = File(...)):
+async def effectuer_analyse(
+    request: Request,
+    image: UploadFile = Depends(fichiers_formulaire("image")),
+    format_reponse: str | None = Query(None, alias="format"),
+    masque: str = Query("rle", pattern="^(rle|png)$"),
+    mode: str | None = Query(None, pattern="^(complet|deux_etapes)$"),
+):
+
+    return await im.effectuer_analyse(image, im.choisir_format(format_reponse, request.headers.get("accept")), masque, mode)
+
+
+@analyse_router.post("/batch")
+async def effectuer_analyse_batch(
+    request: Request,
+    images: list[UploadFile] = Depends(fichiers_formulaire("images", plusieurs=True)),
+    format_reponse: str | None = Query(None, alias="format"),
+    masque: str = Query("rle", pattern="^(rle|png)$"),
+    mode: str | None = Query(None, pattern="^(complet|deux_etapes)$"),
+):
+
+    return await im.effectuer_analyse_batch(images, im.choisir_format(format_reponse, request.headers.get("accept")), masque, mode)
+
+
+@analyse_router.get("/resultats/{resultat_id}/overlay")
+async def recuperer_overlay(resultat_id: str):
+
+    return await im.recuperer_overlay(resultat_id)
+
+
+# ---- 🕒 Analyses asynchrones
+@analyse_router.post("/jobs", status_code=202)
+async def soumettre_analyse(
+    request: Request,
+    image: UploadFile = Depends(fichiers_formulaire("image")),
+    format_reponse: str | None = Query(None, alias="format"),
+    masque: str = Query("rle", pattern="^(rle|png)$"),
+    mode: str | None = Query(None, pattern="^(complet|deux_etapes)$"),
+):
+
+    return await travaux.soumettre(image, im.choisir_format(format_reponse or im.FORMAT_COMPACT), masque, mode=mode)
+
+
+@analyse_router.get("/jobs/{job_id}")
+async def recuperer_analyse(job_id: str):
+
+    return await travaux.obtenir(job_id)
+
+
+@analyse_router.get("/jobs/{job_id}/events")
+async def suivre_analyse(job_id: str):
 
-    return await im.effectuer_analyse(image)
+    # 404 avant l'ouverture du flux
+    await travaux.obtenir(job_id)
+    return StreamingResponse(
+        travaux.evenements(job_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 
@@ -14,8 +14,8 @@ def effectuer_dignostic(data: PatientRisque):
     """
     Effectue un diagnostic de risque de cancer du sein basé sur :
     - Facteurs démographiques (âge, IMC)
-    - Antécédents (familiaux, personnels)
-    - Résultats d'examens (mammographie, échographie)
+    - Antécédents (familiaux, personnels, biopsies) et vie reproductive
+    - Densité mammaire
     - Biomarqueurs (ER, PR, HER2)
     - Facteurs génétiques
     - Mode de vie
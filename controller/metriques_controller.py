@@ -0,0 +1,8 @@
+from fastapi import APIRouter
+import services.metriques as metriques
+
+metriques_router = APIRouter(prefix="/metriques", tags=["Métriques"])
+
+@metriques_router.get("/")
+def recuperer_metriques():
+    return metriques.collecter()
@@ -0,0 +1,49 @@
+from typing import Annotated
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from starlette.concurrency import run_in_threadpool
+from schema.utilisateur_schema import UtilisateurResponse
+from controller.utilisateur_controller import get_current_admin
+from services.registre_modeles import registre
+
+modeles_router = APIRouter(prefix="/modeles", tags=["Modèles"])
+
+# ------------------------------------------------------
+# Versions, empreintes et mémoire des modèles du worker
+# ------------------------------------------------------
+@modeles_router.get("/")
+def recuperer_modeles():
+    return registre.etat()
+
+# ------------------------------------------------------
+# 🔄 Rechargement à chaud d'un modèle (admin uniquement)
+# ------------------------------------------------------
+@modeles_router.post("/{nom}/recharger")
+async def recharger_modele(
+    nom: str,
+    force: bool = Query(False),
+    current_user: Annotated[UtilisateurResponse, Depends(get_current_admin)] = None
+):
+    if nom not in registre.noms():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Modèle '{nom}' inconnu")
+
+    # Modèle servi par les workers du pool de processus : rechargé dans chacun d'eux
+    recharger_workers = registre.delegue(nom)
+    if recharger_workers is not None:
+        workers = await recharger_workers(nom, force)
+        if any("erreur" in worker for worker in workers):
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail={"message": "Échec du rechargement dans au moins un worker", "workers": workers}
+            )
+        return {"workers": workers}
+
+    try:
+        metadonnees = await run_in_threadpool(registre.recharger, nom, force=force)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Échec du rechargement, version précédente conservée: {str(e)}"
+        )
+
+    metadonnees.pop("objet")
+    return metadonnees
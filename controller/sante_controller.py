@@ -0,0 +1,20 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from services.cycle_vie_modeles import gestionnaire
+
+sante_router = APIRouter(prefix="/health", tags=["Santé"])
+
+# ------------------------------------------------------
+# Le processus répond (sonde de vivacité)
+# ------------------------------------------------------
+@sante_router.get("/live")
+def vivant():
+    return {"status": "ok"}
+
+# ------------------------------------------------------
+# Modèles chargés et préchauffés (sonde de disponibilité)
+# ------------------------------------------------------
+@sante_router.get("/ready")
+def pret():
+    contenu = {"status": "ready" if gestionnaire.pret() else "loading", "modeles": gestionnaire.etat()}
+    return JSONResponse(status_code=200 if gestionnaire.pret() else 503, content=contenu)
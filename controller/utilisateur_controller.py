@@ -1,7 +1,8 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
 from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
 from typing import Annotated
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 
 from schema.utilisateur_schema import UtilisateurRequest, UtilisateurResponse
 from services.utilisateurs_services import (
@@ -9,8 +10,11 @@ from services.utilisateurs_services import (
     verifier_user,
     create_access_token,
     decoded_token,
-    recuperer_user_par_email
+    recuperer_user_par_email,
+    claims_utilisateur
 )
+from services.import_utilisateurs import importer_utilisateurs, ImportTropVolumineux, ConflitImport, IMPORT_TAILLE_MAX
+from services.lecture_lots import recevoir_lot, lire_lignes
 from databases.connection import get_db
 
 routes = APIRouter(
@@ -24,9 +28,9 @@ auth_scheme = OAuth2PasswordBearer(tokenUrl="utilisateurs/token")
 # ------------------------------------------------------
 # 🔐 Récupération de l'utilisateur courant depuis le token
 # ------------------------------------------------------
-def get_current_user(
+async def get_current_user(
     token: Annotated[str, Depends(auth_scheme)],
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -34,33 +38,78 @@ def get_current_user(
         headers={"WWW-Authenticate": "Bearer"},
     )
     
-    user = decoded_token(token=token, db=db)
+    user = await decoded_token(token=token, db=db)
     if user is None:
         raise credentials_exception
     
     return user
 
+# ------------------------------------------------------
+# 🛡️ Utilisateur courant avec le rôle administrateur
+# ------------------------------------------------------
+def get_current_admin(
+    current_user: Annotated[UtilisateurResponse, Depends(get_current_user)]
+):
+    if current_user.role != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Accès réservé aux administrateurs",
+        )
+
+    return current_user
+
 # ------------------------------------------------------
 # 👤 Création d’un utilisateur (admin uniquement)
 # ------------------------------------------------------
 @routes.post("/", response_model=UtilisateurResponse)
-def create_users(
+async def create_users(
     utilisateurs: UtilisateurRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     # current_user: Annotated[UtilisateurResponse, Depends(get_current_user)] = None
 ):
     
-    return creer_utilisateurs(utilisateurs, db)
+    return await creer_utilisateurs(utilisateurs, db)
+
+# ------------------------------------------------------
+# 📥 Import d'utilisateurs en masse (admin uniquement)
+# ------------------------------------------------------
+@routes.post("/import")
+async def import_users(
+    request: Request,
+    current_admin: Annotated[UtilisateurResponse, Depends(get_current_admin)],
+    format_lot: str | None = Query(None, alias="format"),
+    tout_ou_rien: bool = Query(False, description="Ne rien créer si une ligne est en erreur"),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Crée les utilisateurs d'un fichier CSV, JSON ou NDJSON (champs nom, prenom,
+    email, password, role), envoyé en multipart (champ `fichier`) ou en corps brut.
+
+    Retourne un compte rendu par ligne : créée (avec son id) ou en erreur.
+    """
+    fichier, format_lot = await recevoir_lot(request, format_lot, taille_max=IMPORT_TAILLE_MAX)
+    try:
+        # Un tableau JSON est décodé ici, hors de la boucle asyncio
+        lignes = await run_in_threadpool(lire_lignes, fichier, format_lot)
+        return await importer_utilisateurs(lignes, db, tout_ou_rien)
+    except ImportTropVolumineux as e:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+    except ConflitImport as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Fichier illisible: {e}")
+    finally:
+        fichier.close()
 
 # ------------------------------------------------------
 # 🔑 Authentification / génération de token
 # ------------------------------------------------------
 @routes.post("/token")
-def login(
+async def login(
     request_form: Annotated[OAuth2PasswordRequestForm, Depends()],
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    user = verifier_user(db, request_form.username, request_form.password)
+    user = await verifier_user(db, request_form.username, request_form.password)
     
     if not user:
         raise HTTPException(
@@ -70,7 +119,7 @@ def login(
         )
     
     # Génération du token JWT
-    access_token = create_access_token(data={"sub": user.email})
+    access_token = create_access_token(data=claims_utilisateur(user))
     
     return {
         "access_token": access_token,
@@ -81,12 +130,12 @@ def login(
 # 📧 Récupération d'un utilisateur par email
 # ------------------------------------------------------
 @routes.get("/{email}", response_model=UtilisateurResponse)
-def get_user_by_email(
+async def get_user_by_email(
     email: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: Annotated[UtilisateurResponse, Depends(get_current_user)] = None
 ):
-    user = recuperer_user_par_email(email, db)
+    user = await recuperer_user_par_email(email, db)
 
     if not user:
         raise HTTPException(
@@ -1,8 +1,17 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from collections import deque
 from dotenv import load_dotenv
 import os
+import threading
+import time
+
+from services import metriques
 
 # Charger les variables d'environnement
 load_dotenv()
@@ -13,20 +22,191 @@ DB_HOST = os.getenv("DB_HOST", "localhost")
 DB_PORT = os.getenv("DB_PORT", "5432")
 DB_NAME = os.getenv("DB_NAME", "projet_fastapi")
 
-# Chaîne de connexion SQLAlchemy
-DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+# Pool de connexions (moteur asynchrone des endpoints)
+DB_POOL_TAILLE = int(os.getenv("DB_POOL_TAILLE", "5"))
+DB_POOL_DEBORDEMENT = int(os.getenv("DB_POOL_DEBORDEMENT", "10"))
+# Attente maximale d'une connexion libre (s)
+DB_POOL_ATTENTE_S = float(os.getenv("DB_POOL_ATTENTE_S", "30"))
+# Connexion testée avant usage (connexions coupées par le serveur ou un proxy)
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+# Durée de vie maximale d'une connexion (s, -1 = illimitée)
+DB_POOL_RECYCLAGE_S = int(os.getenv("DB_POOL_RECYCLAGE_S", "1800"))
+# statement_timeout PostgreSQL (ms, 0 = aucun)
+DB_TIMEOUT_REQUETE_MS = int(os.getenv("DB_TIMEOUT_REQUETE_MS", "0"))
+# Tables créées au démarrage des workers servant l'authentification
+# (0 = schéma géré à part, par exemple python -m scripts.creer_schema)
+DB_CREER_SCHEMA = os.getenv("DB_CREER_SCHEMA", "1") == "1"
+
+# Chaîne de connexion SQLAlchemy ; DATABASE_URL la remplace, par exemple
+# sqlite+aiosqlite:///./dev.db pour travailler sans PostgreSQL
+DATABASE_URL = os.getenv("DATABASE_URL") or f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+
+# Pilotes synchrone (création du schéma, scripts) et asynchrone (endpoints) de chaque base
+PILOTES = {"postgresql": ("psycopg2", "asyncpg"), "sqlite": ("pysqlite", "aiosqlite")}
+
+
+def _urls(url):
+    url = make_url(url)
+    synchrone, asynchrone = PILOTES.get(url.get_backend_name(), (None, None))
+    if synchrone is None:
+        return url, url
+    return url.set(drivername=f"{url.get_backend_name()}+{synchrone}"), \
+        url.set(drivername=f"{url.get_backend_name()}+{asynchrone}")
+
+
+URL_SYNCHRONE, URL_ASYNCHRONE = _urls(DATABASE_URL)
+EST_SQLITE = URL_ASYNCHRONE.get_backend_name() == "sqlite"
+
+
+class PoolMesure(AsyncAdaptedQueuePool):
+    """Pool asynchrone qui mesure l'attente d'une connexion (ouverture comprise)"""
 
-# Création du moteur
-engine = create_engine(DATABASE_URL)
+    def _do_get(self):
+        debut = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            mesures_pool.attente(time.perf_counter() - debut)
+
+
+def _options_moteur(asynchrone):
+    if EST_SQLITE:
+        # SQLite en mémoire : une seule connexion partagée (pool par défaut)
+        if asynchrone and URL_ASYNCHRONE.database not in (None, "", ":memory:"):
+            return {"poolclass": PoolMesure}
+        return {}
+    options = {
+        "pool_size": DB_POOL_TAILLE,
+        "max_overflow": DB_POOL_DEBORDEMENT,
+        "pool_timeout": DB_POOL_ATTENTE_S,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "pool_recycle": DB_POOL_RECYCLAGE_S,
+    }
+    if asynchrone:
+        options["poolclass"] = PoolMesure
+    if DB_TIMEOUT_REQUETE_MS:
+        if asynchrone:
+            options["connect_args"] = {"server_settings": {"statement_timeout": str(DB_TIMEOUT_REQUETE_MS)}}
+        else:
+            options["connect_args"] = {"options": f"-c statement_timeout={DB_TIMEOUT_REQUETE_MS}"}
+    return options
+
+
+# Création des moteurs
+engine = create_engine(URL_SYNCHRONE, **_options_moteur(False))
+async_engine = create_async_engine(URL_ASYNCHRONE, **_options_moteur(True))
 
 # Création de la base déclarative
 Base = declarative_base()
 
-# Création de la session
+# Création des sessions
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+
+class MesuresPool:
+    """
+    Attente d'une connexion du pool, connexions utilisées et latence des requêtes
+    du moteur asynchrone
+    """
+
+    def __init__(self, fenetre=512):
+        self.attentes = deque(maxlen=fenetre)
+        self.latences = deque(maxlen=fenetre)
+        self.requetes = 0
+        self.erreurs = 0
+        self.connexions_ouvertes = 0
+        self._verrou = threading.Lock()
+
+    def brancher(self, moteur):
+        moteur_sync = moteur.sync_engine
+
+        # Début porté par le contexte d'exécution de l'instruction : une
+        # instruction en échec n'en laisse pas sur la connexion
+        @event.listens_for(moteur_sync, "before_cursor_execute")
+        def avant(conn, cursor, statement, parameters, context, executemany):
+            if context is not None:
+                context._debut_requete = time.perf_counter()
+
+        @event.listens_for(moteur_sync, "after_cursor_execute")
+        def apres(conn, cursor, statement, parameters, context, executemany):
+            debut = getattr(context, "_debut_requete", None)
+            if debut is None:
+                return
+            duree = time.perf_counter() - debut
+            with self._verrou:
+                self.latences.append(duree)
+                self.requetes += 1
+
+        @event.listens_for(moteur_sync, "handle_error")
+        def erreur(contexte_exception):
+            with self._verrou:
+                self.erreurs += 1
+
+        @event.listens_for(moteur_sync.pool, "connect")
+        def connexion(dbapi_connection, connection_record):
+            self.connexions_ouvertes += 1
+
+    def attente(self, duree):
+        with self._verrou:
+            self.attentes.append(duree)
+
+    @staticmethod
+    def _percentiles(durees):
+        if not durees:
+            return {"p50_ms": None, "p99_ms": None, "max_ms": None}
+        triees = sorted(durees)
+        return {
+            "p50_ms": round(triees[len(triees) // 2] * 1000, 2),
+            "p99_ms": round(triees[min(len(triees) - 1, int(0.99 * len(triees)))] * 1000, 2),
+            "max_ms": round(triees[-1] * 1000, 2),
+        }
+
+    def statistiques(self):
+        pool = async_engine.sync_engine.pool
+        with self._verrou:
+            attentes, latences = list(self.attentes), list(self.latences)
+        return {
+            "pilote": URL_ASYNCHRONE.drivername,
+            "pool": pool.__class__.__name__,
+            "taille": getattr(pool, "size", lambda: None)(),
+            "debordement": getattr(pool, "overflow", lambda: None)(),
+            "connexions_utilisees": getattr(pool, "checkedout", lambda: None)(),
+            "connexions_ouvertes": self.connexions_ouvertes,
+            "attente_connexion": self._percentiles(attentes),
+            "requetes": self.requetes,
+            "erreurs": self.erreurs,
+            "latence_requetes": self._percentiles(latences),
+        }
+
+
+mesures_pool = MesuresPool()
+mesures_pool.brancher(async_engine)
+metriques.enregistrer("base_de_donnees", mesures_pool.statistiques)
+
+
+async def creer_schema():
+    """Crée les tables manquantes (CREATE TABLE IF NOT EXISTS)"""
+    # Import ici : les modèles importent Base depuis ce module
+    from model import utilisateur_model
+    async with async_engine.begin() as connexion:
+        await connexion.run_sync(Base.metadata.create_all)
+    # Index ajouté après coup : créé aussi sur une table existante
+    try:
+        async with async_engine.begin() as connexion:
+            await connexion.run_sync(utilisateur_model.email_minuscules.create, checkfirst=True)
+    except SQLAlchemyError as e:
+        print(f"⚠️ Index {utilisateur_model.email_minuscules.name} non créé (emails en double à la casse près ?): {e}")
+
 
 # Dépendance (utile dans FastAPI)
-def get_db():
+async def get_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+# Session synchrone (scripts, traitements hors requête)
+def get_db_sync():
     db = SessionLocal()
     try:
         yield db
@@ -1,22 +1,42 @@
+# Budget CPU du worker fixé avant l'import de numpy/torch/sklearn par les contrôleurs
+from services import ressources_cpu
+ressources_cpu.configurer()
 
+# Application assemblée selon les rôles du worker (APP_ROLES) : les contrôleurs
+# d'un rôle, et donc leurs dépendances (torch, cv2, sklearn...) et leurs
+# modèles, ne sont importés que si le rôle est servi. Par exemple :
+#   APP_ROLES=auth uvicorn main:app                       (sans torch ni sklearn)
+#   APP_ROLES=diagnostic,imagerie uvicorn main:app
+#   uvicorn main:creer_application --factory              (rôles de APP_ROLES)
+
+import importlib
+import os
+from contextlib import asynccontextmanager
+from dotenv import load_dotenv
 from fastapi.middleware.cors import CORSMiddleware
-from controller import utilisateur_controller,dignostic_controller,medecin_controller,imagerie_controller
 from fastapi import FastAPI,Depends
-from databases.connection import Base, engine
-
-Base.metadata.create_all(bind=engine)
-
-
-app = FastAPI()
-
-
-app.include_router(utilisateur_controller.routes)
-app.include_router(dignostic_controller.dignostic_router)
-app.include_router(medecin_controller.medecin_router)
-app.include_router(imagerie_controller.analyse_router)
+from databases.connection import async_engine, creer_schema, DB_CREER_SCHEMA
+from services.cycle_vie_modeles import gestionnaire
+from services.hachage_mots_de_passe import hachage
 
+load_dotenv()
 
+# Routeurs de chaque rôle ("module:attribut"), importés au montage
+ROLES = {
+    "auth": ["controller.utilisateur_controller:routes"],
+    "diagnostic": ["controller.dignostic_controller:dignostic_router",
+                   "controller.medecin_controller:medecin_router"],
+    "imagerie": ["controller.imagerie_controller:analyse_router"],
+}
+# Routeurs d'exploitation, servis par tous les workers
+ROUTEURS_COMMUNS = [
+    "controller.metriques_controller:metriques_router",
+    "controller.sante_controller:sante_router",
+    "controller.modeles_controller:modeles_router",
+]
 
+# Rôles servis par défaut (séparés par des virgules)
+APP_ROLES = os.getenv("APP_ROLES", ",".join(ROLES))
 
 origins = [
     "http://localhost.tiangolo.com",
@@ -28,10 +48,71 @@ origins = [
 ]
 
 
+def lire_roles(roles):
+    """
+    Raises:
+        ValueError: rôle inconnu ou aucun rôle
+    """
+    if isinstance(roles, str):
+        roles = roles.split(",")
+    roles = [role.strip() for role in roles if role.strip()]
+    inconnus = [role for role in roles if role not in ROLES]
+    if inconnus or not roles:
+        raise ValueError(f"APP_ROLES invalide: {', '.join(inconnus) or 'aucun rôle'} "
+                         f"(rôles acceptés: {', '.join(ROLES)})")
+    return [role for role in ROLES if role in roles]
+
+
+def _importer(cible):
+    module, attribut = cible.split(":")
+    return getattr(importlib.import_module(module), attribut)
+
+
+def creer_application(roles=None):
+    """
+    Args:
+        roles: Rôles servis (liste ou "auth,diagnostic"), par défaut APP_ROLES
+    """
+    roles = lire_roles(APP_ROLES if roles is None else roles)
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        # Schéma créé au démarrage (et non à l'import) par les workers qui servent la base
+        if "auth" in roles and DB_CREER_SCHEMA:
+            await creer_schema()
+        # Les modèles sont chargés et préchauffés en arrière-plan : le worker
+        # accepte les requêtes tout de suite, /health/ready passe à 200 une fois prêts
+        gestionnaire.demarrer()
+        if "imagerie" in roles:
+            from services.travaux_analyse import travaux
+            await travaux.demarrer()
+        yield
+        if "imagerie" in roles:
+            await travaux.arreter()
+        hachage.arreter()
+        # Connexions du pool fermées (les threads aiosqlite retiendraient le processus)
+        await async_engine.dispose()
+
+    app = FastAPI(lifespan=lifespan)
+    app.state.roles = roles
+
+    for role in roles:
+        for cible in ROLES[role]:
+            app.include_router(_importer(cible))
+    for cible in ROUTEURS_COMMUNS:
+        app.include_router(_importer(cible))
+
+    if "imagerie" in roles:
+        app.add_middleware(_importer("controller.imagerie_controller:LimiteTailleUpload"))
+
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=origins,
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"])
+
+    return app
+
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=origins,
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"])
\ No newline at end of file
+app = creer_application()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, func,Enum
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, func,Enum, Index
 from databases.connection import Base
 from sqlalchemy.orm import Mapped, mapped_column
 import enum
@@ -16,4 +16,7 @@ class Utilisateur(Base):
     prenom: Mapped[str] = mapped_column(String(100), nullable=False)
     email: Mapped[str] = mapped_column(String(100), unique=True, index=True, nullable=False)
     role: Mapped[str] = mapped_column(String, nullable=False, default="medecin")
-    password: Mapped[str] = mapped_column(String(200), nullable=False)
\ No newline at end of file
+    password: Mapped[str] = mapped_column(String(200), nullable=False)
+
+# Unicité sans distinction de casse, et index des recherches par lower(email)
+email_minuscules = Index("ix_Utilisateurs_email_lower", func.lower(Utilisateur.email), unique=True)
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, field_validator
 from typing import Optional
 import enum
 
@@ -15,10 +15,16 @@ class UtilisateurSchema(BaseModel):
     email: EmailStr
     role: Optional[str] ="medecin"  # par défaut "medecin"
 
+def normaliser_email(email):
+    """Emails comparés sans distinction de casse : stockés et recherchés en minuscules"""
+    return email.strip().lower() if email is not None else None
+
 # Schéma pour la création d'un utilisateur
 class UtilisateurRequest(UtilisateurSchema):
     password: str
 
+    _email_minuscules = field_validator("email")(normaliser_email)
+
 # Schéma pour la réponse API
 class UtilisateurResponse(UtilisateurSchema):
     id: int
@@ -33,3 +39,5 @@ class UpdateUtilisateur(BaseModel):
     email: Optional[EmailStr] = None
     role: Optional[RoleEnum] = None
     password: Optional[str] = None
+
+    _email_minuscules = field_validator("email")(normaliser_email)
@@ -0,0 +1,108 @@
+"""
+Compare les répartitions workers x threads torch sur le nœud courant
+
+Chaque worker simulé est un processus qui fixe son budget comme
+services/ressources_cpu.py (threads intra-op, BLAS, épinglage optionnel)
+puis enchaîne des inférences UNetLight. Les workers démarrent ensemble ;
+le débit global et les latences p50/p99 sont rapportés par configuration.
+
+Exemple :
+    python -m scripts.bench_cpu --configs 1x8,2x4,4x2,8x1 --taille 512 --requetes 20 --pinning
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import time
+
+
+def _worker(index, nb_workers, coeurs, pinning, taille, requetes, depart, resultats):
+    # Budget fixé avant l'import de torch, comme dans un worker uvicorn
+    os.environ["OMP_NUM_THREADS"] = str(len(coeurs))
+    os.environ["MKL_NUM_THREADS"] = str(len(coeurs))
+    if pinning:
+        os.sched_setaffinity(0, coeurs)
+
+    # L'import de charger_model applique le budget (appliquer_torch) depuis OMP_NUM_THREADS
+    import torch
+    from services.charger_model import UNetLight, inferer_lot
+
+    model = UNetLight()
+    model.eval()
+    import numpy as np
+    image = np.random.default_rng(index).integers(0, 255, (taille, taille), dtype=np.uint8)
+    inferer_lot(model, torch.device("cpu"), [image])  # préchauffage
+
+    depart.wait()
+    latences = []
+    for _ in range(requetes):
+        debut = time.perf_counter()
+        inferer_lot(model, torch.device("cpu"), [image])
+        latences.append((time.perf_counter() - debut) * 1000)
+    resultats.put(latences)
+
+
+def mesurer(nb_workers, threads, pinning, taille, requetes):
+    from services.ressources_cpu import repartir_coeurs
+
+    disponibles = sorted(os.sched_getaffinity(0))[:nb_workers * threads]
+    contexte = mp.get_context("spawn")
+    depart = contexte.Barrier(nb_workers + 1)
+    resultats = contexte.Queue()
+    processus = []
+    for index in range(nb_workers):
+        coeurs = repartir_coeurs(disponibles, nb_workers, index)[:threads]
+        p = contexte.Process(target=_worker, args=(index, nb_workers, coeurs, pinning, taille, requetes, depart, resultats))
+        p.start()
+        processus.append(p)
+
+    depart.wait(timeout=600)
+    debut = time.perf_counter()
+    latences = []
+    for _ in processus:
+        latences.extend(resultats.get())
+    duree = time.perf_counter() - debut
+    for p in processus:
+        p.join()
+
+    latences.sort()
+    return {
+        "workers": nb_workers,
+        "threads": threads,
+        "pinning": pinning,
+        "debit_img_s": round(len(latences) / duree, 2),
+        "p50_ms": round(latences[len(latences) // 2], 1),
+        "p99_ms": round(latences[min(len(latences) - 1, int(len(latences) * 0.99))], 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--configs", default=None,
+                        help="Répartitions 'workersxthreads' séparées par des virgules (défaut : diviseurs du nombre de cœurs)")
+    parser.add_argument("--taille", type=int, default=512, help="Côté des images (px)")
+    parser.add_argument("--requetes", type=int, default=20, help="Inférences par worker")
+    parser.add_argument("--pinning", action="store_true", help="Épingler chaque worker sur ses cœurs")
+    parser.add_argument("--rapport", default=None, help="Fichier JSON de sortie")
+    args = parser.parse_args()
+
+    nb_coeurs = len(os.sched_getaffinity(0))
+    if args.configs:
+        configs = [tuple(int(v) for v in c.split("x")) for c in args.configs.split(",")]
+    else:
+        configs = [(w, nb_coeurs // w) for w in range(1, nb_coeurs + 1) if nb_coeurs % w == 0]
+
+    lignes = []
+    print(f"{'workers':>8} {'threads':>8} {'débit img/s':>12} {'p50 ms':>8} {'p99 ms':>8}")
+    for nb_workers, threads in configs:
+        ligne = mesurer(nb_workers, threads, args.pinning, args.taille, args.requetes)
+        lignes.append(ligne)
+        print(f"{ligne['workers']:>8} {ligne['threads']:>8} {ligne['debit_img_s']:>12} {ligne['p50_ms']:>8} {ligne['p99_ms']:>8}")
+
+    if args.rapport:
+        with open(args.rapport, "w") as f:
+            json.dump(lignes, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
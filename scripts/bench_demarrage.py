@@ -0,0 +1,78 @@
+"""
+Démarrage à froid d'un worker selon ses rôles (APP_ROLES)
+
+Chaque mesure est un nouveau processus Python qui importe main avec les
+rôles demandés, exécute le démarrage de l'application (lifespan) puis
+attend que les modèles soient chargés et préchauffés. Sont rapportés les
+médianes du temps d'import, du démarrage, du temps jusqu'à /health/ready,
+la mémoire du processus prêt et les bibliothèques lourdes importées.
+
+La base de l'environnement est utilisée (schéma créé par les rôles auth),
+par exemple DATABASE_URL=sqlite+aiosqlite:///./dev.db.
+
+Exemple :
+    python -m scripts.bench_demarrage --roles auth diagnostic imagerie auth,diagnostic,imagerie --repetitions 3
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BIBLIOTHEQUES_LOURDES = ("torch", "torchvision", "cv2", "sklearn", "pandas", "scipy", "joblib")
+
+# Exécuté dans le processus mesuré
+MESURE = f"""
+import asyncio, json, sys, time
+debut = time.perf_counter()
+import main
+importe = time.perf_counter()
+
+async def demarrer():
+    async with main.app.router.lifespan_context(main.app):
+        demarre = time.perf_counter()
+        await asyncio.to_thread(main.gestionnaire.attendre)
+        pret = time.perf_counter()
+        from services.registre_modeles import memoire_processus
+        return demarre, pret, memoire_processus(), main.gestionnaire.pret()
+
+demarre, pret, memoire, modeles_prets = asyncio.run(demarrer())
+print(json.dumps({{
+    "import_s": importe - debut,
+    "demarrage_s": demarre - importe,
+    "pret_s": pret - debut,
+    "modeles_prets": modeles_prets,
+    "rss_mo": memoire.get("rss_mo", memoire.get("rss_max_mo")),
+    "routes": len(main.app.routes),
+    "bibliotheques": [nom for nom in {BIBLIOTHEQUES_LOURDES!r} if nom in sys.modules],
+}}))
+"""
+
+
+def mesurer(roles):
+    env = {**os.environ, "APP_ROLES": roles}
+    resultat = subprocess.run([sys.executable, "-c", MESURE], env=env, capture_output=True, text=True)
+    if resultat.returncode != 0:
+        raise RuntimeError(f"Échec du démarrage ({roles}):\n{resultat.stderr[-2000:]}")
+    return json.loads(resultat.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--roles", nargs="+", default=["auth", "diagnostic", "imagerie", "auth,diagnostic,imagerie"],
+                        help="Jeux de rôles à comparer (un par worker simulé)")
+    parser.add_argument("--repetitions", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'rôles':<28} {'import':>8} {'démarrage':>10} {'prêt':>8} {'RSS':>9}  bibliothèques lourdes")
+    for roles in args.roles:
+        mesures = [mesurer(roles) for _ in range(args.repetitions)]
+        mediane = lambda cle: statistics.median(m[cle] for m in mesures)
+        print(f"{roles:<28} {mediane('import_s'):>7.2f}s {mediane('demarrage_s'):>9.2f}s {mediane('pret_s'):>7.2f}s "
+              f"{mediane('rss_mo'):>6.0f} Mo  {', '.join(mesures[-1]['bibliotheques']) or '-'}"
+              f"{'' if all(m['modeles_prets'] for m in mesures) else '  (modèles en erreur)'}")
+
+
+if __name__ == "__main__":
+    main()
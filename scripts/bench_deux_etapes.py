@@ -0,0 +1,127 @@
+"""
+Compare l'analyse en deux étapes à l'inférence pleine résolution
+
+Pour chaque image de l'échantillon : latence des deux modes, accord des
+masques binaires (Dice) et des détections (rappel/précision des boîtes
+appariées par IoU), et recours à l'inférence complète (candidats trop étendus).
+
+Exemple :
+    python -m scripts.bench_deux_etapes --images dataset_mammo/b3 --nb 20 --rapport deux_etapes.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import time
+from pathlib import Path
+import cv2
+import numpy as np
+
+from services import grossier_fin
+from services.charger_model import charger_modele, inferer_lot, device
+from services.imagerie_service import analyser_masque
+
+EXTENSIONS = {".jpg", ".jpeg", ".png"}
+
+
+def iou(a, b):
+    x0, y0 = max(a["x"], b["x"]), max(a["y"], b["y"])
+    x1 = min(a["x"] + a["width"], b["x"] + b["width"])
+    y1 = min(a["y"] + a["height"], b["y"] + b["height"])
+    inter = max(0, x1 - x0) * max(0, y1 - y0)
+    union = a["width"] * a["height"] + b["width"] * b["height"] - inter
+    return inter / union if union else 0.0
+
+
+def accord_detections(reference, candidates, seuil_iou):
+    """Nombre de détections de référence retrouvées, et de candidates appariées"""
+    retrouvees = sum(1 for r in reference if any(iou(r, c) >= seuil_iou for c in candidates))
+    appariees = sum(1 for c in candidates if any(iou(c, r) >= seuil_iou for r in reference))
+    return retrouvees, appariees
+
+
+def dice(a, b):
+    total = int(a.sum()) + int(b.sum())
+    return 1.0 if total == 0 else 2.0 * int(np.logical_and(a, b).sum()) / total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", required=True, help="Dossier d'images (jpg/png)")
+    parser.add_argument("--nb", type=int, default=20, help="Nombre maximal d'images")
+    parser.add_argument("--threshold", type=float, default=0.5)
+    parser.add_argument("--min-area", type=int, default=50)
+    parser.add_argument("--iou", type=float, default=0.3, help="IoU minimale pour apparier deux boîtes")
+    parser.add_argument("--rapport", default=None, help="Fichier JSON de sortie")
+    args = parser.parse_args()
+
+    model = charger_modele(device)
+
+    def inferer(img):
+        return inferer_lot(model, device, [img])[0]
+
+    chemins = sorted(p for p in Path(args.images).iterdir() if p.suffix.lower() in EXTENSIONS)[:args.nb]
+    if not chemins:
+        raise SystemExit(f"Aucune image trouvée dans {args.images}")
+
+    lignes = []
+    nb_ref = nb_cand = nb_retrouvees = nb_appariees = 0
+    for chemin in chemins:
+        img = cv2.imread(str(chemin), cv2.IMREAD_GRAYSCALE)
+        inferer(grossier_fin.reduire(img))  # préchauffage
+
+        debut = time.perf_counter()
+        pred_complet = inferer(img)
+        duree_complet = time.perf_counter() - debut
+
+        debut = time.perf_counter()
+        pred_deux = grossier_fin.inferer_deux_etapes(img, inferer, args.threshold)
+        duree_deux = time.perf_counter() - debut
+
+        boites = grossier_fin.recadrages(inferer(grossier_fin.reduire(img)), img.shape, args.threshold)
+        with contextlib.redirect_stdout(io.StringIO()):
+            bin_complet, det_complet = analyser_masque(pred_complet, args.threshold, args.min_area)
+            bin_deux, det_deux = analyser_masque(pred_deux, args.threshold, args.min_area)
+
+        retrouvees, appariees = accord_detections(det_complet, det_deux, args.iou)
+        nb_ref += len(det_complet)
+        nb_cand += len(det_deux)
+        nb_retrouvees += retrouvees
+        nb_appariees += appariees
+
+        lignes.append({
+            "image": chemin.name,
+            "forme": list(img.shape),
+            "complet_ms": round(duree_complet * 1000, 1),
+            "deux_etapes_ms": round(duree_deux * 1000, 1),
+            "couverture": round(grossier_fin.couverture(boites, img.shape), 3),
+            "dice": round(dice(bin_complet, bin_deux), 4),
+            "detections_complet": len(det_complet),
+            "detections_deux_etapes": len(det_deux),
+            "retrouvees": retrouvees,
+        })
+        print(f"{chemin.name}: {lignes[-1]['complet_ms']} ms -> {lignes[-1]['deux_etapes_ms']} ms, "
+              f"couverture {lignes[-1]['couverture']}, dice {lignes[-1]['dice']}, "
+              f"détections {len(det_complet)} / {len(det_deux)}")
+
+    complet = np.array([l["complet_ms"] for l in lignes])
+    deux = np.array([l["deux_etapes_ms"] for l in lignes])
+    synthese = {
+        "images": len(lignes),
+        "complet_p50_ms": round(float(np.percentile(complet, 50)), 1),
+        "deux_etapes_p50_ms": round(float(np.percentile(deux, 50)), 1),
+        "acceleration_moyenne": round(float(np.mean(complet / deux)), 2),
+        "dice_moyen": round(float(np.mean([l["dice"] for l in lignes])), 4),
+        "rappel_detections": round(nb_retrouvees / nb_ref, 4) if nb_ref else 1.0,
+        "precision_detections": round(nb_appariees / nb_cand, 4) if nb_cand else 1.0,
+        "repli_complet": sum(1 for l in lignes if l["couverture"] > grossier_fin.GROSSIER_COUVERTURE_MAX),
+    }
+    print(json.dumps(synthese, indent=2))
+
+    if args.rapport:
+        with open(args.rapport, "w") as f:
+            json.dump({"synthese": synthese, "images": lignes}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Moteur de règles vectorisé contre le calcul patient par patient
+
+Le calcul de référence est la chaîne de if/elif historique de
+medecin_service, appliquée objet par objet aux mêmes règles. Pour chaque
+taille de lot, compare les scores (écart maximal) et les durées :
+- reference : un PatientRisque après l'autre ;
+- moteur_patient : moteur.evaluer_patient, un patient après l'autre ;
+- moteur_lot : moteur.evaluer sur le lot en colonnes, en une passe.
+
+Exemple :
+    python -m scripts.bench_regles --tailles 1,1000,1000000
+"""
+import argparse
+import time
+import numpy as np
+
+from schema.dignostic_schema import PatientRisque
+from services.regles_cliniques import moteur, MUTATIONS
+
+MODALITES = {
+    "antecedents_familiaux": ["Oui", "Non"],
+    "antecedents_personnels": ["Oui", "Non"],
+    "statut_er": ["Positif", "Négatif"],
+    "statut_pr": ["Positif", "Négatif"],
+    "expression_her2": ["Positif", "Négatif"],
+    "densite_mammaire": ["a (presque entièrement graisseuse)", "b (densité fibroglandulaire dispersée)",
+                         "c (densité hétérogène)", "d (extrêmement dense)"],
+    "mutation_genetique": ["Aucune", "BRCA1", "BRCA2", "Autre (TP53, PTEN, etc.)"],
+    "tabagisme": ["Non-fumeur", "Ex-fumeur", "Fumeur"],
+    "consommation_alcool": ["Aucune", "Occasionnelle (<1 verre/semaine)", "Modérée (1-7 verres/semaine)",
+                            "Élevée (>7 verres/semaine)"],
+    "activite_physique": ["Intense (>300 min/semaine)", "Modérée (150-300 min/semaine)",
+                          "Légère (<150 min/semaine)", "Sédentaire"],
+}
+
+
+def score_reference(data):
+    """Calcul objet par objet (chaîne de conditions historique)"""
+    score = 0.0
+    if data.age >= 50:
+        score += 15
+    elif data.age >= 40:
+        score += 10
+    elif data.age >= 30:
+        score += 5
+    if data.antecedents_familiaux == "Oui":
+        score += 20
+    if data.antecedents_personnels == "Oui":
+        score += 15
+    score += min(data.nombre_biopsies * 3, 10)
+    if data.age_premieres_menstruations < 12:
+        score += 5
+    if data.age_premier_enfant > 30:
+        score += 5
+    if data.nombre_enfants == 0:
+        score += 3
+    if data.statut_er == "Positif":
+        score += 4
+    if data.statut_pr == "Positif":
+        score += 4
+    if data.expression_her2 == "Positif":
+        score += 4
+    score += {"a": 0, "b": 2, "c": 5, "d": 8}.get(data.densite_mammaire[:1], 0)
+    if data.mutation_genetique in MUTATIONS:
+        score += 25
+    if data.imc > 30:
+        score += 3
+    if data.tabagisme == "Fumeur":
+        score += 3
+    if data.consommation_alcool.startswith(("Modérée", "Élevée")):
+        score += 2
+    score += {"Légère (<150 min/semaine)": 1, "Sédentaire": 2}.get(data.activite_physique, 0)
+    return min(score, 100)
+
+
+def generer(n, rng):
+    colonnes = {
+        "age": rng.integers(20, 90, n),
+        "nombre_biopsies": rng.integers(0, 6, n),
+        "age_premieres_menstruations": rng.integers(9, 17, n),
+        "age_premier_enfant": rng.integers(0, 45, n),
+        "nombre_enfants": rng.integers(0, 5, n),
+        "imc": rng.uniform(16, 42, n).round(1),
+    }
+    for champ, modalites in MODALITES.items():
+        colonnes[champ] = np.array(modalites, dtype=object)[rng.integers(0, len(modalites), n)]
+    return colonnes
+
+
+def patients(colonnes, n):
+    fixes = dict(risque_5_10_ans_pourcent=0.0, recommandation_clinique="", frequence_surveillance="",
+                 categorie_risque="")
+    listes = {champ: valeurs.tolist() for champ, valeurs in colonnes.items()}
+    return [PatientRisque(**{champ: listes[champ][i] for champ in listes}, **fixes) for i in range(n)]
+
+
+def chronometrer(fonction):
+    debut = time.perf_counter()
+    resultat = fonction()
+    return resultat, time.perf_counter() - debut
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tailles", default="1,1000,1000000")
+    parser.add_argument("--max-objets", type=int, default=200000,
+                        help="Au-delà, les calculs par objet sont mesurés sur cet échantillon puis extrapolés")
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+
+    print(f"{'patients':>9} | {'reference':>12} | {'moteur_patient':>14} | {'moteur_lot':>12} | {'écart max':>9}")
+    for n in (int(t) for t in args.tailles.split(",")):
+        colonnes = generer(n, rng)
+        (scores, _), duree_lot = chronometrer(lambda: moteur.evaluer(colonnes))
+
+        m = min(n, args.max_objets)
+        objets = patients({champ: valeurs[:m] for champ, valeurs in colonnes.items()}, m)
+        reference, duree_ref = chronometrer(lambda: [score_reference(p) for p in objets])
+        unitaires, duree_patient = chronometrer(lambda: [moteur.evaluer_patient(p)[0] for p in objets])
+        ecart = max(np.max(np.abs(scores[:m] - reference)), np.max(np.abs(scores[:m] - unitaires)))
+
+        extrapole = "*" if m < n else " "
+        print(f"{n:>9} | {duree_ref * n / m * 1000:>10.2f}ms{extrapole}| {duree_patient * n / m * 1000:>12.2f}ms{extrapole}"
+              f"| {duree_lot * 1000:>10.2f}ms | {ecart:>9.2g}")
+    print("* extrapolé depuis l'échantillon --max-objets")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+"""
+Crée les tables manquantes de la base (DATABASE_URL ou DB_*)
+
+À lancer une fois par déploiement quand les workers démarrent avec
+DB_CREER_SCHEMA=0 : aucun worker ne touche alors au schéma à son démarrage.
+
+Exemple :
+    python -m scripts.creer_schema
+"""
+import asyncio
+
+from databases.connection import creer_schema, async_engine, URL_ASYNCHRONE
+
+
+async def main():
+    try:
+        await creer_schema()
+    finally:
+        await async_engine.dispose()
+    print(f"Schéma à jour ({URL_ASYNCHRONE.render_as_string(hide_password=True)})")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
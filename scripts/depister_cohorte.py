@@ -0,0 +1,41 @@
+"""
+Re-score tout un registre de patients avec les règles de /medecin
+
+Lit un CSV ou un Parquet par paquets, valide chaque ligne (PatientRisque),
+calcule score, catégorie et recommandations dans un pool de processus et
+écrit les résultats au fil de l'eau (CSV ou NDJSON, d'après l'extension).
+Les colonnes risque_5_10_ans_pourcent, recommandation_clinique,
+frequence_surveillance et categorie_risque sont recalculées : elles peuvent
+manquer dans le registre. Après un arrêt, --reprendre repart du dernier
+paquet écrit.
+
+Exemple :
+    python -m scripts.depister_cohorte registre.csv resultats.csv --processus 8
+    python -m scripts.depister_cohorte registre.parquet resultats.ndjson --reprendre
+"""
+import argparse
+
+from services.depistage_cohorte import depister, FORMATS_ENTREE, FORMATS_SORTIE
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("entree", help="Registre .csv ou .parquet")
+    parser.add_argument("sortie", help="Résultats .csv ou .ndjson")
+    parser.add_argument("--format-entree", choices=FORMATS_ENTREE, default=None)
+    parser.add_argument("--format-sortie", choices=FORMATS_SORTIE, default=None)
+    parser.add_argument("--taille-paquet", type=int, default=5000, help="Lignes par tâche du pool")
+    parser.add_argument("--processus", type=int, default=None, help="Taille du pool (défaut : nombre de cœurs)")
+    parser.add_argument("--reprendre", action="store_true", help="Repartir du point de reprise de la sortie")
+    parser.add_argument("--progression", type=float, default=5.0, help="Intervalle des messages de progression (s)")
+    args = parser.parse_args()
+
+    try:
+        depister(args.entree, args.sortie, args.format_entree, args.format_sortie, args.taille_paquet,
+                 args.processus, args.reprendre, args.progression)
+    except (ValueError, OSError) as e:
+        raise SystemExit(str(e))
+
+
+if __name__ == "__main__":
+    main()
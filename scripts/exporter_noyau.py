@@ -0,0 +1,42 @@
+"""
+Exporte le modèle de risque tabulaire en noyau numpy (.npz)
+
+Lit l'estimateur joblib et l'encodeur one-hot, compile la disposition des
+colonnes et écrit les tableaux de l'estimateur dans un fichier .npz chargé
+par le service quand DIAGNOSTIC_NOYAU=1. À relancer après chaque
+réentraînement (le service signale un noyau exporté d'un autre modèle).
+
+Exemple :
+    python -m scripts.exporter_noyau
+    python -m scripts.verifier_noyau
+"""
+import argparse
+import joblib
+
+from services.dignostic_service import CHEMIN_MODELE, CHEMIN_NOYAU
+from services.noyau_diagnostic import exporter, NoyauRisque
+from services.registre_modeles import empreinte_fichier
+from services.vectoriseur_diagnostic import VectoriseurRisque, CHEMIN_ENCODEUR
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modele", default=CHEMIN_MODELE, help="Estimateur sklearn (.joblib)")
+    parser.add_argument("--encodeur", default=CHEMIN_ENCODEUR, help="Encodeur one-hot (.joblib)")
+    parser.add_argument("--sortie", default=CHEMIN_NOYAU, help="Noyau exporté (.npz)")
+    args = parser.parse_args()
+
+    modele = joblib.load(args.modele)
+    vectoriseur = VectoriseurRisque.depuis_artefacts(joblib.load(args.encodeur), modele)
+    try:
+        exporter(modele, vectoriseur, args.sortie, empreinte_fichier(args.modele))
+    except ValueError as e:
+        raise SystemExit(str(e))
+
+    noyau = NoyauRisque.charger(args.sortie)
+    print(f"{type(modele).__name__} exporté ({noyau.entete['type']}, "
+          f"{len(vectoriseur.colonnes)} colonnes) -> {args.sortie}")
+
+
+if __name__ == "__main__":
+    main()
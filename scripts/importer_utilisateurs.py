@@ -0,0 +1,60 @@
+"""
+Crée en masse les utilisateurs d'un fichier CSV, JSON ou NDJSON
+
+Même traitement que POST /utilisateurs/import : validation ligne à ligne,
+hachage parallèle, une requête d'unicité, insertion multi-lignes dans une
+transaction. Le compte rendu (une ligne NDJSON par utilisateur, puis le
+résumé) est écrit sur la sortie standard ou dans --rapport.
+
+Exemple :
+    python -m scripts.importer_utilisateurs clinique.csv --rapport import.ndjson
+"""
+import argparse
+import asyncio
+import json
+import sys
+
+from databases.connection import AsyncSessionLocal, async_engine
+from services.hachage_mots_de_passe import hachage
+from services.import_utilisateurs import importer_utilisateurs, ImportTropVolumineux, ConflitImport
+from services.lecture_lots import detecter_format, lire_lignes, FORMATS
+
+
+async def importer(chemin, format_lot, tout_ou_rien):
+    try:
+        with open(chemin, "rb") as fichier:
+            async with AsyncSessionLocal() as db:
+                return await importer_utilisateurs(lire_lignes(fichier, format_lot), db, tout_ou_rien)
+    finally:
+        hachage.arreter()
+        await async_engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("entree", help="Fichier .csv, .json ou .ndjson/.jsonl")
+    parser.add_argument("--format", choices=FORMATS, default=None, help="Format (défaut : d'après l'extension)")
+    parser.add_argument("--tout-ou-rien", action="store_true", help="Ne rien créer si une ligne est en erreur")
+    parser.add_argument("--rapport", default=None, help="Compte rendu NDJSON (défaut : sortie standard)")
+    args = parser.parse_args()
+
+    try:
+        format_lot = detecter_format(args.entree, None, args.format)
+        rapport = asyncio.run(importer(args.entree, format_lot, args.tout_ou_rien))
+    except (ValueError, ImportTropVolumineux, ConflitImport, OSError) as e:
+        raise SystemExit(str(e))
+
+    sortie = open(args.rapport, "w", encoding="utf-8") if args.rapport else sys.stdout
+    try:
+        for ligne in rapport["lignes"]:
+            sortie.write(json.dumps(ligne, ensure_ascii=False) + "\n")
+        sortie.write(json.dumps({"resume": rapport["resume"]}, ensure_ascii=False) + "\n")
+    finally:
+        if args.rapport:
+            sortie.close()
+    print(f"{rapport['resume']['crees']} utilisateur(s) créé(s), {rapport['resume']['erreurs']} erreur(s)",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Mémoire par worker avec et sans projection des modèles en mémoire
+
+Lance N processus (comme N workers uvicorn) qui chargent les modèles via le
+registre, d'abord avec MODELES_MMAP=0 (copie privée par worker) puis avec
+MODELES_MMAP=1 (pages partagées), et rapporte pour chacun la mémoire avant
+et après chargement. Le PSS répartit les pages partagées entre les
+processus : sa somme est la mémoire physique réellement occupée.
+
+Exemple :
+    python -m scripts.mesurer_memoire_modeles --workers 4 --modeles unet,diagnostic,encodeur
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+
+
+def _worker(mmap, modeles, pret, fin, resultats):
+    os.environ["MODELES_MMAP"] = "1" if mmap else "0"
+    from services.registre_modeles import registre, memoire_processus
+    import services.charger_model  # noqa: F401  (enregistre "unet")
+    import services.dignostic_service  # noqa: F401  (enregistre les modèles tabulaires)
+
+    avant = memoire_processus()
+    for nom in modeles:
+        registre.obtenir(nom)
+    # Les poids projetés ne sont comptés qu'une fois lus : une inférence les touche tous
+    if "unet" in modeles:
+        services.charger_model.prechauffer()
+
+    pret.wait()
+    resultats.put({"pid": os.getpid(), "avant": avant, "apres": memoire_processus()})
+    fin.wait()
+
+
+def mesurer(mmap, workers, modeles):
+    contexte = mp.get_context("spawn")
+    pret = contexte.Barrier(workers + 1)
+    fin = contexte.Barrier(workers + 1)
+    resultats = contexte.Queue()
+    processus = [contexte.Process(target=_worker, args=(mmap, modeles, pret, fin, resultats)) for _ in range(workers)]
+    for p in processus:
+        p.start()
+
+    # Mesures prises pendant que tous les workers sont vivants (pages partagées)
+    pret.wait(timeout=600)
+    lignes = [resultats.get() for _ in processus]
+    fin.wait()
+    for p in processus:
+        p.join()
+    return lignes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--modeles", default="unet,diagnostic,encodeur", help="Noms du registre, séparés par des virgules")
+    parser.add_argument("--rapport", default=None, help="Fichier JSON de sortie")
+    args = parser.parse_args()
+    modeles = args.modeles.split(",")
+
+    rapport = {}
+    for mmap in (False, True):
+        lignes = mesurer(mmap, args.workers, modeles)
+        mode = "mmap" if mmap else "copie"
+        rapport[mode] = lignes
+        print(f"--- {mode} ({args.workers} workers)")
+        for ligne in lignes:
+            print(f"  pid {ligne['pid']}: RSS {ligne['avant']['rss_mo']} -> {ligne['apres']['rss_mo']} Mo, "
+                  f"PSS {ligne['avant']['pss_mo']} -> {ligne['apres']['pss_mo']} Mo, "
+                  f"partagé {ligne['apres']['partage_mo']} Mo")
+        print(f"  PSS total: {round(sum(l['apres']['pss_mo'] for l in lignes), 1)} Mo")
+
+    if args.rapport:
+        with open(args.rapport, "w") as f:
+            json.dump(rapport, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
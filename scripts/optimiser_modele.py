@@ -0,0 +1,166 @@
+"""
+Construit un artefact UNetLight optimisé pour le service CPU et son rapport de parité
+
+Exemple :
+    python -m scripts.optimiser_modele --calibration dataset_mammo/b3 --mode int8 \
+        --sortie unet_mammo_int8.pt --rapport rapport_int8.json
+
+La parité et la latence sont mesurées sur des images non vues pendant la
+calibration : le dossier --parite, ou à défaut une part (--part-parite) des
+images de --calibration mise de côté avant la calibration.
+
+Le service charge l'artefact avec UNET_ARTEFACT=unet_mammo_int8.pt
+(et UNET_BF16=1 pour l'autocast bfloat16 sur les poids float32).
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+import cv2
+import numpy as np
+import torch
+
+from services.charger_model import UNetLight, UNET_POIDS
+from services.modele_optimise import fusionner, quantifier_int8, compiler
+
+EXTENSIONS = {".jpg", ".jpeg", ".png"}
+
+
+def charger_images(dossier, nb_max, taille_max):
+    """Charge les images du dossier en tensors 1x1xHxW normalisés (0-1)"""
+    images = []
+    for chemin in sorted(Path(dossier).iterdir()):
+        if chemin.suffix.lower() not in EXTENSIONS:
+            continue
+        img = cv2.imread(str(chemin), cv2.IMREAD_GRAYSCALE)
+        if img is None:
+            continue
+        echelle = taille_max / max(img.shape)
+        if echelle < 1:
+            img = cv2.resize(img, None, fx=echelle, fy=echelle, interpolation=cv2.INTER_AREA)
+        images.append(torch.from_numpy(img).float().div_(255.0)[None, None])
+        if len(images) >= nb_max:
+            break
+
+    if not images:
+        raise SystemExit(f"Aucune image trouvée dans {dossier}")
+    return images
+
+
+def separer(images, part):
+    """
+    Sépare les images en (calibration, parité) : une image sur round(1/part)
+    est mise de côté, réparties sur tout le dossier
+    """
+    if len(images) < 2:
+        raise SystemExit("Au moins 2 images sont nécessaires pour séparer calibration et parité (ou utiliser --parite)")
+    if not 0 < part < 1:
+        raise SystemExit("--part-parite doit être comprise entre 0 et 1")
+    # Au moins une image de parité, même sur un petit dossier
+    pas = min(max(2, round(1 / part)), len(images))
+    parite = images[pas - 1::pas]
+    calibration = [img for i, img in enumerate(images) if i % pas != pas - 1]
+    return calibration, parite
+
+
+def mesurer(modele, images, bf16=False, repetitions=3):
+    """Retourne les masques prédits et les latences (ms) par image"""
+    masques, latences = [], []
+    with torch.no_grad(), torch.autocast("cpu", dtype=torch.bfloat16, enabled=bf16):
+        modele(images[0])  # préchauffage
+        for img in images:
+            debut = time.perf_counter()
+            for _ in range(repetitions):
+                pred = modele(img)
+            latences.append((time.perf_counter() - debut) * 1000 / repetitions)
+            masques.append(pred.float()[0, 0].numpy())
+    return masques, latences
+
+
+def dice_iou(reference, candidat, seuil=0.5):
+    a = reference > seuil
+    b = candidat > seuil
+    inter = np.logical_and(a, b).sum()
+    union = np.logical_or(a, b).sum()
+    total = a.sum() + b.sum()
+    dice = 1.0 if total == 0 else 2 * inter / total
+    iou = 1.0 if union == 0 else inter / union
+    return float(dice), float(iou)
+
+
+def resumer(reference, masques, latences):
+    scores = [dice_iou(r, m) for r, m in zip(reference, masques)]
+    return {
+        "dice_moyen": float(np.mean([d for d, _ in scores])),
+        "dice_min": float(np.min([d for d, _ in scores])),
+        "iou_moyen": float(np.mean([i for _, i in scores])),
+        "ecart_proba_max": float(max(np.abs(r - m).max() for r, m in zip(reference, masques))),
+        "latence_ms_mediane": float(np.median(latences)),
+        "latence_ms_p95": float(np.percentile(latences, 95)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--poids", default=UNET_POIDS, help="Poids float32 (state dict)")
+    parser.add_argument("--calibration", required=True, help="Dossier d'images de calibration")
+    parser.add_argument("--parite", help="Dossier d'images de parité / latence (par défaut : part de --calibration)")
+    parser.add_argument("--part-parite", type=float, default=0.25,
+                        help="Part des images de --calibration mise de côté pour la parité, sans --parite")
+    parser.add_argument("--mode", choices=["fusion", "int8"], default="int8")
+    parser.add_argument("--moteur", default="x86", help="Moteur quantifié (x86, fbgemm, qnnpack)")
+    parser.add_argument("--nb-images", type=int, default=32)
+    parser.add_argument("--taille-max", type=int, default=1024, help="Plus grand côté des images (px)")
+    parser.add_argument("--bf16", action="store_true", help="Mesurer aussi l'autocast bfloat16")
+    parser.add_argument("--sortie", default="unet_mammo_optimise.pt")
+    parser.add_argument("--rapport", default="rapport_optimisation.json")
+    args = parser.parse_args()
+
+    modele = UNetLight()
+    modele.load_state_dict(torch.load(args.poids, map_location="cpu"))
+    modele.eval()
+
+    images = charger_images(args.calibration, args.nb_images, args.taille_max)
+    if args.parite:
+        calibration = images
+        parite = charger_images(args.parite, args.nb_images, args.taille_max)
+    else:
+        calibration, parite = separer(images, args.part_parite)
+    print(f"{len(calibration)} image(s) de calibration, {len(parite)} image(s) de parité")
+
+    if args.mode == "int8":
+        optimise = quantifier_int8(modele, calibration, args.moteur)
+    else:
+        optimise = fusionner(modele)
+    artefact = compiler(optimise)
+    torch.jit.save(artefact, args.sortie)
+    print(f"Artefact enregistré : {args.sortie}")
+
+    # Parité et latence sur les images mises de côté uniquement
+    reference, latences_ref = mesurer(modele, parite)
+    rapport = {
+        "mode": args.mode,
+        "artefact": args.sortie,
+        "nb_images_calibration": len(calibration),
+        "nb_images_parite": len(parite),
+        "parite": args.parite or f"{args.calibration} (images mises de côté)",
+        "threads_torch": torch.get_num_threads(),
+        "float32": {
+            "latence_ms_mediane": float(np.median(latences_ref)),
+            "latence_ms_p95": float(np.percentile(latences_ref, 95)),
+        },
+    }
+    masques, latences = mesurer(torch.jit.load(args.sortie), parite)
+    rapport[args.mode] = resumer(reference, masques, latences)
+
+    if args.bf16:
+        masques, latences = mesurer(modele, parite, bf16=True)
+        rapport["bf16"] = resumer(reference, masques, latences)
+
+    with open(args.rapport, "w") as f:
+        json.dump(rapport, f, indent=2)
+    print(json.dumps(rapport, indent=2))
+
+
+if __name__ == "__main__":
+    main()
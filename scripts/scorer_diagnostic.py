@@ -0,0 +1,46 @@
+"""
+Score hors ligne un fichier de RisqueMammaire (tableau JSON, NDJSON ou CSV)
+
+Même validation et même évaluation par paquets que /diagnostic/batch ;
+les résultats sont écrits en NDJSON (une ligne par patiente, erreurs
+comprises, puis une ligne de résumé).
+
+Exemple :
+    python -m scripts.scorer_diagnostic campagne.csv --sortie scores.ndjson
+"""
+import argparse
+import sys
+import time
+
+from services.dignostic_service import generer_ndjson, TAILLE_PAQUET
+from services.lecture_lots import detecter_format, lire_lignes, FORMATS
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("entree", help="Fichier .json, .ndjson/.jsonl ou .csv")
+    parser.add_argument("--format", choices=FORMATS, default=None, help="Format (défaut : d'après l'extension)")
+    parser.add_argument("--sortie", default=None, help="Fichier NDJSON de sortie (défaut : sortie standard)")
+    parser.add_argument("--taille-paquet", type=int, default=TAILLE_PAQUET, help="Lignes par appel au modèle")
+    args = parser.parse_args()
+
+    try:
+        format_lot = detecter_format(args.entree, None, args.format)
+    except ValueError as e:
+        raise SystemExit(str(e))
+
+    debut = time.perf_counter()
+    with open(args.entree, "rb") as fichier:
+        sortie = open(args.sortie, "w", encoding="utf-8") if args.sortie else sys.stdout
+        try:
+            for bloc in generer_ndjson(lire_lignes(fichier, format_lot), args.taille_paquet):
+                sortie.write(bloc)
+        finally:
+            if args.sortie:
+                sortie.close()
+
+    print(f"Lot évalué en {time.perf_counter() - debut:.2f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Vérifie que le noyau numpy reproduit model.predict sur une grille d'entrées
+
+La grille croise toutes les modalités de RisqueMammaire avec plusieurs
+valeurs de chaque variable numérique (bornes du schéma comprises). Les
+scores du noyau sont comparés à ceux de l'estimateur sklearn, ligne par
+ligne et en lot, puis les latences d'un appel unitaire sont comparées.
+Des estimateurs de référence (arbre, forêt, gradient boosting) ajustés sur
+la même grille vérifient aussi l'export des arbres. Code de sortie 1 en cas d'écart.
+
+Exemple :
+    python -m scripts.verifier_noyau --tolerance 1e-9
+"""
+import argparse
+import itertools
+import os
+import sys
+import tempfile
+import time
+import typing
+import joblib
+import numpy as np
+
+from schema.dignostic_schema import RisqueMammaire
+from services.dignostic_service import CHEMIN_MODELE, CHEMIN_NOYAU
+from services.noyau_diagnostic import exporter, NoyauRisque
+from services.vectoriseur_diagnostic import VectoriseurRisque, CHEMIN_ENCODEUR, COLONNES_CATEGORIELLES
+
+NUMERIQUES = {
+    "age": [25, 40, 55, 70, 85],
+    "imc": [0.0, 18.5, 24.9, 31.2, 45.0],
+    "age_premieres_regles": [0, 11, 13, 25],
+    "age_premier_enfant": [12, 25, 35, 50],
+    "nb_enfants": [0, 1, 3, 8],
+}
+
+
+def grille(vectoriseur):
+    modalites = [typing.get_args(RisqueMammaire.model_fields[champ].annotation) for champ in COLONNES_CATEGORIELLES]
+    lignes = []
+    for valeurs in itertools.product(*NUMERIQUES.values()):
+        for combinaison in itertools.product(*modalites):
+            lignes.append({**dict(zip(NUMERIQUES, valeurs)), **dict(zip(COLONNES_CATEGORIELLES, combinaison))})
+    return vectoriseur.matrice(lignes)
+
+
+def comparer(nom, modele, noyau, x, tolerance):
+    attendu = modele.predict(x)
+    obtenu = noyau.predict(x)
+    unitaires = np.array([noyau.predict(x[i])[0] for i in range(0, len(x), 97)])
+    ecart = max(np.max(np.abs(attendu - obtenu)), np.max(np.abs(attendu[::97] - unitaires)))
+    arrondis = np.count_nonzero(np.round(attendu, 2) != np.round(obtenu, 2))
+    ok = ecart <= tolerance and arrondis == 0
+    print(f"{nom}: {len(x)} lignes, écart max {ecart:.3g}, scores arrondis différents {arrondis} "
+          f"-> {'OK' if ok else 'ÉCART'}")
+    return ok
+
+
+def latence(fonction, x, repetitions=2000):
+    for _ in range(50):
+        fonction(x)
+    debut = time.perf_counter()
+    for _ in range(repetitions):
+        fonction(x)
+    return (time.perf_counter() - debut) / repetitions * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modele", default=CHEMIN_MODELE)
+    parser.add_argument("--noyau", default=CHEMIN_NOYAU)
+    parser.add_argument("--tolerance", type=float, default=1e-9, help="Écart absolu maximal toléré")
+    args = parser.parse_args()
+
+    modele = joblib.load(args.modele)
+    vectoriseur = VectoriseurRisque.depuis_artefacts(joblib.load(CHEMIN_ENCODEUR), modele)
+    noyau = NoyauRisque.charger(args.noyau)
+    if noyau.vectoriseur.disposition() != vectoriseur.disposition():
+        print("Disposition des colonnes différente de celle du modèle : noyau à réexporter")
+        sys.exit(1)
+
+    x = grille(vectoriseur)
+    succes = comparer(f"{type(modele).__name__} ({args.noyau})", modele, noyau, x, args.tolerance)
+
+    # Export des arbres, sur des estimateurs ajustés à la grille
+    from sklearn.ensemble import GradientBoostingRegressor, RandomForestRegressor
+    from sklearn.tree import DecisionTreeRegressor
+    y = modele.predict(x) + np.random.default_rng(0).normal(0, 1, len(x))
+    references = [
+        DecisionTreeRegressor(max_depth=12, random_state=0),
+        RandomForestRegressor(n_estimators=30, max_depth=10, random_state=0),
+        GradientBoostingRegressor(n_estimators=60, max_depth=4, random_state=0),
+    ]
+    with tempfile.TemporaryDirectory() as dossier:
+        for reference in references:
+            reference.fit(x, y)
+            chemin = os.path.join(dossier, "reference.npz")
+            exporter(reference, vectoriseur, chemin)
+            succes &= comparer(type(reference).__name__, reference, NoyauRisque.charger(chemin), x, args.tolerance)
+
+    ligne = x[:1]
+    print(f"Latence unitaire : sklearn {latence(modele.predict, ligne):.1f} µs, "
+          f"noyau {latence(noyau.predict, ligne):.1f} µs")
+    sys.exit(0 if succes else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Vérifie les endpoints /utilisateurs sur le moteur asynchrone, sans PostgreSQL
+
+L'application (rôle auth) est démarrée sur une base SQLite temporaire via
+aiosqlite : création d'utilisateurs, email en double (casse comprise),
+connexion, token, lecture d'un utilisateur, puis mesures du pool (/metriques). Une instruction
+en échec est aussi exécutée pour vérifier que la latence des requêtes
+suivantes reste mesurée. Code de sortie 1 si une vérification échoue.
+
+Exemple :
+    python -m scripts.verifier_utilisateurs_sqlite
+"""
+import os
+import shutil
+import sys
+import tempfile
+import warnings
+
+# Configuration fixée avant l'import de l'application (lue à l'import des modules)
+_dossier = tempfile.mkdtemp(prefix="verif_utilisateurs_")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(_dossier, 'utilisateurs.db')}"
+os.environ["APP_ROLES"] = "auth"
+os.environ.setdefault("SECRET_KEY", "verification-" + "x" * 32)
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("HACHAGE_BCRYPT_COUT", "4")
+
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+import main
+from databases.connection import AsyncSessionLocal, mesures_pool
+
+echecs = []
+
+
+def verifier(description, condition, detail=""):
+    print(f"{'OK ' if condition else 'ÉCHEC'} {description}{f' ({detail})' if detail and not condition else ''}")
+    if not condition:
+        echecs.append(description)
+
+
+async def instruction_en_echec():
+    async with AsyncSessionLocal() as db:
+        try:
+            await db.execute(text("SELECT * FROM table_inexistante"))
+        except Exception:
+            await db.rollback()
+        await db.execute(text("SELECT 1"))
+
+
+def main_verification():
+    warnings.filterwarnings("ignore")
+    with TestClient(main.app, raise_server_exceptions=False) as client:
+        admin = dict(nom="Admin", prenom="A", email="admin@clinique.fr", role="admin", password="secret")
+        r = client.post("/utilisateurs/", json=admin)
+        verifier("création d'un administrateur", r.status_code == 200, r.text)
+        r = client.post("/utilisateurs/", json=dict(nom="Med", prenom="M", email="med@clinique.fr", password="pw"))
+        verifier("création d'un utilisateur au rôle par défaut", r.status_code == 200 and r.json()["role"] == "medecin", r.text)
+        r = client.post("/utilisateurs/", json=admin)
+        verifier("email en double refusé", r.status_code >= 400, r.status_code)
+
+        r = client.post("/utilisateurs/token", data=dict(username="admin@clinique.fr", password="secret"))
+        verifier("connexion", r.status_code == 200, r.text)
+        entetes = {"Authorization": f"Bearer {r.json().get('access_token')}"}
+        r = client.post("/utilisateurs/token", data=dict(username="admin@clinique.fr", password="faux"))
+        verifier("mot de passe incorrect refusé", r.status_code == 401, r.status_code)
+
+        r = client.get("/utilisateurs/med@clinique.fr", headers=entetes)
+        verifier("lecture d'un utilisateur", r.status_code == 200 and r.json()["email"] == "med@clinique.fr", r.text)
+        r = client.get("/utilisateurs/inconnu@clinique.fr", headers=entetes)
+        verifier("utilisateur inconnu", r.status_code == 404, r.status_code)
+
+        r = client.post("/utilisateurs/", json=dict(nom="Casse", prenom="C", email="Jean.Dupont@Clinique.fr", password="pw"))
+        verifier("email enregistré en minuscules", r.status_code == 200 and r.json()["email"] == "jean.dupont@clinique.fr", r.text)
+        r = client.post("/utilisateurs/", json=dict(nom="Casse", prenom="C", email="JEAN.DUPONT@clinique.fr", password="pw"))
+        verifier("email en double à la casse près refusé", r.status_code >= 400, r.status_code)
+        r = client.post("/utilisateurs/token", data=dict(username="JEAN.Dupont@clinique.FR", password="pw"))
+        verifier("connexion sans distinction de casse", r.status_code == 200, r.text)
+        r = client.get("/utilisateurs/MED@clinique.fr", headers=entetes)
+        verifier("lecture sans distinction de casse", r.status_code == 200, r.status_code)
+
+        avant = client.get("/metriques/").json()["base_de_donnees"]
+        client.portal.call(instruction_en_echec)
+        apres = client.get("/metriques/").json()["base_de_donnees"]
+        verifier("instruction en échec comptée", apres["erreurs"] > avant["erreurs"], apres)
+        verifier("requêtes suivantes mesurées", apres["requetes"] > avant["requetes"], apres)
+        latences = list(mesures_pool.latences)
+        verifier("latences positives et plausibles", all(0 <= duree < 5 for duree in latences), latences[-5:])
+
+        verifier("pilote asynchrone", apres["pilote"] == "sqlite+aiosqlite", apres["pilote"])
+        verifier("pool mesuré", apres["pool"] == "PoolMesure" and apres["attente_connexion"]["p50_ms"] is not None, apres)
+        verifier("aucune connexion retenue après les requêtes", apres["connexions_utilisees"] == 0, apres)
+
+    print(f"{'Toutes les vérifications sont passées' if not echecs else f'{len(echecs)} vérification(s) en échec'}"
+          f" ({os.environ['DATABASE_URL']})")
+    shutil.rmtree(_dossier, ignore_errors=True)
+    sys.exit(1 if echecs else 0)
+
+
+if __name__ == "__main__":
+    main_verification()
@@ -0,0 +1,74 @@
+"""
+Vérifie que le vectoriseur numpy reproduit exactement l'ancien chemin pandas
+
+Pour chaque combinaison des modalités de RisqueMammaire (et plusieurs jeux
+de valeurs numériques), compare les caractéristiques et le score du modèle
+obtenus par l'encodage pandas historique et par VectoriseurRisque, ainsi que
+la disposition relue depuis sa forme JSON. Code de sortie 1 en cas d'écart.
+
+Exemple :
+    python -m scripts.verifier_vectoriseur
+"""
+import itertools
+import json
+import sys
+import typing
+import joblib
+import numpy as np
+import pandas as pd
+
+from schema.dignostic_schema import RisqueMammaire
+from services.dignostic_service import obtenir_modele
+from services.vectoriseur_diagnostic import VectoriseurRisque, CHEMIN_ENCODEUR, COLONNES_CATEGORIELLES
+
+NUMERIQUES = [
+    dict(age=25, imc=0.0, age_premieres_regles=0, age_premier_enfant=12, nb_enfants=0),
+    dict(age=50, imc=25.3, age_premieres_regles=13, age_premier_enfant=28, nb_enfants=2),
+    dict(age=85, imc=41.7, age_premieres_regles=25, age_premier_enfant=50, nb_enfants=9),
+]
+
+
+def caracteristiques_pandas(data, onhot):
+    """Ancien chemin de effectuer_dignostic (référence)"""
+    df = pd.DataFrame([data.model_dump()])
+    df1 = onhot.transform(df[COLONNES_CATEGORIELLES])
+    df1_encoded = pd.DataFrame(df1, columns=onhot.get_feature_names_out(COLONNES_CATEGORIELLES))
+    return pd.concat([df.drop(columns=COLONNES_CATEGORIELLES).reset_index(drop=True), df1_encoded], axis=1)
+
+
+def main():
+    onhot = joblib.load(CHEMIN_ENCODEUR)
+    modele = obtenir_modele()
+    vectoriseur = VectoriseurRisque.depuis_artefacts(onhot, modele)
+    relu = VectoriseurRisque.depuis_disposition(json.loads(json.dumps(vectoriseur.disposition())))
+
+    modalites = [typing.get_args(RisqueMammaire.model_fields[champ].annotation) for champ in COLONNES_CATEGORIELLES]
+    ecarts = 0
+    nb = 0
+    for combinaison in itertools.product(*modalites):
+        for numeriques in NUMERIQUES:
+            data = RisqueMammaire(**numeriques, **dict(zip(COLONNES_CATEGORIELLES, combinaison)))
+            df_final = caracteristiques_pandas(data, onhot)
+            attendu = df_final.to_numpy(dtype=np.float64)
+
+            for candidat in (vectoriseur, relu):
+                x = candidat.vecteur(data)
+                if list(df_final.columns) != candidat.colonnes or not np.array_equal(x, attendu) \
+                        or modele.predict(x)[0] != modele.predict(df_final)[0]:
+                    ecarts += 1
+                    print(f"Écart pour {combinaison} {numeriques}")
+            nb += 1
+
+    matrice = vectoriseur.matrice([
+        RisqueMammaire(**NUMERIQUES[1], **dict(zip(COLONNES_CATEGORIELLES, c))) for c in itertools.product(*modalites)
+    ])
+    if matrice.shape != (len(list(itertools.product(*modalites))), len(vectoriseur.colonnes)):
+        ecarts += 1
+        print("Forme de la matrice incorrecte")
+
+    print(f"{nb} profils vérifiés, {ecarts} écart(s)")
+    sys.exit(1 if ecarts else 0)
+
+
+if __name__ == "__main__":
+    main()
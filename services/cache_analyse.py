@@ -0,0 +1,197 @@
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from dotenv import load_dotenv
+import numpy as np
+
+from . import charger_model
+from . import metriques
+from .cache_lru import CacheLRU
+
+load_dotenv()
+
+# Activer le cache des résultats d'analyse
+CACHE_ACTIF = os.getenv("ANALYSE_CACHE", "1") == "1"
+# Taille maximale du cache mémoire (Mo)
+CACHE_MEMOIRE_MO = float(os.getenv("ANALYSE_CACHE_MO", "256"))
+# Dossier du cache disque (vide = désactivé)
+CACHE_DOSSIER = os.getenv("ANALYSE_CACHE_DOSSIER", "")
+# Taille maximale du cache disque (Mo)
+CACHE_DISQUE_MO = float(os.getenv("ANALYSE_CACHE_DISQUE_MO", "2048"))
+# Écritures entre deux inventaires complets du dossier (les autres workers y écrivent aussi)
+CACHE_DISQUE_INVENTAIRE = int(os.getenv("ANALYSE_CACHE_DISQUE_INVENTAIRE", "100"))
+# Part de la limite disque visée lors d'un nettoyage
+MARGE_NETTOYAGE = 0.9
+
+
+def _taille_resultat(resultat):
+    masque, forme, detections = resultat
+    return masque.nbytes + 200 * (len(detections) + 1)
+
+
+class CacheAnalyse:
+    """
+    Cache des résultats d'analyse indexé par le contenu de l'image
+
+    La clé combine une empreinte des pixels décodés, les paramètres
+    (threshold, min_area...) et la version du modèle chargé : un changement
+    de poids invalide automatiquement les entrées existantes. Les masques
+    sont stockés compressés à 1 bit par pixel. Le niveau disque, optionnel,
+    survit aux redémarrages.
+    """
+
+    def __init__(self, octets_max=CACHE_MEMOIRE_MO * 1024 * 1024, dossier=CACHE_DOSSIER,
+                 disque_octets_max=CACHE_DISQUE_MO * 1024 * 1024, inventaire=CACHE_DISQUE_INVENTAIRE):
+        self.memoire = CacheLRU(octets_max=int(octets_max), taille_entree=_taille_resultat)
+        self.dossier = Path(dossier) if dossier else None
+        self.disque_octets_max = disque_octets_max
+        self.inventaire = max(1, inventaire)
+        self.hits_disque = 0
+        self.invalidations = 0
+        self.erreurs_disque = 0
+        self.derniere_erreur_disque = None
+        self._version = None
+        self._verrou = threading.Lock()
+        # Taille du dossier suivie en mémoire entre deux inventaires (None = à inventorier)
+        self._octets_disque = None
+        self._version_disque = None
+        self._ecritures = 0
+        self._verrou_disque = threading.Lock()
+        if self.dossier:
+            self.dossier.mkdir(parents=True, exist_ok=True)
+
+    def _verifier_version(self):
+        version = charger_model.obtenir_version()
+        if version != self._version:
+            with self._verrou:
+                if version != self._version:
+                    if self._version is not None:
+                        self.memoire.vider()
+                        self.invalidations += 1
+                    self._version = version
+        return version
+
+    def cle(self, img, *parametres):
+        """Clé du résultat : pixels décodés + paramètres + version du modèle"""
+        empreinte = hashlib.blake2b(digest_size=20)
+        empreinte.update(np.ascontiguousarray(img).data)
+        empreinte.update(repr((img.shape, parametres, self._verifier_version())).encode())
+        return empreinte.hexdigest()
+
+    def get(self, cle):
+        """
+        Returns:
+            (mask_bin, detections_info) ou None
+        """
+        self._verifier_version()
+        resultat = self.memoire.get(cle)
+        if resultat is None and self.dossier:
+            resultat = self._lire_disque(cle)
+            if resultat is not None:
+                self.hits_disque += 1
+                self.memoire.set(cle, resultat)
+
+        if resultat is None:
+            return None
+
+        masque, forme, detections = resultat
+        mask_bin = np.unpackbits(masque, count=forme[0] * forme[1]).reshape(forme)
+        return mask_bin, detections
+
+    def set(self, cle, mask_bin, detections_info):
+        resultat = (np.packbits(mask_bin.ravel()), mask_bin.shape, detections_info)
+        self.memoire.set(cle, resultat)
+        if self.dossier:
+            self._ecrire_disque(cle, resultat)
+
+    def _chemin(self, cle):
+        return self.dossier / f"{self._version}-{cle}.npz"
+
+    def _lire_disque(self, cle):
+        chemin = self._chemin(cle)
+        try:
+            with np.load(chemin) as donnees:
+                return (
+                    donnees["masque"],
+                    tuple(int(v) for v in donnees["forme"]),
+                    json.loads(bytes(donnees["detections"]).decode("utf-8")),
+                )
+        except (OSError, KeyError, ValueError):
+            return None
+
+    def _ecrire_disque(self, cle, resultat):
+        masque, forme, detections = resultat
+        chemin = self._chemin(cle)
+        temporaire = chemin.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            with open(temporaire, "wb") as f:
+                np.savez(
+                    f,
+                    masque=masque,
+                    forme=np.asarray(forme),
+                    detections=np.frombuffer(json.dumps(detections).encode("utf-8"), dtype=np.uint8),
+                )
+                taille = f.tell()
+            os.replace(temporaire, chemin)
+            self._compter_ecriture(taille)
+        except OSError as e:
+            # Cache disque facultatif : l'erreur est remontée dans les statistiques
+            self.erreurs_disque += 1
+            self.derniere_erreur_disque = str(e)
+            temporaire.unlink(missing_ok=True)
+
+    def _compter_ecriture(self, taille):
+        # Inventaire du dossier seulement au premier passage, au changement de version,
+        # au-delà de la limite ou toutes les `inventaire` écritures
+        with self._verrou_disque:
+            self._ecritures += 1
+            if self._octets_disque is not None:
+                self._octets_disque += taille
+            if (self._octets_disque is None or self._version_disque != self._version
+                    or self._octets_disque > self.disque_octets_max
+                    or self._ecritures % self.inventaire == 0):
+                self._nettoyer_disque()
+
+    def _nettoyer_disque(self):
+        # Entrées d'anciennes versions supprimées, puis les plus anciennes au-delà de la limite
+        self._octets_disque = None
+        fichiers = []
+        for chemin in self.dossier.glob("*.npz"):
+            if not chemin.name.startswith(f"{self._version}-"):
+                chemin.unlink(missing_ok=True)
+            else:
+                stat = chemin.stat()
+                fichiers.append((stat.st_mtime, stat.st_size, chemin))
+
+        total = sum(taille for _, taille, _ in fichiers)
+        if total <= self.disque_octets_max:
+            cible = total
+        else:
+            # Descendre sous la limite avec une marge : pas d'inventaire à chaque écriture suivante
+            cible = self.disque_octets_max * MARGE_NETTOYAGE
+        for _, taille, chemin in sorted(fichiers):
+            if total <= cible:
+                break
+            chemin.unlink(missing_ok=True)
+            total -= taille
+        self._octets_disque = total
+        self._version_disque = self._version
+
+    def statistiques(self):
+        stats = self.memoire.statistiques()
+        stats.update({
+            "hits_disque": self.hits_disque,
+            "invalidations": self.invalidations,
+            "version_modele": self._version,
+            "disque": str(self.dossier) if self.dossier else None,
+            "octets_disque": self._octets_disque,
+            "erreurs_disque": self.erreurs_disque,
+            "derniere_erreur_disque": self.derniere_erreur_disque,
+        })
+        return stats
+
+
+cache_analyse = CacheAnalyse()
+metriques.enregistrer("cache_analyse", cache_analyse.statistiques)
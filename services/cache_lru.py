@@ -0,0 +1,91 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class CacheLRU:
+    """
+    Cache LRU en mémoire, thread-safe, borné en nombre d'entrées et/ou en octets
+
+    Args:
+        taille_max: Nombre maximal d'entrées (0 = illimité)
+        octets_max: Taille cumulée maximale (0 = illimitée), mesurée par `taille_entree`
+        ttl: Durée de vie d'une entrée en secondes (0 = pas d'expiration)
+        taille_entree: Fonction valeur -> taille en octets
+    """
+
+    def __init__(self, taille_max=0, octets_max=0, ttl=0, taille_entree=None):
+        self.taille_max = taille_max
+        self.octets_max = octets_max
+        self.ttl = ttl
+        self.taille_entree = taille_entree or (lambda valeur: 0)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.octets = 0
+        self._entrees = OrderedDict()
+        self._verrou = threading.Lock()
+
+    def get(self, cle, defaut=None):
+        with self._verrou:
+            entree = self._entrees.get(cle)
+            if entree is None:
+                self.misses += 1
+                return defaut
+
+            valeur, taille, expiration = entree
+            if expiration and expiration < time.monotonic():
+                self._retirer(cle)
+                self.misses += 1
+                return defaut
+
+            self._entrees.move_to_end(cle)
+            self.hits += 1
+            return valeur
+
+    def set(self, cle, valeur):
+        taille = self.taille_entree(valeur)
+        if self.octets_max and taille > self.octets_max:
+            return
+
+        expiration = time.monotonic() + self.ttl if self.ttl else 0
+        with self._verrou:
+            if cle in self._entrees:
+                self._retirer(cle)
+            self._entrees[cle] = (valeur, taille, expiration)
+            self.octets += taille
+
+            while self._entrees and (
+                (self.taille_max and len(self._entrees) > self.taille_max)
+                or (self.octets_max and self.octets > self.octets_max)
+            ):
+                self._retirer(next(iter(self._entrees)))
+                self.evictions += 1
+
+    def supprimer(self, cle):
+        with self._verrou:
+            if cle in self._entrees:
+                self._retirer(cle)
+
+    def vider(self):
+        with self._verrou:
+            self._entrees.clear()
+            self.octets = 0
+
+    def _retirer(self, cle):
+        _, taille, _ = self._entrees.pop(cle)
+        self.octets -= taille
+
+    def __len__(self):
+        return len(self._entrees)
+
+    def statistiques(self):
+        total = self.hits + self.misses
+        return {
+            "entrees": len(self._entrees),
+            "octets": self.octets,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "taux_hit": round(self.hits / total, 4) if total else 0.0,
+        }
@@ -1,10 +1,28 @@
 
+import os
+from dotenv import load_dotenv
+import numpy as np
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
 from torch.utils.data import Dataset, DataLoader, random_split
 from torchvision import transforms
+from .ressources_cpu import appliquer_torch
+from .registre_modeles import registre, MODELES_MMAP
 
+load_dotenv()
+
+# Budget de threads intra/inter-op du worker (voir services/ressources_cpu.py)
+appliquer_torch(torch)
+
+# Poids float32 du modèle entraîné
+UNET_POIDS = os.getenv("UNET_POIDS", "unet_mammo_cpu.pth")
+# Artefact TorchScript optimisé (fusion / INT8, voir scripts/optimiser_modele.py) ; vide = poids float32
+UNET_ARTEFACT = os.getenv("UNET_ARTEFACT", "")
+# Moteur des opérateurs quantifiés pour un artefact INT8
+UNET_MOTEUR_QUANTIFIE = os.getenv("UNET_MOTEUR_QUANTIFIE", "x86")
+# Inférence en autocast bfloat16 (CPU avec support AVX512-BF16/AMX)
+UNET_BF16 = os.getenv("UNET_BF16", "0") == "1"
 
 
 class DoubleConv(torch.nn.Module):
@@ -63,7 +81,84 @@ class UNetLight(torch.nn.Module):
 
 
 
+def inferer_lot(model, device, images):
+    """
+    Inférence UNetLight sur un lot d'images en niveaux de gris (uint8)
+
+    Les images de tailles différentes sont complétées par des zéros (bas/droite)
+    jusqu'à la plus grande taille du lot, puis chaque masque est recadré.
+
+    Returns:
+        Liste de masques de probabilité (float32), un par image
+    """
+    h = max(img.shape[0] for img in images)
+    w = max(img.shape[1] for img in images)
+
+    # Les pixels uint8 sont convertis directement dans le tensor du lot,
+    # sans copie float32 intermédiaire
+    if all(img.shape == (h, w) for img in images):
+        lot = torch.empty((len(images), 1, h, w), dtype=torch.float32)
+    else:
+        lot = torch.zeros((len(images), 1, h, w), dtype=torch.float32)
+    for i, img in enumerate(images):
+        lot[i, 0, :img.shape[0], :img.shape[1]].copy_(torch.from_numpy(img))
+    lot.div_(255.0)
+
+    with torch.no_grad(), torch.autocast("cpu", dtype=torch.bfloat16, enabled=UNET_BF16):
+        mask_pred = model(lot.to(device)).float()
+
+        # Appliquer sigmoid si le modèle ne le fait pas déjà
+        if mask_pred.max() > 1.0 or mask_pred.min() < 0:
+            mask_pred = torch.sigmoid(mask_pred)
+
+        mask_pred = mask_pred[:, 0].cpu().numpy()
+
+    return [mask_pred[i, :img.shape[0], :img.shape[1]] for i, img in enumerate(images)]
+
+
+
+
+def charger_modele(device, chemin=None):
+    """
+    Charge le modèle de segmentation : artefact optimisé si configuré, sinon poids float32
+
+    Les poids float32 sont projetés en mémoire (torch.load mmap=True) et
+    utilisés sur place par le modèle (assign=True), sans copie privée.
+    """
+    if UNET_ARTEFACT:
+        if UNET_MOTEUR_QUANTIFIE in torch.backends.quantized.supported_engines:
+            torch.backends.quantized.engine = UNET_MOTEUR_QUANTIFIE
+        model = torch.jit.load(chemin or UNET_ARTEFACT, map_location=device)
+    elif MODELES_MMAP:
+        etat = torch.load(chemin or UNET_POIDS, map_location=device, mmap=True, weights_only=True)
+        model = UNetLight()
+        model.load_state_dict(etat, assign=True)
+    else:
+        model = UNetLight().to(device)
+        model.load_state_dict(torch.load(chemin or UNET_POIDS, map_location=device))
+    model.eval()
+    return model
+
+
+# Le modèle est chargé par le registre au premier usage (ou au démarrage par
+# le gestionnaire de cycle de vie), pas à l'import du module
 device = torch.device("cpu")
-model = UNetLight().to(device)
-model.load_state_dict(torch.load("unet_mammo_cpu.pth", map_location=device))
-model.eval()
\ No newline at end of file
+registre.enregistrer("unet", UNET_ARTEFACT or UNET_POIDS, lambda chemin, sha256: charger_modele(device, chemin))
+
+
+def obtenir_modele():
+    """Retourne le modèle de segmentation servi (rechargé à chaud si le fichier change)"""
+    return registre.obtenir("unet")
+
+
+def obtenir_version():
+    """Version (empreinte des poids) du modèle servi"""
+    return registre.version("unet")
+
+
+def prechauffer():
+    """
+    Inférence factice : initialise les primitives et allocations paresseuses de torch
+    """
+    for taille in (256, 512):
+        inferer_lot(obtenir_modele(), device, [np.zeros((taille, taille), dtype=np.uint8)])
\ No newline at end of file
@@ -0,0 +1,78 @@
+import threading
+import time
+import traceback
+
+EN_ATTENTE = "en_attente"
+CHARGEMENT = "chargement"
+PRET = "pret"
+ERREUR = "erreur"
+
+
+class GestionnaireModeles:
+    """
+    Chargement des modèles en arrière-plan au démarrage, avec préchauffage
+
+    Chaque service enregistre un chargeur (et éventuellement une fonction de
+    préchauffage exécutant une inférence factice). `demarrer` les exécute
+    dans un thread dédié ; `pret` indique si tous les modèles enregistrés sont
+    chargés et préchauffés (sonde /health/ready).
+    """
+
+    def __init__(self):
+        self._modeles = {}
+        self._thread = None
+        self._verrou = threading.Lock()
+
+    def enregistrer(self, nom, chargeur, prechauffage=None):
+        self._modeles[nom] = {
+            "chargeur": chargeur,
+            "prechauffage": prechauffage,
+            "etat": EN_ATTENTE,
+            "erreur": None,
+            "duree_chargement_s": None,
+            "duree_prechauffage_s": None,
+        }
+
+    def demarrer(self):
+        """Lance le chargement en arrière-plan (idempotent)"""
+        with self._verrou:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._charger_tout, name="chargement-modeles", daemon=True)
+                self._thread.start()
+
+    def attendre(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _charger_tout(self):
+        for nom, modele in self._modeles.items():
+            modele["etat"] = CHARGEMENT
+            try:
+                debut = time.perf_counter()
+                modele["chargeur"]()
+                modele["duree_chargement_s"] = round(time.perf_counter() - debut, 3)
+
+                if modele["prechauffage"] is not None:
+                    debut = time.perf_counter()
+                    modele["prechauffage"]()
+                    modele["duree_prechauffage_s"] = round(time.perf_counter() - debut, 3)
+
+                modele["etat"] = PRET
+                print(f"Modèle '{nom}' prêt (chargement {modele['duree_chargement_s']}s)")
+            except Exception as e:
+                modele["etat"] = ERREUR
+                modele["erreur"] = str(e)
+                print(f"Échec du chargement du modèle '{nom}': {e}")
+                traceback.print_exc()
+
+    def pret(self):
+        return all(modele["etat"] == PRET for modele in self._modeles.values())
+
+    def etat(self):
+        return {
+            nom: {cle: valeur for cle, valeur in modele.items() if cle not in ("chargeur", "prechauffage")}
+            for nom, modele in self._modeles.items()
+        }
+
+
+gestionnaire = GestionnaireModeles()
@@ -0,0 +1,290 @@
+"""
+Re-score hors ligne d'un registre de patients (/medecin) par paquets
+
+Le registre (CSV ou Parquet) est lu au fil de l'eau par paquets ; chaque
+paquet est validé (PatientRisque), scoré par le moteur de règles et
+complété des recommandations dans un pool de processus. Les résultats sont
+écrits dans l'ordre du registre (CSV ou NDJSON), au fur et à mesure. Au
+plus 2 paquets par processus sont en vol : la mémoire ne dépend pas de la
+taille du registre.
+
+Après chaque paquet écrit, un point de reprise (<sortie>.reprise) enregistre
+le nombre de lignes traitées et la taille de la sortie : après un arrêt, la
+sortie est tronquée à ce point et la lecture reprend à la ligne suivante.
+Un point de reprise calculé avec d'autres règles ou sur un autre fichier
+d'entrée est refusé.
+"""
+import csv
+import hashlib
+import io
+import itertools
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from pydantic import ValidationError
+
+from schema.dignostic_schema import PatientRisque
+from . import medecin_service
+from .regles_cliniques import moteur
+from .lecture_lots import lire_csv, par_paquets
+from .registre_modeles import memoire_processus
+
+FORMAT_CSV = "csv"
+FORMAT_PARQUET = "parquet"
+FORMAT_NDJSON = "ndjson"
+FORMATS_ENTREE = (FORMAT_CSV, FORMAT_PARQUET)
+FORMATS_SORTIE = (FORMAT_CSV, FORMAT_NDJSON)
+
+# Champs recalculés par le dépistage : facultatifs dans le registre
+CHAMPS_RECALCULES = {
+    "risque_5_10_ans_pourcent": 0.0,
+    "recommandation_clinique": "",
+    "frequence_surveillance": "",
+    "categorie_risque": "",
+}
+
+COLONNES_SORTIE = ["ligne", "patient_id", "score_risque", "categorie_risque",
+                   "recommandation_clinique", "frequence_surveillance", "erreurs"]
+
+
+def empreinte_regles():
+    """Version des règles de score (un changement invalide les points de reprise)"""
+    return hashlib.sha256(repr(moteur.regles).encode("utf-8")).hexdigest()[:16]
+
+
+def format_fichier(chemin, formats, explicite=None):
+    """
+    Raises:
+        ValueError: format inconnu ou non pris en charge
+    """
+    format_fichier = explicite or {".jsonl": FORMAT_NDJSON, ".pq": FORMAT_PARQUET}.get(
+        Path(chemin).suffix.lower(), Path(chemin).suffix.lower().lstrip(".")
+    )
+    if format_fichier not in formats:
+        raise ValueError(f"Format non pris en charge: {format_fichier or chemin} (formats acceptés: {', '.join(formats)})")
+    return format_fichier
+
+
+def lire_parquet(chemin, taille_lecture=8192):
+    """
+    Lignes d'un fichier Parquet, lues par lots d'enregistrements (pyarrow)
+
+    Raises:
+        ValueError: pyarrow absent (levée avant la première ligne)
+    """
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ValueError("La lecture Parquet nécessite pyarrow (pip install pyarrow)")
+    return _lignes_parquet(pq.ParquetFile(chemin), taille_lecture)
+
+
+def _lignes_parquet(fichier, taille_lecture):
+    numero = 0
+    for lot in fichier.iter_batches(batch_size=taille_lecture):
+        for valeurs in lot.to_pylist():
+            numero += 1
+            yield numero, valeurs
+
+
+def lire_registre(chemin, format_entree):
+    """
+    Returns:
+        Itérateur de (numéro, dict ou exception), comme services/lecture_lots.py
+    """
+    if format_entree == FORMAT_PARQUET:
+        return lire_parquet(chemin)
+
+    def lignes():
+        with open(chemin, "rb") as fichier:
+            yield from lire_csv(fichier)
+    return lignes()
+
+
+def _valider(valeurs):
+    valeurs = dict(valeurs)
+    for champ, defaut in CHAMPS_RECALCULES.items():
+        if valeurs.get(champ) is None:
+            valeurs[champ] = defaut
+    return PatientRisque.model_validate(valeurs)
+
+
+def traiter_paquet(paquet):
+    """
+    Valide, score et recommande un paquet (exécuté dans un processus du pool)
+
+    Returns:
+        Résultats dans l'ordre du paquet
+    """
+    resultats = []
+    patients = []
+    for numero, valeurs in paquet:
+        resultat = {"ligne": numero}
+        if isinstance(valeurs, dict) and valeurs.get("patient_id") is not None:
+            resultat["patient_id"] = valeurs["patient_id"]
+        resultats.append(resultat)
+
+        if isinstance(valeurs, Exception):
+            resultat["erreurs"] = [{"champ": None, "message": str(valeurs)}]
+            continue
+        try:
+            patients.append((resultat, _valider(valeurs)))
+        except ValidationError as e:
+            resultat["erreurs"] = [
+                {"champ": ".".join(str(p) for p in erreur["loc"]) or None, "message": erreur["msg"]}
+                for erreur in e.errors()
+            ]
+
+    if patients:
+        colonnes = {champ: [getattr(data, champ) for _, data in patients] for champ in moteur.champs}
+        lot = medecin_service.evaluer_lot(colonnes)
+        for (resultat, data), score, categorie in zip(patients, lot["scores"].tolist(), lot["categories"]):
+            resultat["score_risque"] = round(score, 2)
+            resultat["categorie_risque"] = str(categorie)
+            resultat.update(medecin_service.generer_recommandations(data, str(categorie)))
+
+    return resultats
+
+
+class EcrivainResultats:
+    """Sortie CSV ou NDJSON en binaire (position exacte pour les points de reprise)"""
+
+    def __init__(self, chemin, format_sortie, position=0):
+        self.format = format_sortie
+        if position:
+            os.truncate(chemin, position)
+        self.fichier = open(chemin, "ab" if position else "wb")
+        if self.format == FORMAT_CSV and not position:
+            self._ecrire_csv([COLONNES_SORTIE])
+
+    def _ecrire_csv(self, lignes):
+        texte = io.StringIO()
+        csv.writer(texte).writerows(lignes)
+        self.fichier.write(texte.getvalue().encode("utf-8"))
+
+    def ecrire(self, resultats):
+        if self.format == FORMAT_NDJSON:
+            self.fichier.write("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in resultats).encode("utf-8"))
+            return
+        self._ecrire_csv([
+            [r["ligne"], r.get("patient_id", ""), r.get("score_risque", ""), r.get("categorie_risque", ""),
+             r.get("recommandation_clinique", ""), r.get("frequence_surveillance", ""),
+             "; ".join(f"{e['champ'] or 'ligne'}: {e['message']}" for e in r.get("erreurs", []))]
+            for r in resultats
+        ])
+
+    def synchroniser(self):
+        """Données sur disque ; retourne la position de fin"""
+        self.fichier.flush()
+        os.fsync(self.fichier.fileno())
+        return self.fichier.tell()
+
+    def fermer(self):
+        self.fichier.close()
+
+
+def _signature_entree(chemin):
+    stat = os.stat(chemin)
+    return {"entree": str(Path(chemin).resolve()), "taille": stat.st_size, "modifie_ns": stat.st_mtime_ns}
+
+
+def lire_reprise(chemin_reprise, chemin_entree):
+    """
+    Raises:
+        ValueError: point de reprise d'un autre fichier ou d'autres règles
+    """
+    with open(chemin_reprise, encoding="utf-8") as f:
+        reprise = json.load(f)
+    if {cle: reprise.get(cle) for cle in ("entree", "taille", "modifie_ns")} != _signature_entree(chemin_entree):
+        raise ValueError("Le fichier d'entrée a changé depuis le point de reprise")
+    if reprise.get("regles") != empreinte_regles():
+        raise ValueError("Les règles de score ont changé depuis le point de reprise")
+    return reprise
+
+
+def _ecrire_reprise(chemin_reprise, reprise):
+    temporaire = f"{chemin_reprise}.{os.getpid()}.tmp"
+    with open(temporaire, "w", encoding="utf-8") as f:
+        json.dump(reprise, f)
+    os.replace(temporaire, chemin_reprise)
+
+
+def depister(entree, sortie, format_entree=None, format_sortie=None, taille_paquet=5000,
+             processus=None, reprendre=False, intervalle_progression=5.0, flux_progression=sys.stderr):
+    """
+    Re-score un registre complet
+
+    Args:
+        processus: Taille du pool (1 = dans le processus courant)
+        reprendre: Repartir du point de reprise de `sortie` s'il existe
+
+    Returns:
+        Résumé : lignes, scores, erreurs, durée
+    """
+    format_entree = format_fichier(entree, FORMATS_ENTREE, format_entree)
+    format_sortie = format_fichier(sortie, FORMATS_SORTIE, format_sortie)
+    processus = processus or os.cpu_count() or 1
+    chemin_reprise = f"{sortie}.reprise"
+
+    reprise = {**_signature_entree(entree), "regles": empreinte_regles(),
+               "lignes": 0, "scores": 0, "erreurs": 0, "position": 0, "termine": False}
+    if reprendre and os.path.exists(chemin_reprise):
+        reprise = lire_reprise(chemin_reprise, entree)
+        if reprise["termine"]:
+            print(f"Dépistage déjà terminé ({reprise['lignes']} lignes)", file=flux_progression)
+            return reprise
+        print(f"Reprise après {reprise['lignes']} lignes", file=flux_progression)
+
+    lignes = itertools.islice(lire_registre(entree, format_entree), reprise["lignes"], None)
+    paquets = par_paquets(lignes, taille_paquet)
+    ecrivain = EcrivainResultats(sortie, format_sortie, reprise["position"])
+
+    debut = time.perf_counter()
+    deja_traitees = reprise["lignes"]
+    prochaine_progression = debut + intervalle_progression
+
+    def enregistrer(resultats):
+        nonlocal prochaine_progression
+        ecrivain.ecrire(resultats)
+        scores = sum(1 for r in resultats if "score_risque" in r)
+        reprise["lignes"] += len(resultats)
+        reprise["scores"] += scores
+        reprise["erreurs"] += len(resultats) - scores
+        reprise["position"] = ecrivain.synchroniser()
+        _ecrire_reprise(chemin_reprise, reprise)
+
+        maintenant = time.perf_counter()
+        if maintenant >= prochaine_progression:
+            prochaine_progression = maintenant + intervalle_progression
+            debit = (reprise["lignes"] - deja_traitees) / (maintenant - debut)
+            print(f"{reprise['lignes']} lignes ({reprise['erreurs']} erreurs), {debit:,.0f} lignes/s, "
+                  f"RSS {memoire_processus().get('rss_mo')} Mo", file=flux_progression)
+
+    try:
+        if processus == 1:
+            for paquet in paquets:
+                enregistrer(traiter_paquet(paquet))
+        else:
+            with ProcessPoolExecutor(max_workers=processus) as pool:
+                # Fenêtre bornée : les paquets sont lus au rythme de l'écriture
+                en_vol = deque()
+                for paquet in paquets:
+                    en_vol.append(pool.submit(traiter_paquet, paquet))
+                    if len(en_vol) >= 2 * processus:
+                        enregistrer(en_vol.popleft().result())
+                while en_vol:
+                    enregistrer(en_vol.popleft().result())
+    finally:
+        ecrivain.fermer()
+
+    reprise["termine"] = True
+    _ecrire_reprise(chemin_reprise, reprise)
+    duree = time.perf_counter() - debut
+    print(f"Terminé : {reprise['lignes']} lignes, {reprise['scores']} scores, {reprise['erreurs']} erreurs "
+          f"en {duree:.1f}s ({(reprise['lignes'] - deja_traitees) / max(duree, 1e-9):,.0f} lignes/s)",
+          file=flux_progression)
+    return {**reprise, "duree_s": round(duree, 2)}
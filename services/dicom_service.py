@@ -0,0 +1,105 @@
+import os
+from dotenv import load_dotenv
+import cv2
+import numpy as np
+from pydicom import dcmread
+from pydicom.tag import Tag
+
+load_dotenv()
+
+# Plus grand côté (px) de l'image transmise au modèle
+DICOM_RESOLUTION_MAX = int(os.getenv("ANALYSE_DICOM_RESOLUTION_MAX", "2048"))
+# Taille maximale d'un fichier DICOM (Mo)
+TAILLE_DICOM_MAX = int(float(os.getenv("ANALYSE_DICOM_TAILLE_MAX_MO", "150")) * 1024 * 1024)
+
+TAG_PIXEL_DATA = Tag(0x7FE0, 0x0010)
+
+
+def _premiere_valeur(valeur, defaut=None):
+    if valeur is None:
+        return defaut
+    try:
+        return float(valeur[0])
+    except TypeError:
+        return float(valeur)
+
+
+def _pixels_bruts(fichier, ds):
+    """
+    Vue sur les pixels de la première frame sans copie
+
+    Pour une syntaxe de transfert non compressée, les pixels sont lus
+    directement dans le buffer de l'upload (en mémoire) ou mappés depuis le
+    fichier temporaire (sur disque). Sinon, ils sont décodés une seule fois.
+    """
+    lignes, colonnes = int(ds.Rows), int(ds.Columns)
+    syntaxe = ds.file_meta.TransferSyntaxUID
+    element = ds.get_item(TAG_PIXEL_DATA)
+
+    if syntaxe.is_compressed or not syntaxe.is_little_endian or int(ds.get("SamplesPerPixel", 1)) != 1 \
+            or int(ds.BitsAllocated) not in (8, 16) or getattr(element, "value_tell", None) is None:
+        pixels = ds.pixel_array
+        return pixels[0] if pixels.ndim == 3 else pixels
+
+    signe = "i" if int(ds.get("PixelRepresentation", 0)) == 1 else "u"
+    dtype = np.dtype(f"<{signe}{int(ds.BitsAllocated) // 8}")
+    decalage = element.value_tell
+    # Fichier sous-jacent d'un SpooledTemporaryFile (BytesIO en mémoire ou fichier sur disque)
+    sous_jacent = getattr(fichier, "_file", fichier)
+
+    if hasattr(sous_jacent, "getbuffer"):
+        return np.frombuffer(sous_jacent.getbuffer(), dtype=dtype, count=lignes * colonnes, offset=decalage) \
+            .reshape(lignes, colonnes)
+    return np.memmap(sous_jacent, dtype=dtype, mode="r", offset=decalage, shape=(lignes, colonnes))
+
+
+def lire_dicom(fichier, resolution_max=DICOM_RESOLUTION_MAX):
+    """
+    Charge une mammographie DICOM en niveaux de gris 8 bits à la résolution de travail
+
+    Les pixels 12-16 bits pleine résolution ne sont jamais copiés : la
+    réduction (INTER_AREA) les lit en une passe, puis la pente/ordonnée
+    (Rescale) et la fenêtre VOI (WindowCenter/WindowWidth, sinon percentiles
+    0.5-99.5) sont appliquées sur l'image réduite.
+
+    Args:
+        fichier: Fichier binaire positionnable (upload)
+        resolution_max: Plus grand côté de l'image retournée
+
+    Returns:
+        Image uint8 (H, W)
+    """
+    fichier.seek(0)
+    ds = dcmread(fichier, defer_size="1 KB")
+    pixels = _pixels_bruts(fichier, ds)
+
+    h, w = pixels.shape
+    echelle = min(1.0, resolution_max / max(h, w))
+    if echelle < 1.0:
+        taille = (max(1, round(w * echelle)), max(1, round(h * echelle)))
+        if pixels.dtype.itemsize == 4:
+            pixels = pixels.astype(np.float32)
+        reduit = cv2.resize(np.asarray(pixels), taille, interpolation=cv2.INTER_AREA)
+    else:
+        reduit = np.asarray(pixels)
+    valeurs = reduit.astype(np.float32)
+    del pixels
+
+    pente = _premiere_valeur(ds.get("RescaleSlope"), 1.0)
+    ordonnee = _premiere_valeur(ds.get("RescaleIntercept"), 0.0)
+    if pente != 1.0 or ordonnee != 0.0:
+        valeurs = valeurs * pente + ordonnee
+
+    centre = _premiere_valeur(ds.get("WindowCenter"))
+    largeur = _premiere_valeur(ds.get("WindowWidth"))
+    if centre is not None and largeur is not None and largeur > 1:
+        bas = centre - 0.5 - (largeur - 1) / 2
+        haut = centre - 0.5 + (largeur - 1) / 2
+    else:
+        bas, haut = np.percentile(valeurs, (0.5, 99.5))
+
+    valeurs = np.clip((valeurs - bas) / max(haut - bas, 1e-6), 0.0, 1.0) * 255.0
+    if ds.get("PhotometricInterpretation") == "MONOCHROME1":
+        valeurs = 255.0 - valeurs
+
+    return valeurs.astype(np.uint8)
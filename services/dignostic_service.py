@@ -1,23 +1,307 @@
 from sqlalchemy.orm import Session
 from schema.dignostic_schema import RisqueMammaire
-import joblib
-import pandas as pd
+import json
+import os
 import numpy as np
+import threading
+import warnings
+from dotenv import load_dotenv
+from fastapi import HTTPException, Request
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
+from .cycle_vie_modeles import gestionnaire
+from .vectoriseur_diagnostic import VectoriseurRisque, CHEMIN_ENCODEUR
+from .registre_modeles import registre, charger_joblib, empreinte_fichier
+from .noyau_diagnostic import NoyauRisque
+from .lecture_lots import lire_lignes, par_paquets, recevoir_lot
+from .cache_lru import CacheLRU
+from . import metriques
+
+load_dotenv()
+
+# Lignes évaluées par appel à model.predict dans /diagnostic/batch
+TAILLE_PAQUET = int(os.getenv("DIAGNOSTIC_LOT_PAQUET", "2048"))
+# Taille au-delà de laquelle un lot reçu est déversé sur disque (Mo)
+LOT_MEMOIRE_MAX = int(float(os.getenv("DIAGNOSTIC_LOT_MEMOIRE_MO", "16")) * 1024 * 1024)
+# Taille maximale d'un lot reçu (Mo, 0 = illimitée)
+LOT_TAILLE_MAX = int(float(os.getenv("DIAGNOSTIC_LOT_MAX_MO", "256")) * 1024 * 1024)
+
+CHEMIN_MODELE = "Pink_October/Code/elmalick_ml.joblib"
+CHEMIN_MODELE_PATIENT = "Pink_October/Code/patient_modele_cancer.joblib"
+# Score par le noyau numpy exporté (scripts/exporter_noyau.py) au lieu de l'estimateur sklearn
+DIAGNOSTIC_NOYAU = os.getenv("DIAGNOSTIC_NOYAU", "0") == "1"
+CHEMIN_NOYAU = os.getenv("DIAGNOSTIC_NOYAU_CHEMIN", "Pink_October/Code/elmalick_ml.npz")
+
+# Cache des scores par profil validé
+CACHE_ACTIF = os.getenv("DIAGNOSTIC_CACHE", "1") == "1"
+# Nombre maximal de profils gardés
+CACHE_MAX = int(os.getenv("DIAGNOSTIC_CACHE_MAX", "100000"))
+# Durée de vie d'un score (s, 0 = jusqu'au changement de modèle)
+CACHE_TTL = int(os.getenv("DIAGNOSTIC_CACHE_TTL_S", "3600"))
+# Pas d'arrondi de l'imc avant évaluation (0 = valeur exacte) ; le score est
+# alors celui de l'imc arrondi, identique pour tous les profils d'une même tranche
+CACHE_IMC_PAS = float(os.getenv("DIAGNOSTIC_CACHE_IMC_PAS", "0"))
+
+# Le modèle a été entraîné sur un DataFrame : les vecteurs numpy suivent le
+# même ordre de colonnes (VectoriseurRisque), l'avertissement est sans objet
+warnings.filterwarnings("ignore", message="X does not have valid feature names", category=UserWarning)
+
+
+
+def charger_noyau(chemin, sha256):
+    """Noyau numpy (porte sa propre disposition des colonnes : ni encodeur, ni sklearn)"""
+    noyau = NoyauRisque.charger(chemin)
+    source = noyau.entete.get("source_sha256")
+    if source and os.path.exists(CHEMIN_MODELE) and empreinte_fichier(CHEMIN_MODELE) != source:
+        print(f"⚠️ Noyau {chemin} exporté depuis une autre version de {CHEMIN_MODELE}, à réexporter")
+    return noyau
+
+
+if DIAGNOSTIC_NOYAU:
+    registre.enregistrer("diagnostic", CHEMIN_NOYAU, charger_noyau)
+else:
+    registre.enregistrer("diagnostic", CHEMIN_MODELE, charger_joblib)
+registre.enregistrer("encodeur", CHEMIN_ENCODEUR, charger_joblib)
+# Modèle du profil clinique complet (PatientRisque), chargé à la demande
+registre.enregistrer("patient", CHEMIN_MODELE_PATIENT, charger_joblib)
+
+# Disposition compilée pour les versions (modèle, encodeur) servies
+_vectoriseur = (None, None)
+_verrou = threading.Lock()
+
+
+def obtenir_modele():
+    """
+    Modèle tabulaire servi par le registre (chargé au premier usage ou au démarrage) :
+    estimateur sklearn, ou NoyauRisque si DIAGNOSTIC_NOYAU
+    """
+    return registre.obtenir("diagnostic")
+
+
+def obtenir_vectoriseur():
+    """
+    Disposition des colonnes compilée une fois par couple de versions
+    (modèle, encodeur) : recompilée après un rechargement à chaud
+    """
+    global _vectoriseur
+    modele = obtenir_modele()
+    if DIAGNOSTIC_NOYAU:
+        return modele.vectoriseur
+    encodeur = registre.obtenir("encodeur")
+    versions = (registre.version("diagnostic"), registre.version("encodeur"))
+    if _vectoriseur[0] != versions:
+        with _verrou:
+            if _vectoriseur[0] != versions:
+                _vectoriseur = (versions, VectoriseurRisque.depuis_artefacts(encodeur, modele))
+    return _vectoriseur[1]
+
+
+def versions_modele():
+    """Versions des artefacts qui déterminent un score"""
+    if DIAGNOSTIC_NOYAU:
+        return (registre.version("diagnostic"),)
+    return registre.version("diagnostic"), registre.version("encodeur")
+
+
+def canoniser(valeurs):
+    """
+    Champs validés d'un RisqueMammaire sous forme canonique (imc arrondi si CACHE_IMC_PAS)
+    """
+    valeurs = dict(valeurs)
+    if CACHE_IMC_PAS:
+        valeurs["imc"] = round(round(valeurs["imc"] / CACHE_IMC_PAS) * CACHE_IMC_PAS, 6)
+    valeurs["imc"] = float(valeurs["imc"])
+    return valeurs
+
+
+class CacheDiagnostic:
+    """
+    Scores déjà calculés, indexés par le profil canonique
+
+    Les champs de RisqueMammaire sont des modalités ou des entiers bornés :
+    le trafic réel et les campagnes de dépistage resoumettent les mêmes
+    profils. Un changement de version du modèle ou de l'encodeur (rechargement
+    à chaud) vide le cache.
+    """
+
+    def __init__(self, taille_max=CACHE_MAX, ttl=CACHE_TTL):
+        self.memoire = CacheLRU(taille_max=taille_max, ttl=ttl)
+        self.invalidations = 0
+        self._versions = None
+        self._verrou = threading.Lock()
+
+    def verifier_versions(self):
+        versions = versions_modele()
+        if versions != self._versions:
+            with self._verrou:
+                if versions != self._versions:
+                    if self._versions is not None:
+                        self.memoire.vider()
+                        self.invalidations += 1
+                    self._versions = versions
+
+    @staticmethod
+    def cle(valeurs):
+        """Clé d'un profil canonique : valeurs dans l'ordre des champs du schéma"""
+        return tuple(valeurs[champ] for champ in RisqueMammaire.model_fields)
+
+    def get(self, valeurs):
+        return self.memoire.get(self.cle(valeurs))
+
+    def set(self, valeurs, score):
+        self.memoire.set(self.cle(valeurs), score)
+
+    def statistiques(self):
+        stats = self.memoire.statistiques()
+        stats.update({
+            "actif": CACHE_ACTIF,
+            "imc_pas": CACHE_IMC_PAS,
+            "invalidations": self.invalidations,
+            "versions_modele": self._versions,
+        })
+        return stats
+
+
+cache_diagnostic = CacheDiagnostic()
+metriques.enregistrer("cache_diagnostic", cache_diagnostic.statistiques)
+
+
+def charger():
+    obtenir_modele()
+    obtenir_vectoriseur()
+
+
+def prechauffer():
+    """Diagnostic factice : initialise le modèle et numpy"""
+    effectuer_dignostic(RisqueMammaire(
+        age=50, imc=25.0, ant_familiaux="Non", ant_personnels="Non", age_premieres_regles=13,
+        age_premier_enfant=28, nb_enfants=2, tabac="Non-fumeur", alcool="Aucune", activite_physique="Modérée"
+    ))
+
+
+gestionnaire.enregistrer("diagnostic", charger, prechauffer)
+
 
-model = joblib.load("Pink_October/Code/elmalick_ml.joblib")
 def effectuer_dignostic(data:RisqueMammaire):
     print(data)
-    df = pd.DataFrame([data.model_dump()])
+    valeurs = canoniser(data.model_dump())
+    if CACHE_ACTIF:
+        cache_diagnostic.verifier_versions()
+        score = cache_diagnostic.get(valeurs)
+        if score is not None:
+            return {"score_risque": round(score, 2)}
+
+    x = obtenir_vectoriseur().matrice([valeurs])
+    score = float(obtenir_modele().predict(x)[0])
+    # Un score non défini (valeur manquante) n'est pas gardé
+    if CACHE_ACTIF and np.isfinite(score):
+        cache_diagnostic.set(valeurs, score)
+    return {"score_risque": round(score, 2)}
+
+
+
+def _erreurs_validation(e: ValidationError):
+    return [
+        {"champ": ".".join(str(p) for p in erreur["loc"]) or None, "message": erreur["msg"]}
+        for erreur in e.errors()
+    ]
+
+
+def scorer_paquets(lignes, taille_paquet=TAILLE_PAQUET):
+    """
+    Évalue un lot par paquets : validation ligne à ligne, cache des profils
+    déjà vus, un seul predict par paquet pour les autres
+
+    Args:
+        lignes: Itérable de (numéro, dict des champs ou exception de lecture)
+
+    Yields:
+        Liste des résultats d'un paquet, dans l'ordre des lignes :
+        {"ligne", "id"?, "score_risque"} ou {"ligne", "id"?, "erreurs"}
+    """
+    versions = modele = vectoriseur = None
+
+    for paquet in par_paquets(lignes, taille_paquet):
+        # Rechargement à chaud pendant le flux : modèle et vectoriseur relus avant le
+        # paquet suivant, pour ne pas mettre en cache des scores de l'ancienne version
+        if versions_modele() != versions:
+            versions = versions_modele()
+            modele = obtenir_modele()
+            vectoriseur = obtenir_vectoriseur()
+        if CACHE_ACTIF:
+            cache_diagnostic.verifier_versions()
+        resultats = []
+        valides = []
+        for numero, valeurs in paquet:
+            resultat = {"ligne": numero}
+            if isinstance(valeurs, dict) and "id" in valeurs:
+                resultat["id"] = valeurs["id"]
+            resultats.append(resultat)
+
+            if isinstance(valeurs, Exception):
+                resultat["erreurs"] = [{"champ": None, "message": str(valeurs)}]
+                continue
+            try:
+                valeurs = canoniser(RisqueMammaire.model_validate(valeurs).model_dump())
+            except ValidationError as e:
+                resultat["erreurs"] = _erreurs_validation(e)
+                continue
+
+            score = cache_diagnostic.get(valeurs) if CACHE_ACTIF else None
+            if score is not None:
+                resultat["score_risque"] = round(score, 2)
+            else:
+                valides.append((resultat, valeurs))
+
+        if valides:
+            x = vectoriseur.matrice([valeurs for _, valeurs in valides])
+            # Le modèle n'accepte pas de valeur manquante (age_premier_enfant optionnel)
+            manquants = np.isnan(x).any(axis=1)
+            scores = np.full(len(valides), np.nan)
+            if not manquants.all():
+                scores[~manquants] = modele.predict(x[~manquants])
+
+            for i, (resultat, _) in enumerate(valides):
+                if manquants[i]:
+                    resultat["erreurs"] = [
+                        {"champ": champ, "message": "Valeur requise par le modèle"}
+                        for champ, index in vectoriseur.numeriques.items() if np.isnan(x[i, index])
+                    ]
+                else:
+                    resultat["score_risque"] = round(float(scores[i]), 2)
+                    if CACHE_ACTIF:
+                        cache_diagnostic.set(valides[i][1], float(scores[i]))
+
+        yield resultats
 
-    onhot = joblib.load("Pink_October/Code/onehot_encoder_cancer.joblib")
 
-    cat_col = ['ant_familiaux', 'ant_personnels', 'tabac', 'alcool', 'activite_physique']
+def generer_ndjson(lignes, taille_paquet=TAILLE_PAQUET):
+    """Résultats NDJSON, un bloc par paquet, puis une ligne de résumé"""
+    nb = scores = 0
+    for resultats in scorer_paquets(lignes, taille_paquet):
+        nb += len(resultats)
+        scores += sum(1 for resultat in resultats if "score_risque" in resultat)
+        yield "".join(json.dumps(resultat, ensure_ascii=False) + "\n" for resultat in resultats)
+    yield json.dumps({"resume": {"lignes": nb, "scores": scores, "erreurs": nb - scores}}) + "\n"
 
-    df1 = onhot.transform(df [cat_col])
 
-    df1_encoded = pd.DataFrame(df1,columns=onhot.get_feature_names_out(cat_col))
+async def effectuer_dignostic_batch(request: Request, format_lot=None):
+    """
+    Score un lot de RisqueMammaire et renvoie les résultats en NDJSON au fil du calcul
+    """
+    fichier, format_lot = await recevoir_lot(request, format_lot, LOT_MEMOIRE_MAX, LOT_TAILLE_MAX)
+    try:
+        # Un tableau JSON est décodé ici : un contenu invalide est rejeté avant le flux
+        lignes = await run_in_threadpool(lire_lignes, fichier, format_lot)
+    except ValueError as e:
+        fichier.close()
+        raise HTTPException(status_code=400, detail=f"Lot illisible: {e}")
+    except BaseException:
+        fichier.close()
+        raise
 
-    df_final = pd.concat([df.drop(columns=cat_col).reset_index(drop=True),df1_encoded],axis=1)
-    print(df.columns)
-    score = model.predict(df_final)[0]
-    return {"score_risque": round(score, 2)}
\ No newline at end of file
+    # Fichier du lot fermé une fois le flux envoyé
+    return StreamingResponse(generer_ndjson(lignes), media_type="application/x-ndjson",
+                             background=BackgroundTask(fichier.close))
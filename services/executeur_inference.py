@@ -0,0 +1,208 @@
+import asyncio
+import functools
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from dotenv import load_dotenv
+from fastapi import HTTPException
+import torch
+
+from .charger_model import inferer_lot, prechauffer, obtenir_modele, device
+from .tuilage import inferer_par_tuiles
+from .registre_modeles import registre
+
+load_dotenv()
+
+# "thread" : pool de threads dans le worker uvicorn, "process" : pool de processus
+INFERENCE_MODE = os.getenv("INFERENCE_MODE", "thread")
+# Nombre de passes avant exécutées en parallèle
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "1"))
+# Threads intra-op torch par processus d'inférence (mode "process" uniquement, 0 = budget
+# hérité de ressources_cpu). En mode "thread", torch.set_num_threads vaut pour tout le
+# processus : les workers partagent le budget du worker uvicorn fixé par ressources_cpu
+INFERENCE_TORCH_THREADS = int(os.getenv("INFERENCE_TORCH_THREADS", "0"))
+# Nombre maximal d'analyses admises (en cours + en attente)
+INFERENCE_FILE_MAX = int(os.getenv("INFERENCE_FILE_MAX", "32"))
+# Threads pour le décodage, le post-traitement et l'encodage des images
+ANALYSE_CPU_WORKERS = int(os.getenv("ANALYSE_CPU_WORKERS", "2"))
+# Attente maximale des workers lors d'un rechargement du modèle (s)
+INFERENCE_RECHARGEMENT_ATTENTE_S = float(os.getenv("INFERENCE_RECHARGEMENT_ATTENTE_S", "120"))
+
+# Barrière partagée par les workers du pool de processus (une tâche de rechargement par worker)
+_barriere = None
+
+
+def _initialiser_worker(torch_threads, barriere=None):
+    """
+    Initialise un worker d'inférence : budget de threads torch (processus
+    dédié uniquement) et modèle préchargé
+    """
+    global _barriere
+    _barriere = barriere
+    if torch_threads > 0:
+        torch.set_num_threads(torch_threads)
+    obtenir_modele()
+
+
+def _inferer_lot_worker(images):
+    # Modèle relu dans le registre à chaque lot : un rechargement à chaud s'applique au lot suivant
+    return inferer_lot(obtenir_modele(), device, images)
+
+
+def _prechauffer_worker():
+    prechauffer()
+    return os.getpid()
+
+
+def _inferer_tuiles_worker(img):
+    return inferer_par_tuiles(img, _inferer_lot_worker)
+
+
+def _recharger_worker(nom, force, attente_s):
+    # Chaque worker garde sa tâche jusqu'à ce que tous aient la leur :
+    # les N tâches soumises sont exécutées par les N workers, une chacun
+    try:
+        _barriere.wait(attente_s)
+    except threading.BrokenBarrierError:
+        # Barrière remise en état pour le prochain rechargement
+        _barriere.reset()
+        return {"pid": os.getpid(), "erreur": "Tous les workers n'ont pas répondu à temps"}
+    try:
+        metadonnees = registre.recharger(nom, force=force)
+    except Exception as e:
+        return {"pid": os.getpid(), "erreur": str(e)}
+    metadonnees.pop("objet")
+    return {"pid": os.getpid(), **metadonnees}
+
+
+class ExecuteurInference:
+    """
+    Exécute l'inférence UNet et le travail OpenCV hors de la boucle asyncio
+
+    L'inférence passe par un pool dédié (threads ou processus) dont les workers
+    chargent le modèle une seule fois au démarrage. Le décodage, le
+    post-traitement et l'encodage passent par un pool de threads séparé.
+    Au-delà de `file_max` analyses admises, les nouvelles sont refusées (503).
+    """
+
+    def __init__(self, mode=INFERENCE_MODE, workers=INFERENCE_WORKERS,
+                 torch_threads=INFERENCE_TORCH_THREADS, file_max=INFERENCE_FILE_MAX,
+                 cpu_workers=ANALYSE_CPU_WORKERS):
+        self.mode = mode
+        self.workers = max(1, workers)
+        self.torch_threads = torch_threads
+        self.file_max = file_max
+        self.cpu_workers = max(1, cpu_workers)
+        self.en_cours = 0
+        self._pool = None
+        self._cpu = None
+        self._verrou_rechargement = None
+
+    def demarrer(self):
+        """Crée les pools (appelé paresseusement au premier usage)"""
+        if self._pool is not None:
+            return
+
+        if self.mode == "process":
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_initialiser_worker,
+                initargs=(self.torch_threads, multiprocessing.get_context("spawn").Barrier(self.workers)),
+            )
+        else:
+            self._pool = ThreadPoolExecutor(
+                max_workers=self.workers,
+                thread_name_prefix="inference",
+                initializer=_initialiser_worker,
+                # Réglage torch global au processus : pas de budget par thread
+                initargs=(0,),
+            )
+
+        self._cpu = ThreadPoolExecutor(max_workers=self.cpu_workers, thread_name_prefix="analyse-cpu")
+
+    def precharger(self):
+        """
+        Démarre les workers et attend qu'ils aient chargé et préchauffé le modèle
+        """
+        self.demarrer()
+        futures = [self._pool.submit(_prechauffer_worker) for _ in range(self.workers)]
+        for future in futures:
+            future.result()
+
+    def arreter(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._cpu.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+            self._cpu = None
+
+    async def recharger_workers(self, nom, force=False):
+        """
+        Rechargement du modèle dans chaque worker du pool de processus
+
+        Returns:
+            Métadonnées (ou erreur) retournées par chaque worker
+        """
+        self.demarrer()
+        if self._verrou_rechargement is None:
+            self._verrou_rechargement = asyncio.Lock()
+        # Un rechargement à la fois : les tâches de deux appels ne se partagent pas la barrière
+        async with self._verrou_rechargement:
+            loop = asyncio.get_running_loop()
+            return await asyncio.gather(*[
+                loop.run_in_executor(self._pool, _recharger_worker, nom, force, INFERENCE_RECHARGEMENT_ATTENTE_S)
+                for _ in range(self.workers)
+            ])
+
+    @asynccontextmanager
+    async def admission(self, nb=1):
+        """
+        Réserve `nb` places dans la file d'analyse ou lève une 503
+
+        Un lot plus grand que la file entière ne serait jamais admis : 413
+        plutôt qu'une 503 que le client réessaierait indéfiniment.
+        """
+        if nb > self.file_max:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Lot trop volumineux (max {self.file_max} images par requête)",
+            )
+        if self.en_cours + nb > self.file_max:
+            raise HTTPException(
+                status_code=503,
+                detail="Service d'analyse saturé, veuillez réessayer",
+                headers={"Retry-After": "1"},
+            )
+
+        self.en_cours += nb
+        try:
+            yield
+        finally:
+            self.en_cours -= nb
+
+    async def inferer(self, images):
+        """Passe avant du modèle sur un lot d'images uint8"""
+        self.demarrer()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, _inferer_lot_worker, images)
+
+    async def inferer_tuiles(self, img):
+        """Inférence par tuiles d'une grande image (mémoire bornée)"""
+        self.demarrer()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, _inferer_tuiles_worker, img)
+
+    async def executer(self, fn, *args, **kwargs):
+        """Exécute une fonction bloquante (OpenCV, encodage...) dans le pool CPU"""
+        self.demarrer()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._cpu, functools.partial(fn, *args, **kwargs))
+
+
+executeur = ExecuteurInference()
+# Le UNet du processus uvicorn ne sert pas : le rechargement va aux workers
+if executeur.mode == "process":
+    registre.deleguer("unet", executeur.recharger_workers)
@@ -0,0 +1,292 @@
+"""
+Backends de la file des travaux d'analyse asynchrones
+
+Un backend stocke les travaux soumis (octets de l'image, paramètres), les
+attribue aux workers et conserve leur état jusqu'à leur nettoyage. Deux
+implémentations sans service externe : en mémoire (un seul processus) et
+SQLite (partagée entre les workers uvicorn d'un même nœud, persistante).
+D'autres backends s'ajoutent avec `enregistrer_backend`.
+
+Chaque attribution compte une tentative : un travail resté en cours au-delà
+du bail (worker arrêté, tué par manque de mémoire...) est remis en attente,
+sauf s'il a déjà épuisé ses tentatives, auquel cas il passe en erreur.
+"""
+import json
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+EN_ATTENTE = "en_attente"
+EN_COURS = "en_cours"
+TERMINE = "termine"
+ERREUR = "erreur"
+
+ETATS_FINAUX = (TERMINE, ERREUR)
+
+# Tentatives par défaut avant l'abandon d'un travail qui n'aboutit pas
+TENTATIVES_MAX = 3
+
+
+def _message_abandon(tentatives):
+    return f"Erreur lors de l'analyse: abandonnée après {tentatives} tentative(s) sans réponse du worker"
+
+
+def _nouveau_travail(travail_id, filename, parametres):
+    maintenant = time.time()
+    return {
+        "job_id": travail_id,
+        "etat": EN_ATTENTE,
+        "etape": None,
+        "progression": 0,
+        "filename": filename,
+        "parametres": parametres,
+        "resultat": None,
+        "erreur": None,
+        "tentatives": 0,
+        "cree_le": maintenant,
+        "mis_a_jour_le": maintenant,
+        "termine_le": None,
+    }
+
+
+class FileTravauxMemoire:
+    """File en mémoire du processus : perdue au redémarrage"""
+
+    def __init__(self):
+        self._travaux = {}
+        self._donnees = {}
+        self._attente = deque()
+        self._verrou = threading.Lock()
+
+    def ajouter(self, travail_id, filename, donnees, parametres):
+        with self._verrou:
+            self._travaux[travail_id] = _nouveau_travail(travail_id, filename, parametres)
+            self._donnees[travail_id] = donnees
+            self._attente.append(travail_id)
+
+    def prendre(self):
+        """
+        Attribue le plus ancien travail en attente
+
+        Returns:
+            (travail, donnees) ou None
+        """
+        with self._verrou:
+            while self._attente:
+                travail_id = self._attente.popleft()
+                travail = self._travaux.get(travail_id)
+                if travail is not None and travail["etat"] == EN_ATTENTE:
+                    travail["etat"] = EN_COURS
+                    travail["tentatives"] += 1
+                    travail["mis_a_jour_le"] = time.time()
+                    return dict(travail), self._donnees[travail_id]
+        return None
+
+    def mettre_a_jour(self, travail_id, **champs):
+        with self._verrou:
+            travail = self._travaux.get(travail_id)
+            if travail is None:
+                return
+            travail.update(champs)
+            travail["mis_a_jour_le"] = time.time()
+            if travail["etat"] in ETATS_FINAUX:
+                travail["termine_le"] = travail["mis_a_jour_le"]
+                self._donnees.pop(travail_id, None)
+
+    def obtenir(self, travail_id):
+        with self._verrou:
+            travail = self._travaux.get(travail_id)
+            return dict(travail) if travail is not None else None
+
+    def compter_en_attente(self):
+        with self._verrou:
+            return sum(1 for travail in self._travaux.values() if travail["etat"] in (EN_ATTENTE, EN_COURS))
+
+    def nettoyer(self, retention_s, bail_s, tentatives_max=TENTATIVES_MAX):
+        """
+        Supprime les travaux terminés depuis plus de `retention_s` et remet en
+        attente ceux restés en cours plus de `bail_s` sans nouvelle (en erreur
+        après `tentatives_max` tentatives)
+
+        Returns:
+            Nombre de travaux supprimés
+        """
+        maintenant = time.time()
+        with self._verrou:
+            expires = [
+                travail_id for travail_id, travail in self._travaux.items()
+                if travail["etat"] in ETATS_FINAUX and travail["termine_le"] < maintenant - retention_s
+            ]
+            for travail_id in expires:
+                del self._travaux[travail_id]
+
+            for travail_id, travail in self._travaux.items():
+                if travail["etat"] == EN_COURS and travail["mis_a_jour_le"] < maintenant - bail_s:
+                    if travail["tentatives"] >= tentatives_max:
+                        travail.update(etat=ERREUR, etape=None, erreur=_message_abandon(travail["tentatives"]),
+                                       mis_a_jour_le=maintenant, termine_le=maintenant)
+                        self._donnees.pop(travail_id, None)
+                    else:
+                        travail["etat"] = EN_ATTENTE
+                        self._attente.append(travail_id)
+        return len(expires)
+
+
+class FileTravauxSQLite:
+    """
+    File persistante dans une base SQLite (mode WAL)
+
+    Plusieurs processus peuvent partager le même fichier : l'attribution d'un
+    travail se fait dans une transaction IMMEDIATE. Les octets de l'image
+    sont effacés dès que le travail est terminé.
+    """
+
+    COLONNES = ("job_id", "etat", "etape", "progression", "filename", "parametres",
+                "resultat", "erreur", "tentatives", "cree_le", "mis_a_jour_le", "termine_le")
+
+    def __init__(self, chemin):
+        self.chemin = chemin
+        with self._connexion() as connexion:
+            connexion.execute("PRAGMA journal_mode=WAL")
+            connexion.execute("""
+                CREATE TABLE IF NOT EXISTS travaux_analyse (
+                    job_id TEXT PRIMARY KEY,
+                    etat TEXT NOT NULL,
+                    etape TEXT,
+                    progression INTEGER NOT NULL DEFAULT 0,
+                    filename TEXT,
+                    parametres TEXT,
+                    donnees BLOB,
+                    resultat TEXT,
+                    erreur TEXT,
+                    tentatives INTEGER NOT NULL DEFAULT 0,
+                    cree_le REAL NOT NULL,
+                    mis_a_jour_le REAL NOT NULL,
+                    termine_le REAL
+                )
+            """)
+            connexion.execute("CREATE INDEX IF NOT EXISTS ix_travaux_etat ON travaux_analyse (etat, cree_le)")
+            # Base créée avant le compteur de tentatives
+            colonnes = {ligne["name"] for ligne in connexion.execute("PRAGMA table_info(travaux_analyse)")}
+            if "tentatives" not in colonnes:
+                connexion.execute("ALTER TABLE travaux_analyse ADD COLUMN tentatives INTEGER NOT NULL DEFAULT 0")
+
+    @contextmanager
+    def _connexion(self):
+        # Mode autocommit : chaque instruction est sa propre transaction, sauf BEGIN explicite
+        connexion = sqlite3.connect(self.chemin, timeout=30, isolation_level=None)
+        connexion.row_factory = sqlite3.Row
+        try:
+            yield connexion
+        finally:
+            connexion.close()
+
+    def _depuis_ligne(self, ligne):
+        travail = {colonne: ligne[colonne] for colonne in self.COLONNES}
+        travail["parametres"] = json.loads(travail["parametres"] or "{}")
+        travail["resultat"] = json.loads(travail["resultat"]) if travail["resultat"] else None
+        return travail
+
+    def ajouter(self, travail_id, filename, donnees, parametres):
+        travail = _nouveau_travail(travail_id, filename, parametres)
+        with self._connexion() as connexion:
+            connexion.execute(
+                "INSERT INTO travaux_analyse (job_id, etat, progression, filename, parametres, donnees, cree_le, mis_a_jour_le) "
+                "VALUES (?, ?, 0, ?, ?, ?, ?, ?)",
+                (travail_id, EN_ATTENTE, filename, json.dumps(parametres), bytes(donnees),
+                 travail["cree_le"], travail["mis_a_jour_le"]),
+            )
+
+    def prendre(self):
+        with self._connexion() as connexion:
+            connexion.execute("BEGIN IMMEDIATE")
+            try:
+                ligne = connexion.execute(
+                    "SELECT * FROM travaux_analyse WHERE etat = ? ORDER BY cree_le LIMIT 1", (EN_ATTENTE,)
+                ).fetchone()
+                if ligne is not None:
+                    connexion.execute(
+                        "UPDATE travaux_analyse SET etat = ?, mis_a_jour_le = ?, tentatives = tentatives + 1 WHERE job_id = ?",
+                        (EN_COURS, time.time(), ligne["job_id"]),
+                    )
+                connexion.execute("COMMIT")
+            except Exception:
+                connexion.execute("ROLLBACK")
+                raise
+
+        if ligne is None:
+            return None
+
+        travail = self._depuis_ligne(ligne)
+        travail["etat"] = EN_COURS
+        travail["tentatives"] += 1
+        return travail, ligne["donnees"]
+
+    def mettre_a_jour(self, travail_id, **champs):
+        maintenant = time.time()
+        champs["mis_a_jour_le"] = maintenant
+        if "resultat" in champs:
+            champs["resultat"] = json.dumps(champs["resultat"]) if champs["resultat"] is not None else None
+
+        affectations = [f"{colonne} = ?" for colonne in champs]
+        valeurs = list(champs.values())
+        if champs.get("etat") in ETATS_FINAUX:
+            affectations += ["termine_le = ?", "donnees = NULL"]
+            valeurs.append(maintenant)
+
+        with self._connexion() as connexion:
+            connexion.execute(
+                f"UPDATE travaux_analyse SET {', '.join(affectations)} WHERE job_id = ?",
+                (*valeurs, travail_id),
+            )
+
+    def obtenir(self, travail_id):
+        with self._connexion() as connexion:
+            ligne = connexion.execute(
+                f"SELECT {', '.join(self.COLONNES)} FROM travaux_analyse WHERE job_id = ?", (travail_id,)
+            ).fetchone()
+        return self._depuis_ligne(ligne) if ligne is not None else None
+
+    def compter_en_attente(self):
+        with self._connexion() as connexion:
+            return connexion.execute(
+                "SELECT COUNT(*) FROM travaux_analyse WHERE etat IN (?, ?)", (EN_ATTENTE, EN_COURS)
+            ).fetchone()[0]
+
+    def nettoyer(self, retention_s, bail_s, tentatives_max=TENTATIVES_MAX):
+        maintenant = time.time()
+        with self._connexion() as connexion:
+            supprimes = connexion.execute(
+                "DELETE FROM travaux_analyse WHERE etat IN (?, ?) AND termine_le < ?",
+                (*ETATS_FINAUX, maintenant - retention_s),
+            ).rowcount
+            connexion.execute(
+                "UPDATE travaux_analyse SET etat = ?, etape = NULL, erreur = ?, mis_a_jour_le = ?, termine_le = ?, "
+                "donnees = NULL WHERE etat = ? AND mis_a_jour_le < ? AND tentatives >= ?",
+                (ERREUR, _message_abandon(tentatives_max), maintenant, maintenant,
+                 EN_COURS, maintenant - bail_s, tentatives_max),
+            )
+            connexion.execute(
+                "UPDATE travaux_analyse SET etat = ? WHERE etat = ? AND mis_a_jour_le < ?",
+                (EN_ATTENTE, EN_COURS, maintenant - bail_s),
+            )
+        return supprimes
+
+
+BACKENDS = {
+    "memoire": lambda chemin: FileTravauxMemoire(),
+    "sqlite": FileTravauxSQLite,
+}
+
+
+def enregistrer_backend(nom, fabrique):
+    """Ajoute un backend : `fabrique(chemin)` retourne un objet exposant la même interface"""
+    BACKENDS[nom] = fabrique
+
+
+def creer_backend(nom, chemin=None):
+    if nom not in BACKENDS:
+        raise ValueError(f"Backend de file inconnu: {nom} (disponibles: {', '.join(BACKENDS)})")
+    return BACKENDS[nom](chemin)
@@ -0,0 +1,117 @@
+"""
+Analyse en deux étapes (grossière puis fine)
+
+Le UNet est d'abord appliqué à une version réduite de la mammographie pour
+repérer les régions candidates ; il n'est ensuite ré-appliqué à pleine
+résolution que sur des recadrages (avec marge) autour de ces régions. Le
+masque final reprend la prédiction réduite, agrandie, hors des recadrages.
+"""
+import os
+from dotenv import load_dotenv
+import cv2
+import numpy as np
+
+load_dotenv()
+
+MODE_COMPLET = "complet"
+MODE_DEUX_ETAPES = "deux_etapes"
+MODES = (MODE_COMPLET, MODE_DEUX_ETAPES)
+
+# Mode par défaut des analyses (surchargeable par requête)
+ANALYSE_MODE = os.getenv("ANALYSE_MODE", MODE_COMPLET)
+# Facteur de réduction de l'étape grossière
+GROSSIER_ECHELLE = float(os.getenv("ANALYSE_GROSSIER_ECHELLE", "0.25"))
+# Marge (px pleine résolution) ajoutée autour de chaque région candidate
+GROSSIER_MARGE = int(os.getenv("ANALYSE_GROSSIER_MARGE_PX", "32"))
+# Au-delà de cette fraction de l'image couverte par les recadrages, inférence complète directe
+GROSSIER_COUVERTURE_MAX = float(os.getenv("ANALYSE_GROSSIER_COUVERTURE_MAX", "0.6"))
+# Plus bas seuil fixe essayé par rechercher_seuil
+SEUIL_CANDIDAT = 0.3
+
+
+def reduire(img, echelle=GROSSIER_ECHELLE):
+    """Image réduite de l'étape grossière (INTER_AREA)"""
+    taille = (max(1, round(img.shape[1] * echelle)), max(1, round(img.shape[0] * echelle)))
+    return cv2.resize(img, taille, interpolation=cv2.INTER_AREA)
+
+
+def _fusionner_boites(boites):
+    """Fusionne les boîtes (x0, y0, x1, y1) qui se chevauchent"""
+    boites = sorted(boites)
+    fusion = True
+    while fusion:
+        fusion = False
+        resultat = []
+        for boite in boites:
+            for i, autre in enumerate(resultat):
+                if boite[0] < autre[2] and autre[0] < boite[2] and boite[1] < autre[3] and autre[1] < boite[3]:
+                    resultat[i] = (min(boite[0], autre[0]), min(boite[1], autre[1]),
+                                   max(boite[2], autre[2]), max(boite[3], autre[3]))
+                    fusion = True
+                    break
+            else:
+                resultat.append(boite)
+        boites = resultat
+    return boites
+
+
+def recadrages(pred_reduite, forme, threshold=0.5, marge=GROSSIER_MARGE):
+    """
+    Régions pleine résolution à ré-analyser
+
+    Une région candidate est une composante connexe de la prédiction réduite
+    au-dessus du plus bas seuil que `rechercher_seuil` pourrait retenir
+    (seuil demandé, 0.3 ou moyenne) : aucune détection possible n'est écartée
+    à ce stade. Les boîtes sont agrandies à pleine résolution, élargies de
+    `marge` et fusionnées lorsqu'elles se chevauchent.
+
+    Returns:
+        Liste de (x0, y0, x1, y1) en pixels pleine résolution
+    """
+    h, w = forme
+    seuil = min(threshold, SEUIL_CANDIDAT, float(pred_reduite.mean()))
+    binaire = (pred_reduite > seuil).view(np.uint8)
+    if not binaire.any():
+        return []
+
+    echelle_y = h / pred_reduite.shape[0]
+    echelle_x = w / pred_reduite.shape[1]
+    _, _, stats, _ = cv2.connectedComponentsWithStats(binaire, connectivity=8)
+
+    boites = []
+    for x, y, bw, bh, _ in stats[1:]:
+        boites.append((
+            max(0, int(x * echelle_x) - marge),
+            max(0, int(y * echelle_y) - marge),
+            min(w, int(np.ceil((x + bw) * echelle_x)) + marge),
+            min(h, int(np.ceil((y + bh) * echelle_y)) + marge),
+        ))
+    return _fusionner_boites(boites)
+
+
+def couverture(boites, forme):
+    """Fraction de l'image couverte par les recadrages"""
+    return sum((x1 - x0) * (y1 - y0) for x0, y0, x1, y1 in boites) / float(forme[0] * forme[1])
+
+
+def assembler(pred_reduite, forme, boites, preds_fines):
+    """
+    Masque pleine résolution : prédiction réduite agrandie, remplacée par
+    la prédiction fine dans chaque recadrage
+    """
+    masque = cv2.resize(pred_reduite, (forme[1], forme[0]), interpolation=cv2.INTER_LINEAR)
+    for (x0, y0, x1, y1), pred in zip(boites, preds_fines):
+        masque[y0:y1, x0:x1] = pred
+    return masque
+
+
+def inferer_deux_etapes(img, inferer, threshold=0.5):
+    """
+    Version synchrone : `inferer(image uint8)` retourne le masque de probabilité
+    """
+    pred_reduite = inferer(reduire(img))
+    boites = recadrages(pred_reduite, img.shape, threshold)
+    if couverture(boites, img.shape) > GROSSIER_COUVERTURE_MAX:
+        return inferer(img)
+    preds = [inferer(np.ascontiguousarray(img[y0:y1, x0:x1])) for x0, y0, x1, y1 in boites]
+    return assembler(pred_reduite, img.shape, boites, preds)
@@ -0,0 +1,217 @@
+"""
+Hachage et vérification des mots de passe dans un pool dédié et borné
+
+bcrypt coûte 100 à 300 ms de CPU par appel : exécuté dans le pool de
+threads partagé de Starlette, un afflux de connexions priverait de threads
+/diagnostic et /medecin. Les appels passent ici par un pool de taille fixe
+(bcrypt libère le GIL) ; au-delà de HACHAGE_FILE_MAX demandes admises
+(en cours + en attente), les nouvelles sont refusées avec un Retry-After
+estimé d'après la latence observée.
+
+Les hachages en masse (import d'utilisateurs) passent par un pool de
+processus distinct, créé une fois et partagé : au plus HACHAGE_LOTS_MAX
+lots à la fois, les suivants sont refusés de la même façon.
+
+Le coût bcrypt est configurable : un mot de passe vérifié dont le hash a été
+calculé avec un autre coût est rehaché (verify_and_update) et le nouveau
+hash est retourné pour être enregistré.
+"""
+import asyncio
+import math
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from dotenv import load_dotenv
+from fastapi import HTTPException
+from passlib.context import CryptContext
+
+from . import metriques
+
+load_dotenv()
+
+# Threads dédiés au hachage
+HACHAGE_WORKERS = int(os.getenv("HACHAGE_WORKERS", "2"))
+# Nombre maximal de hachages admis (en cours + en attente)
+HACHAGE_FILE_MAX = int(os.getenv("HACHAGE_FILE_MAX", "32"))
+# Coût bcrypt (log2 des itérations) des nouveaux hash
+HACHAGE_BCRYPT_COUT = int(os.getenv("HACHAGE_BCRYPT_COUT", "12"))
+# Code renvoyé quand la file est pleine (503, ou 429 pour inviter le client à ralentir)
+HACHAGE_STATUT_SATURATION = int(os.getenv("HACHAGE_STATUT_SATURATION", "503"))
+# Processus du pool de hachage en masse, mots de passe par tâche, lots simultanés
+HACHAGE_LOT_PROCESSUS = int(os.getenv("HACHAGE_LOT_PROCESSUS", "2"))
+HACHAGE_LOT_PAQUET = int(os.getenv("HACHAGE_LOT_PAQUET", "16"))
+HACHAGE_LOTS_MAX = int(os.getenv("HACHAGE_LOTS_MAX", "1"))
+
+# Durées gardées pour les percentiles
+FENETRE_LATENCES = 512
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=HACHAGE_BCRYPT_COUT)
+
+
+def hacher_lot(mots_de_passe):
+    """Hash d'une liste de mots de passe (tâche d'un pool de processus)"""
+    return [pwd_context.hash(mot_de_passe) for mot_de_passe in mots_de_passe]
+
+
+def _percentiles(durees):
+    if not durees:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None}
+    triees = sorted(durees)
+    rang = lambda q: triees[min(len(triees) - 1, int(q * len(triees)))]
+    return {"p50_ms": round(rang(0.5) * 1000, 1), "p95_ms": round(rang(0.95) * 1000, 1),
+            "p99_ms": round(rang(0.99) * 1000, 1)}
+
+
+class ExecuteurHachage:
+    """
+    Pool borné pour bcrypt, avec contrôle d'admission sur la longueur de file
+    """
+
+    def __init__(self, workers=HACHAGE_WORKERS, file_max=HACHAGE_FILE_MAX,
+                 statut_saturation=HACHAGE_STATUT_SATURATION, contexte=pwd_context,
+                 processus_lot=HACHAGE_LOT_PROCESSUS, paquet_lot=HACHAGE_LOT_PAQUET, lots_max=HACHAGE_LOTS_MAX):
+        self.workers = max(1, workers)
+        self.file_max = file_max
+        self.processus_lot = max(1, processus_lot)
+        self.paquet_lot = max(1, paquet_lot)
+        self.lots_max = lots_max
+        self.lots_en_cours = 0
+        self.lots_refuses = 0
+        self.mots_de_passe_lots = 0
+        self._pool_lots = None
+        self.statut_saturation = statut_saturation
+        self.contexte = contexte
+        self.admis = 0
+        self.en_cours = 0
+        self.refus = 0
+        self.rehachages = 0
+        self._latences = {"hacher": deque(maxlen=FENETRE_LATENCES), "verifier": deque(maxlen=FENETRE_LATENCES)}
+        self._attentes = deque(maxlen=FENETRE_LATENCES)
+        self._compteurs = {"hacher": 0, "verifier": 0}
+        # en_cours et les compteurs sont mis à jour depuis les threads du pool
+        self._verrou = threading.Lock()
+        self._pool = None
+
+    def demarrer(self):
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="hachage")
+
+    def arreter(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+        if self._pool_lots is not None:
+            self._pool_lots.shutdown(wait=False, cancel_futures=True)
+            self._pool_lots = None
+
+    def _retry_after(self):
+        """Secondes estimées pour écouler la file actuelle"""
+        durees = list(self._latences["verifier"]) or list(self._latences["hacher"])
+        moyenne = sum(durees) / len(durees) if durees else 0.3
+        return max(1, math.ceil(self.admis * moyenne / self.workers))
+
+    def _saturation(self, retry_after, detail="Trop de demandes d'authentification, veuillez réessayer"):
+        return HTTPException(
+            status_code=self.statut_saturation,
+            detail=detail,
+            headers={"Retry-After": str(retry_after)},
+        )
+
+    async def _executer(self, operation, fn, *args):
+        if self.admis >= self.file_max:
+            self.refus += 1
+            raise self._saturation(self._retry_after())
+
+        self.demarrer()
+        self.admis += 1
+        soumis = time.perf_counter()
+
+        def mesurer():
+            debut = time.perf_counter()
+            self._attentes.append(debut - soumis)
+            with self._verrou:
+                self.en_cours += 1
+            try:
+                return fn(*args)
+            finally:
+                self._latences[operation].append(time.perf_counter() - debut)
+                with self._verrou:
+                    self.en_cours -= 1
+                    self._compteurs[operation] += 1
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._pool, mesurer)
+        finally:
+            self.admis -= 1
+
+    async def hacher(self, mot_de_passe):
+        """Hash bcrypt au coût configuré"""
+        return await self._executer("hacher", self.contexte.hash, mot_de_passe)
+
+    async def verifier(self, mot_de_passe, hash_enregistre):
+        """
+        Returns:
+            (valide, nouveau hash ou None) : un nouveau hash est calculé si le
+            hash enregistré n'a pas le coût configuré
+        """
+        valide, nouveau_hash = await self._executer(
+            "verifier", self.contexte.verify_and_update, mot_de_passe, hash_enregistre
+        )
+        if nouveau_hash:
+            self.rehachages += 1
+        return valide, nouveau_hash
+
+    async def hacher_lot(self, mots_de_passe):
+        """
+        Hash de tous les mots de passe d'un lot, en parallèle dans le pool de processus
+
+        Raises:
+            HTTPException: HACHAGE_LOTS_MAX lots déjà en cours
+        """
+        if not mots_de_passe:
+            return []
+        if self.lots_en_cours >= self.lots_max:
+            self.lots_refuses += 1
+            # Durée estimée d'un lot du même ordre que celui-ci
+            durees = list(self._latences["hacher"])
+            moyenne = sum(durees) / len(durees) if durees else 0.3
+            raise self._saturation(max(1, math.ceil(len(mots_de_passe) * moyenne / self.processus_lot)),
+                                   "Un import est déjà en cours, veuillez réessayer")
+
+        if self._pool_lots is None:
+            self._pool_lots = ProcessPoolExecutor(max_workers=self.processus_lot,
+                                                  mp_context=multiprocessing.get_context("spawn"))
+        self.lots_en_cours += 1
+        try:
+            loop = asyncio.get_running_loop()
+            paquets = await asyncio.gather(*[
+                loop.run_in_executor(self._pool_lots, hacher_lot, mots_de_passe[debut:debut + self.paquet_lot])
+                for debut in range(0, len(mots_de_passe), self.paquet_lot)
+            ])
+        finally:
+            self.lots_en_cours -= 1
+        self.mots_de_passe_lots += len(mots_de_passe)
+        return [hash_ for paquet in paquets for hash_ in paquet]
+
+    def statistiques(self):
+        return {
+            "workers": self.workers,
+            "file_max": self.file_max,
+            "cout_bcrypt": HACHAGE_BCRYPT_COUT,
+            "admis": self.admis,
+            "en_cours": self.en_cours,
+            "refus": self.refus,
+            "rehachages": self.rehachages,
+            "hacher": {"appels": self._compteurs["hacher"], **_percentiles(self._latences["hacher"])},
+            "verifier": {"appels": self._compteurs["verifier"], **_percentiles(self._latences["verifier"])},
+            "attente_file": _percentiles(self._attentes),
+            "lots": {"processus": self.processus_lot, "lots_max": self.lots_max, "en_cours": self.lots_en_cours,
+                     "refus": self.lots_refuses, "mots_de_passe": self.mots_de_passe_lots},
+        }
+
+
+hachage = ExecuteurHachage()
+metriques.enregistrer("hachage", hachage.statistiques)
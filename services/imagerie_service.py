@@ -1,75 +1,460 @@
 from fastapi import UploadFile, HTTPException
-import shutil
+from fastapi.responses import Response
+import asyncio
+import io
+import json
+import os
+import uuid
 from pathlib import Path
+from dotenv import load_dotenv
 import cv2
 import numpy as np
 import base64
-import torch
-from .charger_model import model, device
-
-async def effectuer_analyse(image: UploadFile):
+from .charger_model import inferer_lot
+from .planificateur_lots import PlanificateurLots
+from .executeur_inference import executeur
+from .tuilage import depasse_plafond
+from .cache_lru import CacheLRU
+from .cache_analyse import cache_analyse, CACHE_ACTIF
+from .dicom_service import lire_dicom, TAILLE_DICOM_MAX
+from . import grossier_fin
+from .grossier_fin import ANALYSE_MODE, MODE_COMPLET, MODE_DEUX_ETAPES
+from .cycle_vie_modeles import gestionnaire
+
+load_dotenv()
+
+ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".dcm"}
+
+# Taille maximale d'un fichier envoyé (Mo)
+TAILLE_UPLOAD_MAX = int(float(os.getenv("ANALYSE_TAILLE_MAX_MO", "50")) * 1024 * 1024)
+# Taille maximale du corps d'une requête /analyse (Mo), plusieurs fichiers pour /analyse/batch
+TAILLE_REQUETE_MAX = int(float(os.getenv("ANALYSE_REQUETE_MAX_MO", "200")) * 1024 * 1024)
+TAILLE_BLOC_LECTURE = 1024 * 1024
+
+# Résultats gardés en mémoire pour GET /analyse/resultats/{id}/overlay
+RESULTATS_MAX = int(os.getenv("ANALYSE_RESULTATS_MAX", "64"))
+RESULTATS_TTL = int(os.getenv("ANALYSE_RESULTATS_TTL_S", "600"))
+# Taille cumulée maximale des images gardées (Mo) : une mammographie décodée pèse des dizaines de Mo
+RESULTATS_MAX_OCTETS = int(float(os.getenv("ANALYSE_RESULTATS_MAX_MO", "128")) * 1024 * 1024)
+
+# Formats de réponse
+FORMAT_JSON = "json"            # historique : 3 images base64 dans le JSON
+FORMAT_COMPACT = "compact"      # boîtes/scores + masque RLE ou PNG, overlay sur demande
+FORMAT_MULTIPART = "multipart"  # partie JSON + masque PNG binaire
+MEDIA_COMPACT = "application/vnd.cancer.analyse+json"
+
+# Planificateur partagé par /analyse et /analyse/batch
+planificateur = PlanificateurLots(executeur.inferer, executeur.inferer_tuiles)
+
+resultats_recents = CacheLRU(taille_max=RESULTATS_MAX, octets_max=RESULTATS_MAX_OCTETS, ttl=RESULTATS_TTL,
+                             taille_entree=lambda resultat: resultat[0].nbytes)
+
+# Chargement et préchauffage du UNet dans les workers d'inférence au démarrage
+gestionnaire.enregistrer("unet", executeur.precharger)
+
+
+def choisir_format(format_reponse=None, accept=None):
     """
-    Analyse une image mammographique
+    Négociation du format de réponse : paramètre `format`, sinon en-tête Accept
+
+    Sans indication, le format JSON historique est conservé pour les anciens clients.
     """
-    # Vérifier le type de fichier
-    allowed_extensions = {".jpg", ".jpeg", ".png", ".dcm"}
+    if format_reponse:
+        if format_reponse not in (FORMAT_JSON, FORMAT_COMPACT, FORMAT_MULTIPART):
+            raise HTTPException(status_code=400, detail=f"Format de réponse inconnu: {format_reponse}")
+        return format_reponse
+
+    accept = accept or ""
+    if MEDIA_COMPACT in accept:
+        return FORMAT_COMPACT
+    if "multipart/mixed" in accept:
+        return FORMAT_MULTIPART
+    return FORMAT_JSON
+
+
+def verifier_extension(image: UploadFile):
+    """Vérifie le type de fichier envoyé"""
     file_ext = Path(image.filename).suffix.lower()
 
-    if file_ext not in allowed_extensions:
+    if file_ext not in ALLOWED_EXTENSIONS:
         raise HTTPException(
             status_code=400,
-            detail=f"Format de fichier non supporté. Formats acceptés: {', '.join(allowed_extensions)}"
+            detail=f"Format de fichier non supporté. Formats acceptés: {', '.join(ALLOWED_EXTENSIONS)}"
         )
 
-    # Créer un dossier temporaire pour stocker l'image
-    upload_dir = Path("temp_uploads")
-    upload_dir.mkdir(exist_ok=True)
 
-    # Sauvegarder temporairement l'image
-    file_path = upload_dir / image.filename
+def lire_octets_upload(image: UploadFile, taille_max=None):
+    """
+    Lit l'upload dans un buffer préalloué, sans passer par le disque
 
-    try:
-        with file_path.open("wb") as buffer:
-            shutil.copyfileobj(image.file, buffer)
+    La taille maximale est vérifiée au fil de la lecture : un fichier trop
+    volumineux est rejeté (413) avant d'être entièrement copié.
+
+    Returns:
+        memoryview sur les octets lus
+    """
+    taille_max = TAILLE_UPLOAD_MAX if taille_max is None else taille_max
+
+    if image.size is not None and image.size > taille_max:
+        raise HTTPException(status_code=413, detail=f"Fichier trop volumineux (max {taille_max // (1024 * 1024)} Mo)")
+
+    # Un octet de plus que la taille attendue pour détecter un dépassement
+    capacite = min(image.size if image.size is not None else TAILLE_BLOC_LECTURE, taille_max) + 1
+    buffer = bytearray(capacite)
+    lu = 0
+
+    image.file.seek(0)
+    while True:
+        if lu == len(buffer):
+            if lu > taille_max:
+                raise HTTPException(status_code=413, detail=f"Fichier trop volumineux (max {taille_max // (1024 * 1024)} Mo)")
+            buffer.extend(bytes(min(len(buffer), taille_max + 1 - len(buffer))))
+
+        with memoryview(buffer) as vue:
+            n = image.file.readinto(vue[lu:])
+        if not n:
+            break
+        lu += n
+
+    if lu > taille_max:
+        raise HTTPException(status_code=413, detail=f"Fichier trop volumineux (max {taille_max // (1024 * 1024)} Mo)")
+
+    return memoryview(buffer)[:lu]
+
+
+def decoder_image(donnees):
+    """Décode une image (JPEG/PNG) en mémoire en niveaux de gris"""
+    img = cv2.imdecode(np.frombuffer(donnees, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+    if img is None:
+        raise ValueError("Impossible de décoder l'image")
+    return img
+
+
+def decoder_octets(donnees, filename):
+    """Décode les octets d'un fichier (JPEG/PNG ou DICOM) en niveaux de gris"""
+    if Path(filename).suffix.lower() == ".dcm":
+        return lire_dicom(io.BytesIO(donnees))
+    return decoder_image(donnees)
+
+
+def taille_max_fichier(filename):
+    """Taille maximale acceptée pour un fichier, selon son format"""
+    if Path(filename or "").suffix.lower() == ".dcm":
+        return TAILLE_DICOM_MAX
+    return TAILLE_UPLOAD_MAX
+
+
+def lire_octets_fichier(image: UploadFile):
+    """Octets bruts d'un upload, avec la limite de taille propre à son format"""
+    return lire_octets_upload(image, taille_max_fichier(image.filename))
+
+
+def lire_image_upload(image: UploadFile):
+    """
+    Lit et décode l'upload en niveaux de gris, entièrement en mémoire
+
+    Les fichiers DICOM sont lus sur place (sans copie des pixels 16 bits)
+    et ramenés à la résolution de travail du modèle.
+    """
+    if Path(image.filename).suffix.lower() == ".dcm":
+        # Taille mesurée sur le fichier lui-même : image.size n'est pas toujours renseigné
+        image.file.seek(0, io.SEEK_END)
+        taille = image.file.tell()
+        image.file.seek(0)
+        if taille > TAILLE_DICOM_MAX:
+            raise HTTPException(status_code=413, detail=f"Fichier trop volumineux (max {TAILLE_DICOM_MAX // (1024 * 1024)} Mo)")
+        return lire_dicom(image.file)
+
+    return decoder_image(lire_octets_upload(image))
+
+
+def construire_reponse(filename, img, mask_bin, detections_info):
+    """
+    Construit la réponse JSON historique de l'analyse (images encodées en base64)
+    """
+    img_original, img_with_boxes = dessiner_boites(img, detections_info)
+    num_detections = len(detections_info)
+
+    # Encoder l'image originale en base64
+    _, buffer_original = cv2.imencode('.jpg', img_original)
+    img_original_base64 = base64.b64encode(buffer_original).decode('utf-8')
+
+    # Encoder l'image avec les boîtes en base64
+    _, buffer_boxes = cv2.imencode('.jpg', img_with_boxes)
+    img_boxes_base64 = base64.b64encode(buffer_boxes).decode('utf-8')
+
+    # Convertir le masque binaire en image visualisable (0-255) puis encoder
+    mask_base64 = base64.b64encode(encoder_masque_png(mask_bin)).decode('utf-8')
 
-        img_original, img_with_boxes, mask_bin, num_detections = predict_and_draw_boxes(str(file_path), model, device)
+    return {
+        "status": "success",
+        "message": f"Analyse terminée - {num_detections} zone(s) suspecte(s) détectée(s)",
+        "num_detections": num_detections,
+        "detections": detections_info,
+        "image_original": f"data:image/jpeg;base64,{img_original_base64}",
+        "image_with_boxes": f"data:image/jpeg;base64,{img_boxes_base64}",
+        "mask": f"data:image/png;base64,{mask_base64}",
+        "filename": filename
+    }
 
-        # Encoder l'image originale en base64
-        _, buffer_original = cv2.imencode('.jpg', img_original)
-        img_original_base64 = base64.b64encode(buffer_original).decode('utf-8')
 
-        # Encoder l'image avec les boîtes en base64
+def encoder_masque_png(mask_bin):
+    """PNG 8 bits du masque (0/255), compression maximale"""
+    _, buffer_mask = cv2.imencode('.png', mask_bin * np.uint8(255), [cv2.IMWRITE_PNG_COMPRESSION, 9])
+    return buffer_mask.tobytes()
+
+
+def encoder_masque_rle(mask_bin):
+    """
+    Encodage par plages du masque binaire (ordre ligne par ligne)
+
+    `comptes` alterne les longueurs de plages de 0 et de 1, en commençant par 0.
+    """
+    plat = mask_bin.ravel()
+    changements = np.flatnonzero(plat[1:] != plat[:-1]) + 1
+    bornes = np.concatenate(([0], changements, [plat.size]))
+    comptes = np.diff(bornes).tolist()
+    if plat.size and plat[0]:
+        comptes.insert(0, 0)
+
+    return {
+        "encodage": "rle",
+        "hauteur": int(mask_bin.shape[0]),
+        "largeur": int(mask_bin.shape[1]),
+        "comptes": comptes
+    }
+
+
+def construire_reponse_compacte(filename, resultat_id, mask_bin, detections_info, masque="rle"):
+    """
+    Réponse compacte : boîtes et scores en JSON, masque RLE (ou PNG), overlay sur demande
+    """
+    if masque == "png":
+        mask = {"encodage": "png", "donnees": base64.b64encode(encoder_masque_png(mask_bin)).decode('utf-8')}
+    else:
+        mask = encoder_masque_rle(mask_bin)
+
+    reponse = construire_entete_compacte(filename, resultat_id, detections_info)
+    reponse["mask"] = mask
+    return reponse
+
+
+def construire_entete_compacte(filename, resultat_id, detections_info):
+    num_detections = len(detections_info)
+    return {
+        "status": "success",
+        "message": f"Analyse terminée - {num_detections} zone(s) suspecte(s) détectée(s)",
+        "num_detections": num_detections,
+        "detections": detections_info,
+        "resultat_id": resultat_id,
+        "overlay_url": f"/analyse/resultats/{resultat_id}/overlay",
+        "filename": filename
+    }
+
+
+def construire_reponse_multipart(filename, resultat_id, mask_bin, detections_info):
+    """
+    Réponse multipart/mixed : une partie JSON (boîtes, scores) et une partie PNG (masque)
+    """
+    separateur = uuid.uuid4().hex
+    entete = json.dumps(construire_entete_compacte(filename, resultat_id, detections_info)).encode("utf-8")
+
+    corps = b"".join([
+        f"--{separateur}\r\nContent-Type: application/json\r\n\r\n".encode(),
+        entete,
+        f"\r\n--{separateur}\r\nContent-Type: image/png\r\nContent-Disposition: inline; name=\"mask\"\r\n\r\n".encode(),
+        encoder_masque_png(mask_bin),
+        f"\r\n--{separateur}--\r\n".encode(),
+    ])
+    return Response(content=corps, media_type=f"multipart/mixed; boundary={separateur}")
+
+
+async def formater_reponse(filename, img, mask_bin, detections_info, format_reponse=FORMAT_JSON, masque="rle"):
+    """Met en forme le résultat d'une analyse selon le format négocié"""
+    if format_reponse == FORMAT_JSON:
+        return await executeur.executer(construire_reponse, filename, img, mask_bin, detections_info)
+
+    # L'image est gardée pour rendre l'overlay à la demande
+    resultat_id = uuid.uuid4().hex
+    resultats_recents.set(resultat_id, (img, detections_info))
+
+    if format_reponse == FORMAT_MULTIPART:
+        return await executeur.executer(construire_reponse_multipart, filename, resultat_id, mask_bin, detections_info)
+    return await executeur.executer(construire_reponse_compacte, filename, resultat_id, mask_bin, detections_info, masque)
+
+
+async def recuperer_overlay(resultat_id: str):
+    """
+    Rend l'image avec les boîtes d'un résultat récent (JPEG)
+    """
+    resultat = resultats_recents.get(resultat_id)
+    if resultat is None:
+        raise HTTPException(status_code=404, detail="Résultat introuvable ou expiré")
+
+    img, detections_info = resultat
+
+    def rendre():
+        _, img_with_boxes = dessiner_boites(img, detections_info)
         _, buffer_boxes = cv2.imencode('.jpg', img_with_boxes)
-        img_boxes_base64 = base64.b64encode(buffer_boxes).decode('utf-8')
-
-        # Convertir le masque binaire en image visualisable (0-255) puis encoder
-        mask_visual = (mask_bin * 255).astype(np.uint8)
-        _, buffer_mask = cv2.imencode('.png', mask_visual)
-        mask_base64 = base64.b64encode(buffer_mask).decode('utf-8')
-
-        return {
-            "status": "success",
-            "message": f"Analyse terminée - {num_detections} zone(s) suspecte(s) détectée(s)",
-            "num_detections": num_detections,
-            "image_original": f"data:image/jpeg;base64,{img_original_base64}",
-            "image_with_boxes": f"data:image/jpeg;base64,{img_boxes_base64}",
-            "mask": f"data:image/png;base64,{mask_base64}",
-            "filename": image.filename
-        }
+        return buffer_boxes.tobytes()
+
+    return Response(content=await executeur.executer(rendre), media_type="image/jpeg")
+
+
+async def inferer_masque(img, mode=MODE_COMPLET, threshold=0.5):
+    """
+    Prédit le masque de probabilité d'une image
+
+    Les images dont l'inférence pleine image dépasserait le plafond mémoire
+    (ANALYSE_TUILE_MEMOIRE_MAX_MO) passent par l'inférence par tuiles, les
+    autres par le planificateur de lots.
+    En mode deux étapes, seules les régions candidates sont analysées à pleine résolution.
+    """
+    if mode == MODE_DEUX_ETAPES:
+        return await inferer_deux_etapes(img, threshold)
+    if depasse_plafond(img.shape[:2]):
+        return await executeur.inferer_tuiles(img)
+    return await planificateur.soumettre(img)
+
+
+async def inferer_deux_etapes(img, threshold=0.5):
+    """
+    Étape grossière sur l'image réduite, puis étape fine sur les recadrages
+    candidats (groupés par le planificateur), assemblées en un masque pleine résolution
+    """
+    reduite = await executeur.executer(grossier_fin.reduire, img)
+    pred_reduite = await inferer_masque(reduite)
+    boites = await executeur.executer(grossier_fin.recadrages, pred_reduite, img.shape, threshold)
+
+    # Candidats trop étendus : l'inférence complète coûte moins cher que les recadrages
+    if grossier_fin.couverture(boites, img.shape) > grossier_fin.GROSSIER_COUVERTURE_MAX:
+        return await inferer_masque(img)
+
+    preds = await asyncio.gather(*(
+        inferer_masque(np.ascontiguousarray(img[y0:y1, x0:x1])) for x0, y0, x1, y1 in boites
+    ))
+    return await executeur.executer(grossier_fin.assembler, pred_reduite, img.shape, boites, preds)
+
+
+def choisir_mode(mode=None):
+    """Mode d'analyse de la requête, sinon ANALYSE_MODE"""
+    mode = mode or ANALYSE_MODE
+    if mode not in grossier_fin.MODES:
+        raise HTTPException(status_code=400, detail=f"Mode d'analyse inconnu: {mode}")
+    return mode
+
+
+async def analyser_upload(image: UploadFile, threshold=0.5, min_area=50, mode=MODE_COMPLET):
+    """
+    Analyse un upload en passant par le planificateur de lots
+
+    Le décodage, l'inférence et le post-traitement sont exécutés hors de la
+    boucle asyncio pour ne pas bloquer les autres requêtes du worker.
+
+    Returns:
+        (img, mask_bin, detections_info)
+    """
+    img = await executeur.executer(lire_image_upload, image)
+    return (img, *await analyser_image(img, threshold, min_area, mode=mode))
+
+
+async def analyser_image(img, threshold=0.5, min_area=50, progression=None, mode=MODE_COMPLET):
+    """
+    Analyse une image décodée : cache, inférence puis post-traitement
+
+    Args:
+        progression: Coroutine optionnelle appelée avec (etape, pourcentage)
+        mode: complet ou deux_etapes (fait partie de la clé de cache)
+
+    Returns:
+        (mask_bin, detections_info)
+    """
+    # Une image déjà analysée avec les mêmes paramètres et le même modèle est servie depuis le cache
+    if CACHE_ACTIF:
+        cle = await executeur.executer(cache_analyse.cle, img, threshold, min_area, mode)
+        resultat = await executeur.executer(cache_analyse.get, cle)
+        if resultat is not None:
+            return resultat
+
+    if progression is not None:
+        await progression("inference", 20)
+    mask_pred = await inferer_masque(img, mode, threshold)
+
+    if progression is not None:
+        await progression("post_traitement", 80)
+    mask_bin, detections_info = await executeur.executer(analyser_masque, mask_pred, threshold, min_area)
+
+    if CACHE_ACTIF:
+        await executeur.executer(cache_analyse.set, cle, mask_bin, detections_info)
+    return mask_bin, detections_info
+
+
+async def effectuer_analyse(image: UploadFile, format_reponse=FORMAT_JSON, masque="rle", mode=None):
+    """
+    Analyse une image mammographique
+    """
+    verifier_extension(image)
+
+    try:
+        async with executeur.admission():
+            resultat = await analyser_upload(image, mode=choisir_mode(mode))
+            return await formater_reponse(image.filename, *resultat, format_reponse, masque)
+
+    except HTTPException:
+        raise
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur lors de l'analyse: {str(e)}")
 
-    finally:
-        # Nettoyer le fichier temporaire
-        if file_path.exists():
-            file_path.unlink()
 
+async def effectuer_analyse_batch(images: list[UploadFile], format_reponse=FORMAT_JSON, masque="rle", mode=None):
+    """
+    Analyse plusieurs images mammographiques en une requête
+
+    Les images passent par le même planificateur que /analyse : elles sont
+    regroupées dans les mêmes passes avant que les requêtes concurrentes.
+    Le format multipart n'existe pas en lot : le format compact est utilisé.
+    """
+    for image in images:
+        verifier_extension(image)
+
+    if format_reponse == FORMAT_MULTIPART:
+        format_reponse = FORMAT_COMPACT
+    mode = choisir_mode(mode)
+
+    async def analyser(image):
+        try:
+            resultat = await analyser_upload(image, mode=mode)
+            return await formater_reponse(image.filename, *resultat, format_reponse, masque)
+        except Exception as e:
+            return {
+                "status": "error",
+                "message": f"Erreur lors de l'analyse: {str(e)}",
+                "filename": image.filename
+            }
+
+    async with executeur.admission(len(images)):
+        resultats = await asyncio.gather(*(analyser(image) for image in images))
+
+    return {
+        "status": "success",
+        "num_images": len(resultats),
+        "resultats": resultats
+    }
 
 
 
 
-def predict_and_draw_boxes(img_path, model, device, threshold=0.5, min_area=50):
+
+def charger_image(img_path):
+    """Charge une image en niveaux de gris"""
+    img = cv2.imread(img_path, cv2.IMREAD_GRAYSCALE)
+    if img is None:
+        raise ValueError(f"Impossible de charger l'image: {img_path}")
+    return img
+
+
+def predict_and_draw_boxes(img_path, model, device, threshold=0.5, min_area=50, mode=ANALYSE_MODE):
     """
     Effectue la prédiction sur une image mammographique et dessine les boîtes de détection
 
@@ -79,6 +464,7 @@ def predict_and_draw_boxes(img_path, model, device, threshold=0.5, min_area=50):
         device: Device PyTorch (cpu ou cuda)
         threshold: Seuil de confiance pour la détection (0-1)
         min_area: Aire minimale pour considérer une détection valide
+        mode: complet, ou deux_etapes (image réduite puis recadrages pleine résolution)
 
     Returns:
         img_original: Image originale en couleur
@@ -89,89 +475,169 @@ def predict_and_draw_boxes(img_path, model, device, threshold=0.5, min_area=50):
     model.eval()
 
     # Charger l'image en niveaux de gris
-    img = cv2.imread(img_path, cv2.IMREAD_GRAYSCALE)
-    if img is None:
-        raise ValueError(f"Impossible de charger l'image: {img_path}")
+    img = charger_image(img_path)
+    print(f"Image chargée - Dimensions: {img.shape}")
 
-    original_shape = img.shape
-    print(f"Image chargée - Dimensions: {original_shape}")
+    # Inférence (lot d'une seule image)
+    if mode == MODE_DEUX_ETAPES:
+        mask_pred = grossier_fin.inferer_deux_etapes(img, lambda x: inferer_lot(model, device, [x])[0], threshold)
+    else:
+        mask_pred = inferer_lot(model, device, [img])[0]
 
-    # Normalisation (0-1)
-    img_normalized = img.astype(np.float32) / 255.0
+    img_original, img_with_boxes, mask_bin, num_detections, _ = post_traiter(img, mask_pred, threshold, min_area)
+    return img_original, img_with_boxes, mask_bin, num_detections
 
-    # Préparation du tensor pour le modèle (B, C, H, W)
-    img_tensor = torch.from_numpy(img_normalized).unsqueeze(0).unsqueeze(0).to(device)
-    print(f"Tensor shape: {img_tensor.shape}")
 
-    # Inférence
-    with torch.no_grad():
-        mask_pred = model(img_tensor)
-
-        # Appliquer sigmoid si le modèle ne le fait pas déjà
-        if mask_pred.max() > 1.0 or mask_pred.min() < 0:
-            mask_pred = torch.sigmoid(mask_pred)
-            print("Sigmoid appliqué au masque de prédiction")
+def rechercher_seuil(mask_pred, threshold=0.5, min_area=50):
+    """
+    Évalue tous les seuils candidats et retourne les régions du meilleur
 
-        mask_pred = mask_pred.squeeze().cpu().numpy()
+    Le masque est quantifié une seule fois en niveaux (un niveau par seuil
+    candidat), l'étiquetage est limité à la zone englobant les pixels au-dessus
+    du plus petit seuil, et chaque seuil est évalué par une analyse en
+    composantes connexes (8-connexité) avec statistiques. L'étiquetage du
+    seuil retenu est réutilisé pour les boîtes et les scores. L'aire d'une
+    région est son nombre de pixels, son score la probabilité moyenne.
 
-    print(f"Masque prédit - Min: {mask_pred.min():.4f}, Max: {mask_pred.max():.4f}, Mean: {mask_pred.mean():.4f}")
+    Returns:
+        best_threshold: Seuil retenu
+        mask_bin: Masque binaire pleine résolution (uint8)
+        regions: Liste de (x, y, w, h, area, score) des régions d'aire > min_area
+    """
+    mean = float(mask_pred.mean())
+
+    # Même ordre de priorité qu'auparavant : à égalité, le premier seuil l'emporte
+    thresholds_to_try = [threshold, 0.3, 0.5, 0.7, mean]
+    seuils = np.unique(np.asarray(thresholds_to_try, dtype=np.float32))
+
+    # niveaux > j  <=>  mask_pred > seuils[j]
+    niveaux = np.zeros(mask_pred.shape, dtype=np.uint8)
+    for s in seuils:
+        niveaux += mask_pred > s
+
+    # Zone englobant les pixels au-dessus du plus petit seuil
+    lignes = np.flatnonzero(niveaux.any(axis=1))
+    colonnes = np.flatnonzero(niveaux.any(axis=0))
+    if lignes.size:
+        y0, x0 = int(lignes[0]), int(colonnes[0])
+        y1, x1 = int(lignes[-1]) + 1, int(colonnes[-1]) + 1
+    else:
+        y0 = x0 = y1 = x1 = 0
+    zone = niveaux[y0:y1, x0:x1]
 
-    # Recherche du meilleur seuil
-    thresholds_to_try = [threshold, 0.3, 0.5, 0.7, mask_pred.mean()]
     best_threshold = threshold
+    best_index = int(np.searchsorted(seuils, np.float32(threshold)))
     max_detections = 0
+    meilleur = None
+    evalues = set()
 
     for t in thresholds_to_try:
-        mask_temp = (mask_pred > t).astype(np.uint8)
-        contours_temp, _ = cv2.findContours(mask_temp, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        num_valid = sum(1 for cnt in contours_temp if cv2.contourArea(cnt) > min_area)
-
-        if num_valid > max_detections:
-            max_detections = num_valid
+        j = int(np.searchsorted(seuils, np.float32(t)))
+        if j in evalues:
+            continue
+        evalues.add(j)
+
+        binaire = (zone > j).view(np.uint8)
+        if not binaire.any():
+            continue
+        _, labels, stats, _ = cv2.connectedComponentsWithStats(binaire, connectivity=8)
+        valides = np.flatnonzero(stats[1:, cv2.CC_STAT_AREA] > min_area) + 1
+
+        if len(valides) > max_detections:
+            max_detections = len(valides)
             best_threshold = t
+            best_index = j
+            meilleur = (labels, stats, valides)
 
     print(f"Meilleur seuil trouvé: {best_threshold:.4f} avec {max_detections} détection(s)")
 
     # Binariser le masque avec le meilleur threshold
-    mask_bin = (mask_pred > best_threshold).astype(np.uint8)
+    mask_bin = (niveaux > best_index).view(np.uint8)
+
+    regions = []
+    if meilleur is not None:
+        labels, stats, valides = meilleur
+        sommes = np.bincount(labels.ravel(), weights=mask_pred[y0:y1, x0:x1].ravel(), minlength=len(stats))
+        for k in valides:
+            x, y, w, h, area = (int(v) for v in stats[k])
+            regions.append((x + x0, y + y0, w, h, area, float(sommes[k] / area)))
+
+    return best_threshold, mask_bin, regions
+
+
+def analyser_masque(mask_pred, threshold=0.5, min_area=50):
+    """
+    Binarise le masque prédit et décrit les zones détectées
+
+    Returns:
+        mask_bin: Masque binaire de segmentation
+        detections_info: Liste des zones détectées (boîte, aire, score)
+    """
+    print(f"Masque prédit - Min: {mask_pred.min():.4f}, Max: {mask_pred.max():.4f}, Mean: {mask_pred.mean():.4f}")
+
+    _, mask_bin, regions = rechercher_seuil(mask_pred, threshold, min_area)
+
+    detections_info = []
+    for x, y, w, h, area, score in regions:
+        detections_info.append({
+            "id": len(detections_info) + 1,
+            "x": x,
+            "y": y,
+            "width": w,
+            "height": h,
+            "area": float(area),
+            "score": round(score, 4)
+        })
 
-    # Trouver les contours
-    contours, _ = cv2.findContours(mask_bin, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        print(f"Zone {len(detections_info)}: x={x}, y={y}, w={w}, h={h}, area={area:.0f}, score={score:.3f}")
 
+    print(f"✓ {len(detections_info)} zone(s) suspecte(s) détectée(s)\n")
+
+    return mask_bin, detections_info
+
+
+def dessiner_boites(img, detections_info):
+    """
+    Returns:
+        img_original: Image originale en couleur
+        img_with_boxes: Image avec les boîtes de détection
+    """
     # Convertir l'image en couleur
-    img_color = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
-    img_original = img_color.copy()
-    img_with_boxes = img_color.copy()
+    img_original = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+    img_with_boxes = img_original.copy()
 
     # Dessiner les rectangles de détection
-    num_detections = 0
-    detections_info = []
+    for detection in detections_info:
+        x, y, w, h = detection["x"], detection["y"], detection["width"], detection["height"]
 
-    for cnt in contours:
-        area = cv2.contourArea(cnt)
-        if area > min_area:
-            x, y, w, h = cv2.boundingRect(cnt)
+        # Dessiner le rectangle JAUNE
+        cv2.rectangle(img_with_boxes, (x, y), (x+w, y+h), (0, 255, 255), 4)
 
-            # Dessiner le rectangle JAUNE
-            cv2.rectangle(img_with_boxes, (x, y), (x+w, y+h), (0, 255, 255), 4)
+        # Ajouter un label avec le numéro
+        label = f"#{detection['id']}"
+        cv2.putText(img_with_boxes, label, (x, y-10),
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 255, 255), 2)
 
-            # Ajouter un label avec le numéro
-            num_detections += 1
-            label = f"#{num_detections}"
-            cv2.putText(img_with_boxes, label, (x, y-10),
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 255, 255), 2)
+    return img_original, img_with_boxes
 
-            detections_info.append({
-                "id": num_detections,
-                "x": int(x),
-                "y": int(y),
-                "width": int(w),
-                "height": int(h),
-                "area": float(area)
-            })
 
-            print(f"Zone {num_detections}: x={x}, y={y}, w={w}, h={h}, area={area:.0f}")
+def post_traiter(img, mask_pred, threshold=0.5, min_area=50):
+    """
+    Choisit le seuil de binarisation et dessine les boîtes de détection
 
-    print(f"✓ {num_detections} zone(s) suspecte(s) détectée(s)\n")
+    Args:
+        img: Image originale en niveaux de gris (uint8)
+        mask_pred: Masque de probabilité prédit par le modèle
+        threshold: Seuil de confiance pour la détection (0-1)
+        min_area: Aire minimale pour considérer une détection valide
 
-    return img_original, img_with_boxes, mask_bin, num_detections
\ No newline at end of file
+    Returns:
+        img_original: Image originale en couleur
+        img_with_boxes: Image avec les boîtes de détection
+        mask_bin: Masque binaire de segmentation
+        num_detections: Nombre de zones détectées
+        detections_info: Liste des zones détectées (boîte, aire, score)
+    """
+    mask_bin, detections_info = analyser_masque(mask_pred, threshold, min_area)
+    img_original, img_with_boxes = dessiner_boites(img, detections_info)
+    return img_original, img_with_boxes, mask_bin, len(detections_info), detections_info
@@ -0,0 +1,167 @@
+"""
+Création d'utilisateurs en masse (ouverture d'une clinique)
+
+Les lignes (CSV, tableau JSON ou NDJSON, voir services/lecture_lots.py)
+sont validées une à une (UtilisateurRequest, rôle connu, email unique dans
+le fichier), puis :
+- les emails déjà en base sont recherchés en une seule requête (sans
+  distinction de casse, comme les doublons du fichier) ;
+- les mots de passe sont hachés en parallèle dans le pool de processus
+  partagé de services/hachage_mots_de_passe.py (un import à la fois) ;
+- les comptes sont insérés par instructions multi-lignes (INSERT ... VALUES
+  (...), (...) RETURNING id), dans une seule transaction.
+
+Chaque ligne reçoit son propre compte rendu : créée (avec son id) ou en
+erreur (avec les raisons). Avec `tout_ou_rien`, aucune ligne n'est insérée
+si l'une d'elles est en erreur.
+"""
+import os
+from dotenv import load_dotenv
+from pydantic import ValidationError
+from sqlalchemy import select, insert, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from schema.utilisateur_schema import UtilisateurRequest, RoleEnum
+from model.utilisateur_model import Utilisateur
+from .hachage_mots_de_passe import hachage
+from .lecture_lots import par_paquets
+from .utilisateurs_services import invalider_principal
+
+load_dotenv()
+
+# Lignes par instruction INSERT multi-lignes
+IMPORT_TAILLE_INSERTION = int(os.getenv("IMPORT_TAILLE_INSERTION", "500"))
+# Nombre maximal de lignes par import
+IMPORT_LIGNES_MAX = int(os.getenv("IMPORT_LIGNES_MAX", "10000"))
+# Taille maximale du fichier envoyé à POST /utilisateurs/import (Mo)
+IMPORT_TAILLE_MAX = int(float(os.getenv("IMPORT_TAILLE_MAX_MO", "16")) * 1024 * 1024)
+
+ROLES = {role.value for role in RoleEnum}
+
+
+class ImportTropVolumineux(ValueError):
+    pass
+
+
+class ConflitImport(Exception):
+    """Un email a été créé par une autre requête pendant l'import"""
+
+
+def _erreur(resultat, champ, message):
+    resultat["statut"] = "erreur"
+    resultat.setdefault("erreurs", []).append({"champ": champ, "message": message})
+
+
+def valider_lignes(lignes):
+    """
+    Args:
+        lignes: Itérable de (numéro, dict ou exception de lecture)
+
+    Returns:
+        (comptes rendus dans l'ordre, [(compte rendu, UtilisateurRequest)] des lignes valides)
+    """
+    resultats = []
+    valides = []
+    emails = {}
+    for numero, valeurs in lignes:
+        if len(resultats) >= IMPORT_LIGNES_MAX:
+            raise ImportTropVolumineux(f"Import limité à {IMPORT_LIGNES_MAX} lignes")
+
+        resultat = {"ligne": numero, "statut": "cree"}
+        resultats.append(resultat)
+        if isinstance(valeurs, Exception):
+            _erreur(resultat, None, str(valeurs))
+            continue
+        if isinstance(valeurs, dict) and valeurs.get("email"):
+            resultat["email"] = str(valeurs["email"])
+
+        try:
+            # Rôle absent (cellule CSV vide) : rôle par défaut du schéma
+            donnees = {cle: valeur for cle, valeur in valeurs.items() if not (cle == "role" and valeur is None)}
+            utilisateur = UtilisateurRequest.model_validate(donnees)
+        except ValidationError as e:
+            for erreur in e.errors():
+                _erreur(resultat, ".".join(str(p) for p in erreur["loc"]) or None, erreur["msg"])
+            continue
+        except AttributeError:
+            _erreur(resultat, None, "La ligne doit être un objet")
+            continue
+
+        if utilisateur.role not in ROLES:
+            _erreur(resultat, "role", f"Rôle inconnu (rôles acceptés: {', '.join(sorted(ROLES))})")
+            continue
+        email = utilisateur.email
+        if email in emails:
+            _erreur(resultat, "email", f"Email en double dans le fichier (ligne {emails[email]})")
+            continue
+        emails[email] = numero
+        valides.append((resultat, utilisateur))
+
+    return resultats, valides
+
+
+async def importer_utilisateurs(lignes, db: AsyncSession, tout_ou_rien=False):
+    """
+    Valide, hache et insère un lot d'utilisateurs
+
+    Raises:
+        ImportTropVolumineux: plus de IMPORT_LIGNES_MAX lignes
+        ConflitImport: email créé entre la vérification et l'insertion (rien n'est inséré)
+        HTTPException: un autre import est en cours de hachage (503/429)
+
+    Returns:
+        {"resume": {...}, "lignes": [compte rendu par ligne]}
+    """
+    # Lecture et validation hors de la boucle asyncio
+    resultats, valides = await run_in_threadpool(valider_lignes, lignes)
+
+    # Unicité : une seule requête pour tous les emails du fichier, sans distinction de casse
+    if valides:
+        existants = set((await db.execute(
+            select(func.lower(Utilisateur.email)).where(
+                func.lower(Utilisateur.email).in_([u.email for _, u in valides])
+            )
+        )).scalars())
+        # Fin de la transaction de lecture : la connexion retourne au pool pendant le hachage
+        await db.commit()
+        restants = []
+        for resultat, utilisateur in valides:
+            if utilisateur.email in existants:
+                _erreur(resultat, "email", "Email déjà utilisé")
+            else:
+                restants.append((resultat, utilisateur))
+        valides = restants
+
+    nb_erreurs = sum(1 for resultat in resultats if resultat["statut"] == "erreur")
+    if tout_ou_rien and nb_erreurs:
+        for resultat, _ in valides:
+            resultat["statut"] = "non_cree"
+        valides = []
+
+    if valides:
+        hashes = await hachage.hacher_lot([u.password for _, u in valides])
+        comptes = [
+            {"nom": u.nom, "prenom": u.prenom, "email": u.email, "role": u.role, "password": hash_}
+            for (_, u), hash_ in zip(valides, hashes)
+        ]
+        ids = {}
+        try:
+            for paquet in par_paquets(comptes, IMPORT_TAILLE_INSERTION):
+                crees = await db.execute(insert(Utilisateur).returning(Utilisateur.id, Utilisateur.email), paquet)
+                ids.update({email: id_ for id_, email in crees})
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
+            raise ConflitImport("Un des emails a été créé pendant l'import, aucun compte n'a été créé")
+
+        for resultat, utilisateur in valides:
+            resultat["id"] = ids[utilisateur.email]
+            invalider_principal(utilisateur.email)
+
+    crees = sum(1 for resultat in resultats if resultat["statut"] == "cree")
+    return {
+        "resume": {"lignes": len(resultats), "crees": crees, "erreurs": nb_erreurs},
+        "lignes": resultats,
+    }
@@ -0,0 +1,194 @@
+"""
+Lecture de fichiers de lots (tableau JSON, NDJSON, CSV) ligne par ligne
+
+Chaque lecteur produit des couples (numéro de ligne, dict des champs) ;
+une ligne illisible est produite avec une exception à la place du dict
+pour être signalée sans interrompre le lot. NDJSON et CSV sont lus au fil
+de l'eau, un tableau JSON est décodé d'un bloc.
+"""
+import csv
+import io
+import json
+import tempfile
+from pathlib import Path
+from fastapi import HTTPException, Request
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import UploadFile
+from starlette.formparsers import MultiPartParser, MultiPartException
+
+FORMAT_JSON = "json"
+FORMAT_NDJSON = "ndjson"
+FORMAT_CSV = "csv"
+FORMATS = (FORMAT_JSON, FORMAT_NDJSON, FORMAT_CSV)
+
+EXTENSIONS = {".json": FORMAT_JSON, ".ndjson": FORMAT_NDJSON, ".jsonl": FORMAT_NDJSON, ".csv": FORMAT_CSV}
+# Taille par défaut au-delà de laquelle un lot reçu est déversé sur disque
+MEMOIRE_MAX = 16 * 1024 * 1024
+# Octets accumulés avant chaque écriture dans le fichier du lot (hors boucle asyncio)
+TAILLE_ECRITURE = 1024 * 1024
+
+TYPES_CONTENU = {
+    "application/json": FORMAT_JSON,
+    "application/x-ndjson": FORMAT_NDJSON,
+    "application/ndjson": FORMAT_NDJSON,
+    "application/jsonl": FORMAT_NDJSON,
+    "text/csv": FORMAT_CSV,
+}
+
+
+def detecter_format(nom=None, type_contenu=None, explicite=None):
+    """
+    Format du lot : paramètre explicite, sinon extension du fichier, sinon Content-Type
+
+    Raises:
+        ValueError: format inconnu ou impossible à déterminer
+    """
+    if explicite:
+        if explicite not in FORMATS:
+            raise ValueError(f"Format de lot inconnu: {explicite} (formats acceptés: {', '.join(FORMATS)})")
+        return explicite
+
+    if nom and Path(nom).suffix.lower() in EXTENSIONS:
+        return EXTENSIONS[Path(nom).suffix.lower()]
+
+    type_contenu = (type_contenu or "").split(";")[0].strip().lower()
+    if type_contenu in TYPES_CONTENU:
+        return TYPES_CONTENU[type_contenu]
+
+    raise ValueError(f"Format de lot indéterminé (formats acceptés: {', '.join(FORMATS)})")
+
+
+def _texte(fichier):
+    return io.TextIOWrapper(fichier, encoding="utf-8-sig", newline="")
+
+
+def lire_json(fichier):
+    """
+    Raises:
+        ValueError: contenu qui n'est pas un tableau JSON (levée avant la première ligne)
+    """
+    donnees = json.load(_texte(fichier))
+    if not isinstance(donnees, list):
+        raise ValueError("Le lot JSON doit être un tableau d'objets")
+    return ((numero, valeurs) for numero, valeurs in enumerate(donnees, start=1))
+
+
+def lire_ndjson(fichier):
+    for numero, ligne in enumerate(_texte(fichier), start=1):
+        ligne = ligne.strip()
+        if not ligne:
+            continue
+        try:
+            yield numero, json.loads(ligne)
+        except json.JSONDecodeError as e:
+            yield numero, ValueError(f"JSON invalide: {e.msg}")
+
+
+def lire_csv(fichier):
+    """
+    CSV avec en-tête (fichier positionnable) ; séparateur détecté parmi , ; et tabulation.
+    Les cellules vides sont lues comme des valeurs absentes (None).
+    """
+    texte = _texte(fichier)
+    echantillon = texte.read(64 * 1024)
+    try:
+        dialecte = csv.Sniffer().sniff(echantillon, delimiters=",;\t")
+    except csv.Error:
+        dialecte = csv.excel
+    texte.seek(0)
+    lecteur = csv.DictReader(texte, dialect=dialecte)
+    # Numéro de ligne du fichier : l'en-tête est la ligne 1
+    for numero, ligne in enumerate(lecteur, start=2):
+        if None in ligne:
+            yield numero, ValueError("Nombre de colonnes supérieur à l'en-tête")
+            continue
+        yield numero, {champ: (valeur if valeur != "" else None) for champ, valeur in ligne.items()}
+
+
+LECTEURS = {FORMAT_JSON: lire_json, FORMAT_NDJSON: lire_ndjson, FORMAT_CSV: lire_csv}
+
+
+def lire_lignes(fichier, format_lot):
+    """
+    Returns:
+        Itérateur de (numéro, dict ou exception)
+    """
+    if fichier.seekable():
+        fichier.seek(0)
+    return LECTEURS[format_lot](fichier)
+
+
+def par_paquets(iterable, taille):
+    """Regroupe un itérable en listes d'au plus `taille` éléments"""
+    paquet = []
+    for element in iterable:
+        paquet.append(element)
+        if len(paquet) >= taille:
+            yield paquet
+            paquet = []
+    if paquet:
+        yield paquet
+
+
+def _trop_volumineux(taille_max):
+    return HTTPException(status_code=413, detail=f"Lot trop volumineux (max {taille_max // (1024 * 1024)} Mo)")
+
+
+async def _flux_limite(request: Request, taille_max):
+    """Blocs du corps de la requête ; 413 dès que `taille_max` octets sont dépassés"""
+    recu = 0
+    async for bloc in request.stream():
+        recu += len(bloc)
+        if taille_max and recu > taille_max:
+            raise _trop_volumineux(taille_max)
+        yield bloc
+
+
+async def recevoir_lot(request: Request, format_lot=None, memoire_max=MEMOIRE_MAX, taille_max=0):
+    """
+    Corps d'un lot : fichier `fichier` d'un formulaire multipart, ou corps brut
+    (Content-Type application/json, application/x-ndjson ou text/csv)
+
+    Args:
+        taille_max: Taille maximale du corps en octets (0 = illimitée), vérifiée
+            sur Content-Length puis au fil de la réception (envoi chunked)
+
+    Returns:
+        (fichier binaire, format)
+    """
+    longueur = request.headers.get("content-length", "")
+    if taille_max and longueur.isdigit() and int(longueur) > taille_max:
+        raise _trop_volumineux(taille_max)
+
+    type_contenu = request.headers.get("content-type", "")
+    try:
+        if type_contenu.startswith("multipart/form-data"):
+            try:
+                formulaire = await MultiPartParser(request.headers, _flux_limite(request, taille_max)).parse()
+            except MultiPartException as e:
+                raise HTTPException(status_code=400, detail=e.message)
+            upload = formulaire.get("fichier")
+            if not isinstance(upload, UploadFile):
+                raise HTTPException(status_code=400, detail="Champ 'fichier' manquant")
+            return upload.file, detecter_format(upload.filename, upload.content_type, format_lot)
+
+        format_lot = detecter_format(None, type_contenu, format_lot)
+    except ValueError as e:
+        raise HTTPException(status_code=415, detail=str(e))
+
+    # Écritures par blocs d'environ 1 Mo dans le pool de threads : un déversement
+    # sur disque ne bloque pas la boucle
+    fichier = tempfile.SpooledTemporaryFile(max_size=memoire_max)
+    tampon = bytearray()
+    try:
+        async for bloc in _flux_limite(request, taille_max):
+            tampon += bloc
+            if len(tampon) >= TAILLE_ECRITURE:
+                await run_in_threadpool(fichier.write, bytes(tampon))
+                tampon.clear()
+        if tampon:
+            await run_in_threadpool(fichier.write, bytes(tampon))
+    except BaseException:
+        fichier.close()
+        raise
+    return fichier, format_lot
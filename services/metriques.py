@@ -0,0 +1,16 @@
+"""
+Registre léger des métriques exposées sur GET /metriques
+
+Chaque service enregistre une fonction sans argument retournant un dict ;
+seuls les services effectivement importés apparaissent.
+"""
+
+_sources = {}
+
+
+def enregistrer(nom, fonction):
+    _sources[nom] = fonction
+
+
+def collecter():
+    return {nom: fonction() for nom, fonction in _sources.items()}
@@ -0,0 +1,84 @@
+
+import copy
+from typing import List
+import torch
+import torch.nn.functional as F
+from torch.ao.quantization import (
+    QuantStub, DeQuantStub, fuse_modules, get_default_qconfig, default_qconfig, prepare, convert
+)
+from torch.ao.nn.quantized import FloatFunctional
+
+
+class UNetLightOptimise(torch.nn.Module):
+    """
+    Version de UNetLight destinée au service CPU (fusion Conv+BN+ReLU, INT8)
+
+    Reprend les poids d'un UNetLight entraîné ; le forward est écrit pour
+    être compilable en TorchScript et quantifiable en mode eager
+    (QuantStub/DeQuantStub, concaténation via FloatFunctional).
+    """
+
+    def __init__(self, unet):
+        super().__init__()
+        unet = copy.deepcopy(unet).eval()
+        self.quant = QuantStub()
+        self.dequant = DeQuantStub()
+        self.downs = unet.downs
+        self.pool = unet.pool
+        self.bottleneck = unet.bottleneck
+        self.up_transposes = torch.nn.ModuleList([unet.ups[i] for i in range(0, len(unet.ups), 2)])
+        self.up_convs = torch.nn.ModuleList([unet.ups[i] for i in range(1, len(unet.ups), 2)])
+        self.cats = torch.nn.ModuleList([FloatFunctional() for _ in self.up_convs])
+        self.final_conv = unet.final_conv
+
+    def forward(self, x):
+        x = self.quant(x)
+        skip: List[torch.Tensor] = []
+        for down in self.downs:
+            x = down(x)
+            skip.append(x)
+            x = self.pool(x)
+        x = self.bottleneck(x)
+        skip = skip[::-1]
+        for i, (up, conv, cat) in enumerate(zip(self.up_transposes, self.up_convs, self.cats)):
+            x = up(x)
+            s = skip[i]
+            if x.shape != s.shape:
+                x = F.interpolate(x, size=s.shape[2:])
+            x = cat.cat([s, x], 1)
+            x = conv(x)
+        x = self.dequant(self.final_conv(x))
+        return torch.sigmoid(x)
+
+
+def fusionner(unet):
+    """Fusionne Conv2d+BatchNorm2d+ReLU dans chaque DoubleConv"""
+    modele = UNetLightOptimise(unet).eval()
+    for double_conv in list(modele.downs) + [modele.bottleneck] + list(modele.up_convs):
+        fuse_modules(double_conv.conv, [["0", "1", "2"], ["3", "4", "5"]], inplace=True)
+    return modele
+
+
+def quantifier_int8(unet, images_calibration, moteur="x86"):
+    """
+    Quantification statique INT8 calibrée sur des images (tensors 1x1xHxW, 0-1)
+    """
+    torch.backends.quantized.engine = moteur
+    modele = fusionner(unet)
+    modele.qconfig = get_default_qconfig(moteur)
+    # ConvTranspose2d ne supporte que la quantification par tenseur
+    for up in modele.up_transposes:
+        up.qconfig = default_qconfig
+
+    prepare(modele, inplace=True)
+    with torch.no_grad():
+        for img in images_calibration:
+            modele(img)
+    convert(modele, inplace=True)
+    return modele
+
+
+def compiler(modele):
+    """Compile le modèle optimisé en TorchScript (artefact de service)"""
+    modele.eval()
+    return torch.jit.script(modele)
@@ -0,0 +1,226 @@
+"""
+Noyau d'inférence numpy du modèle de risque tabulaire
+
+L'estimateur sklearn ajusté est exporté une fois (scripts/exporter_noyau.py)
+en tableaux numpy dans un fichier .npz, avec la disposition des colonnes du
+VectoriseurRisque. Le noyau l'évalue avec numpy seul : pas de validation
+d'entrée sklearn par appel, et ni sklearn, ni pandas, ni scipy à importer
+dans le worker.
+
+Estimateurs pris en charge :
+- modèles linéaires de régression (coef_, intercept_) : X @ coef + intercept ;
+- arbres de régression (DecisionTree, ExtraTree) et ensembles RandomForest,
+  ExtraTrees, GradientBoosting : nœuds de tous les arbres mis bout à bout
+  dans des tableaux plats, parcourus niveau par niveau pour toutes les lignes
+  et tous les arbres à la fois.
+"""
+import json
+import numpy as np
+
+from .vectoriseur_diagnostic import VectoriseurRisque
+
+TYPE_LINEAIRE = "lineaire"
+TYPE_ARBRES = "arbres"
+
+# Agrégation des arbres : moyenne (forêts) ou somme pondérée (gradient boosting)
+AGREGATION_MOYENNE = "moyenne"
+AGREGATION_SOMME = "somme"
+
+# Version du format du fichier exporté
+VERSION_FORMAT = 1
+
+
+def _tableaux_arbres(arbres):
+    """
+    Nœuds de plusieurs arbres sklearn dans des tableaux plats
+
+    Les indices des enfants sont décalés de la position de l'arbre ; une
+    feuille a pour enfants elle-même, ce qui fige son indice pendant le parcours.
+    """
+    gauche, droite, variable, seuil, valeur, manquant_gauche, racines = [], [], [], [], [], [], []
+    decalage = 0
+    profondeur = 0
+    for arbre in arbres:
+        t = arbre.tree_
+        indices = np.arange(t.node_count)
+        feuille = t.children_left < 0
+        gauche.append(np.where(feuille, indices, t.children_left) + decalage)
+        droite.append(np.where(feuille, indices, t.children_right) + decalage)
+        variable.append(np.where(feuille, 0, t.feature))
+        seuil.append(t.threshold)
+        valeur.append(t.value[:, 0, 0])
+        manquant = getattr(t, "missing_go_to_left", None)
+        manquant_gauche.append(np.zeros(t.node_count, dtype=bool) if manquant is None else manquant.astype(bool))
+        racines.append(decalage)
+        decalage += t.node_count
+        profondeur = max(profondeur, t.max_depth)
+
+    return {
+        "gauche": np.concatenate(gauche).astype(np.int32),
+        "droite": np.concatenate(droite).astype(np.int32),
+        "variable": np.concatenate(variable).astype(np.int32),
+        "seuil": np.concatenate(seuil).astype(np.float64),
+        "valeur": np.concatenate(valeur).astype(np.float64),
+        "manquant_gauche": np.concatenate(manquant_gauche),
+        "racines": np.array(racines, dtype=np.int32),
+        "profondeur": np.array(profondeur, dtype=np.int32),
+    }
+
+
+def tableaux_estimateur(modele):
+    """
+    Représentation en tableaux d'un estimateur sklearn ajusté
+
+    Raises:
+        ValueError: estimateur non pris en charge
+
+    Returns:
+        (type, {nom: tableau numpy})
+    """
+    from sklearn import ensemble, tree
+
+    if isinstance(modele, (tree.DecisionTreeRegressor, tree.ExtraTreeRegressor)):
+        return TYPE_ARBRES, {
+            **_tableaux_arbres([modele]),
+            "agregation": np.array(AGREGATION_MOYENNE),
+            "base": np.array(0.0),
+            "poids": np.array(1.0),
+        }
+
+    if isinstance(modele, (ensemble.RandomForestRegressor, ensemble.ExtraTreesRegressor)):
+        return TYPE_ARBRES, {
+            **_tableaux_arbres(modele.estimators_),
+            "agregation": np.array(AGREGATION_MOYENNE),
+            "base": np.array(0.0),
+            "poids": np.array(1.0),
+        }
+
+    if isinstance(modele, ensemble.GradientBoostingRegressor):
+        # Prédiction initiale constante (DummyRegressor), seul cas exportable
+        if not hasattr(modele.init_, "constant_"):
+            raise ValueError("GradientBoostingRegressor avec init personnalisé non pris en charge")
+        return TYPE_ARBRES, {
+            **_tableaux_arbres(modele.estimators_[:, 0]),
+            "agregation": np.array(AGREGATION_SOMME),
+            "base": np.array(float(np.ravel(modele.init_.constant_)[0])),
+            "poids": np.array(float(modele.learning_rate)),
+        }
+
+    if hasattr(modele, "coef_") and hasattr(modele, "intercept_") and not hasattr(modele, "classes_"):
+        coef = np.asarray(modele.coef_, dtype=np.float64)
+        if coef.ndim != 1:
+            raise ValueError("Régression à plusieurs sorties non prise en charge")
+        return TYPE_LINEAIRE, {
+            "coef": coef,
+            "intercept": np.array(float(np.ravel(modele.intercept_)[0]), dtype=np.float64),
+        }
+
+    raise ValueError(f"Estimateur non pris en charge: {type(modele).__name__}")
+
+
+def exporter(modele, vectoriseur, chemin, source_sha256=""):
+    """
+    Écrit le noyau (.npz) : tableaux de l'estimateur et disposition des colonnes
+
+    Args:
+        source_sha256: Empreinte de l'artefact joblib d'origine (contrôle au chargement)
+    """
+    type_noyau, tableaux = tableaux_estimateur(modele)
+    nb_variables = len(vectoriseur.colonnes)
+    if getattr(modele, "n_features_in_", nb_variables) != nb_variables:
+        raise ValueError("Le nombre de colonnes du vectoriseur ne correspond pas au modèle")
+
+    entete = {
+        "format": VERSION_FORMAT,
+        "type": type_noyau,
+        "estimateur": type(modele).__name__,
+        "source_sha256": source_sha256,
+        "disposition": vectoriseur.disposition(),
+    }
+    with open(chemin, "wb") as f:
+        np.savez(f, entete=np.array(json.dumps(entete, ensure_ascii=False)), **tableaux)
+
+
+class NoyauLineaire:
+
+    def __init__(self, coef, intercept):
+        self.coef = coef
+        self.intercept = float(intercept)
+
+    def predict(self, x):
+        return x @ self.coef + self.intercept
+
+
+class NoyauArbres:
+
+    def __init__(self, tableaux):
+        self.gauche = tableaux["gauche"]
+        self.droite = tableaux["droite"]
+        self.variable = tableaux["variable"]
+        self.seuil = tableaux["seuil"]
+        self.valeur = tableaux["valeur"]
+        self.manquant_gauche = tableaux["manquant_gauche"]
+        self.racines = tableaux["racines"]
+        self.profondeur = int(tableaux["profondeur"])
+        self.agregation = str(tableaux["agregation"])
+        self.base = float(tableaux["base"])
+        self.poids = float(tableaux["poids"])
+
+    def predict(self, x):
+        # sklearn compare des caractéristiques float32 aux seuils float64
+        x = np.asarray(x, dtype=np.float32).astype(np.float64)
+        lignes = np.arange(len(x))[:, None]
+        noeuds = np.broadcast_to(self.racines, (len(x), len(self.racines))).copy()
+
+        # Les feuilles bouclent sur elles-mêmes : max_depth pas suffisent pour tous les arbres
+        for _ in range(self.profondeur):
+            valeurs = x[lignes, self.variable[noeuds]]
+            vers_gauche = np.where(np.isnan(valeurs), self.manquant_gauche[noeuds], valeurs <= self.seuil[noeuds])
+            noeuds = np.where(vers_gauche, self.gauche[noeuds], self.droite[noeuds])
+
+        feuilles = self.valeur[noeuds]
+        if self.agregation == AGREGATION_MOYENNE:
+            return feuilles.mean(axis=1)
+        return self.base + self.poids * feuilles.sum(axis=1)
+
+
+class NoyauRisque:
+    """
+    Noyau chargé : même interface predict que l'estimateur, et son vectoriseur
+    """
+
+    def __init__(self, evaluateur, vectoriseur, entete):
+        self.evaluateur = evaluateur
+        self.vectoriseur = vectoriseur
+        self.entete = entete
+
+    @classmethod
+    def charger(cls, chemin):
+        with np.load(chemin, allow_pickle=False) as fichier:
+            tableaux = {nom: fichier[nom] for nom in fichier.files}
+        entete = json.loads(str(tableaux.pop("entete")))
+        if entete["format"] != VERSION_FORMAT:
+            raise ValueError(f"Format de noyau non pris en charge: {entete['format']}")
+
+        if entete["type"] == TYPE_LINEAIRE:
+            evaluateur = NoyauLineaire(tableaux["coef"], tableaux["intercept"])
+        elif entete["type"] == TYPE_ARBRES:
+            evaluateur = NoyauArbres(tableaux)
+        else:
+            raise ValueError(f"Type de noyau inconnu: {entete['type']}")
+        return cls(evaluateur, VectoriseurRisque.depuis_disposition(entete["disposition"]), entete)
+
+    def predict(self, x):
+        """
+        Args:
+            x: Tableau (n, nb_colonnes) ou vecteur (nb_colonnes,)
+
+        Returns:
+            Scores (n,)
+        """
+        x = np.asarray(x, dtype=np.float64)
+        if x.ndim == 1:
+            x = x[None, :]
+        if x.shape[1] != len(self.vectoriseur.colonnes):
+            raise ValueError(f"{x.shape[1]} colonnes reçues, {len(self.vectoriseur.colonnes)} attendues")
+        return self.evaluateur.predict(x)
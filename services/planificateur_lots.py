@@ -0,0 +1,139 @@
+import asyncio
+import os
+import time
+from dotenv import load_dotenv
+
+from .tuilage import MEMOIRE_TUILAGE_MAX_MO, OCTETS_PAR_PIXEL, depasse_plafond
+
+load_dotenv()
+
+# Nombre maximal d'images par passe avant du modèle
+TAILLE_LOT_MAX = int(os.getenv("ANALYSE_LOT_TAILLE_MAX", "8"))
+# Temps maximal (ms) d'attente pour compléter un lot
+ATTENTE_LOT_MAX_MS = float(os.getenv("ANALYSE_LOT_ATTENTE_MS", "10"))
+# Compléter les images de tailles différentes au lieu de les séparer
+PADDING_LOT = os.getenv("ANALYSE_LOT_PADDING", "0") == "1"
+# Nombre maximal de lots en cours d'inférence (par défaut, un par worker d'inférence)
+CONCURRENCE_LOTS = int(os.getenv("ANALYSE_LOT_CONCURRENCE", os.getenv("INFERENCE_WORKERS", "1")))
+
+
+class PlanificateurLots:
+    """
+    Regroupe les demandes d'analyse concurrentes en lots pour UNetLight
+
+    Les demandes sont collectées pendant au plus `attente_max_ms` millisecondes
+    ou jusqu'à `taille_max` images, regroupées par dimensions (ou complétées
+    si `padding` est actif) puis passées au modèle en une seule passe avant
+    via `inferer` (coroutine : liste d'images -> liste de masques).
+    Chaque appelant reçoit son propre masque.
+
+    Un lot est coupé dès que ses activations (pixels, padding compris, fois
+    OCTETS_PAR_PIXEL) dépasseraient `memoire_max_mo` ; une image qui dépasse
+    seule ce plafond passe par `inferer_tuiles`. Au plus `concurrence` lots
+    sont en cours : au-delà, les demandes attendent dans la file.
+    """
+
+    def __init__(self, inferer, inferer_tuiles=None, taille_max=TAILLE_LOT_MAX,
+                 attente_max_ms=ATTENTE_LOT_MAX_MS, padding=PADDING_LOT,
+                 memoire_max_mo=MEMOIRE_TUILAGE_MAX_MO, concurrence=CONCURRENCE_LOTS):
+        self.inferer = inferer
+        self.inferer_tuiles = inferer_tuiles
+        self.taille_max = max(1, taille_max)
+        self.attente_max_ms = attente_max_ms
+        self.padding = padding
+        self.memoire_max_mo = memoire_max_mo
+        self.concurrence = max(1, concurrence)
+        self._file = None
+        self._tache = None
+        self._places = None
+
+    async def soumettre(self, img):
+        """
+        Ajoute une image (uint8, niveaux de gris) au prochain lot et attend son masque
+        """
+        self._demarrer()
+        future = asyncio.get_running_loop().create_future()
+        await self._file.put((img, future))
+        return await future
+
+    def _demarrer(self):
+        # La boucle est créée paresseusement dans la boucle asyncio courante
+        if self._tache is None or self._tache.done():
+            self._file = asyncio.Queue()
+            self._places = asyncio.Semaphore(self.concurrence)
+            self._tache = asyncio.create_task(self._boucle())
+
+    async def _collecter(self):
+        lot = [await self._file.get()]
+        echeance = time.monotonic() + self.attente_max_ms / 1000.0
+
+        while len(lot) < self.taille_max:
+            restant = echeance - time.monotonic()
+            if restant <= 0:
+                break
+            try:
+                lot.append(await asyncio.wait_for(self._file.get(), restant))
+            except asyncio.TimeoutError:
+                break
+
+        return lot
+
+    def _memoire(self, groupe):
+        """Octets d'activations d'un lot (images complétées à la plus grande si padding)"""
+        if self.padding:
+            h = max(img.shape[0] for img, _ in groupe)
+            w = max(img.shape[1] for img, _ in groupe)
+            return len(groupe) * h * w * OCTETS_PAR_PIXEL
+        return sum(img.shape[0] * img.shape[1] for img, _ in groupe) * OCTETS_PAR_PIXEL
+
+    def _grouper(self, lot):
+        """
+        Returns:
+            Liste de (tuiles, demandes) : tuiles vrai pour une image seule trop grande
+        """
+        plafond = self.memoire_max_mo * 1024 * 1024
+        groupes = []
+        paquets = {}
+        for demande in lot:
+            if self.inferer_tuiles is not None and depasse_plafond(demande[0].shape[:2], self.memoire_max_mo):
+                groupes.append((True, [demande]))
+                continue
+            cle = None if self.padding else demande[0].shape
+            paquet = paquets.setdefault(cle, [])
+            if paquet and self._memoire(paquet + [demande]) > plafond:
+                groupes.append((False, paquet))
+                paquet = paquets[cle] = []
+            paquet.append(demande)
+
+        groupes.extend((False, paquet) for paquet in paquets.values())
+        return groupes
+
+    async def _executer(self, tuiles, groupe):
+        try:
+            if tuiles:
+                masques = [await self.inferer_tuiles(groupe[0][0])]
+            else:
+                masques = await self.inferer([img for img, _ in groupe])
+        except Exception as e:
+            for _, future in groupe:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), masque in zip(groupe, masques):
+            if not future.done():
+                future.set_result(masque)
+
+    async def _boucle(self):
+        en_cours = set()
+        while True:
+            lot = await self._collecter()
+
+            # Les lots sont lancés sans attendre, dans la limite de `concurrence` :
+            # plusieurs workers d'inférence traitent des lots différents en parallèle
+            for tuiles, groupe in self._grouper(lot):
+                await self._places.acquire()
+                tache = asyncio.create_task(self._executer(tuiles, groupe))
+                en_cours.add(tache)
+                tache.add_done_callback(en_cours.discard)
+                tache.add_done_callback(lambda _: self._places.release())
@@ -0,0 +1,262 @@
+"""
+Registre des modèles servis : chargement partagé, versions et rechargement à chaud
+
+Chaque artefact est enregistré avec son chemin et son chargeur. Les
+chargeurs projettent les poids en mémoire (mmap) plutôt que de les copier
+dans le tas du worker : les N workers d'un nœud partagent alors les mêmes
+pages physiques (cache de pages du noyau).
+
+- joblib : une copie non compressée, nommée d'après l'empreinte du fichier,
+  est créée une fois dans MODELES_CACHE_DOSSIER puis chargée avec
+  mmap_mode="r" (les tableaux numpy sont projetés, pas les objets Python) ;
+- torch : torch.load(mmap=True) puis load_state_dict(assign=True).
+
+Le rechargement remplace le modèle servi d'une seule affectation, une fois
+le nouveau chargé : les requêtes en cours terminent avec l'ancien. Il est
+déclenché par l'API d'administration ou par la détection d'un changement de
+fichier (vérifiée au plus toutes les MODELES_SURVEILLANCE_S secondes, lors
+des accès, dans chaque processus). En cas d'échec, l'ancien modèle reste servi.
+"""
+import hashlib
+import os
+import threading
+import time
+import traceback
+from pathlib import Path
+from dotenv import load_dotenv
+
+from . import metriques
+
+load_dotenv()
+
+# Dossier des copies non compressées des artefacts joblib (projetées en mémoire)
+MODELES_CACHE_DOSSIER = os.getenv("MODELES_CACHE_DOSSIER", ".cache_modeles")
+# Projection en mémoire des poids (0 = chargement classique, copie privée par worker)
+MODELES_MMAP = os.getenv("MODELES_MMAP", "1") == "1"
+# Intervalle de vérification des fichiers de modèles (s, 0 = pas de rechargement automatique)
+MODELES_SURVEILLANCE_S = float(os.getenv("MODELES_SURVEILLANCE_S", "30"))
+
+
+def memoire_processus():
+    """
+    Mémoire du processus courant (Mo) : RSS, PSS (pages partagées réparties
+    entre les processus qui les projettent), part partagée et part privée
+    """
+    try:
+        valeurs = {}
+        with open("/proc/self/smaps_rollup") as f:
+            for ligne in f:
+                morceaux = ligne.split()
+                if len(morceaux) == 3 and morceaux[2] == "kB":
+                    valeurs[morceaux[0].rstrip(":")] = int(morceaux[1])
+        return {
+            "rss_mo": round(valeurs["Rss"] / 1024, 1),
+            "pss_mo": round(valeurs["Pss"] / 1024, 1),
+            "partage_mo": round((valeurs.get("Shared_Clean", 0) + valeurs.get("Shared_Dirty", 0)) / 1024, 1),
+            "prive_mo": round((valeurs.get("Private_Clean", 0) + valeurs.get("Private_Dirty", 0)) / 1024, 1),
+        }
+    except (OSError, KeyError):
+        import resource
+        return {"rss_max_mo": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)}
+
+
+def empreinte_fichier(chemin):
+    """sha256 d'un fichier"""
+    empreinte = hashlib.sha256()
+    with open(chemin, "rb") as f:
+        for bloc in iter(lambda: f.read(1024 * 1024), b""):
+            empreinte.update(bloc)
+    return empreinte.hexdigest()
+
+
+def charger_joblib(chemin, sha256):
+    """
+    Charge un artefact joblib, projeté en mémoire via sa copie non compressée
+    """
+    import joblib
+    if not MODELES_MMAP:
+        return joblib.load(chemin)
+
+    dossier = Path(MODELES_CACHE_DOSSIER)
+    dossier.mkdir(parents=True, exist_ok=True)
+    copie = dossier / f"{Path(chemin).stem}-{sha256[:16]}.joblib"
+    if not copie.exists():
+        temporaire = copie.with_suffix(f".{os.getpid()}.tmp")
+        joblib.dump(joblib.load(chemin), temporaire, compress=0)
+        os.replace(temporaire, copie)
+        # Copies des versions précédentes (les processus qui les projettent gardent leur accès)
+        for ancienne in dossier.glob(f"{Path(chemin).stem}-*.joblib"):
+            if ancienne != copie:
+                ancienne.unlink(missing_ok=True)
+
+    return joblib.load(copie, mmap_mode="r")
+
+
+class _Entree:
+    def __init__(self, nom, chemin, chargeur):
+        self.nom = nom
+        self.chemin = chemin
+        self.chargeur = chargeur
+        # (objet, métadonnées) remplacés ensemble, en une affectation
+        self.courant = None
+        self.stat = None
+        # Dernière empreinte calculée : (stat, sha256)
+        self.empreinte = None
+        self.verifie_le = 0.0
+        self.erreur = None
+        self.rechargements = 0
+        self.rechargement_en_cours = False
+        self.verrou = threading.Lock()
+
+
+def _stat(chemin):
+    stat = os.stat(chemin)
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+def _empreinte(entree):
+    """(stat, sha256) du fichier, recalculé seulement si le fichier a changé"""
+    stat = _stat(entree.chemin)
+    if entree.empreinte is None or entree.empreinte[0] != stat:
+        entree.empreinte = (stat, empreinte_fichier(entree.chemin))
+    return entree.empreinte
+
+
+class RegistreModeles:
+
+    def __init__(self, surveillance_s=MODELES_SURVEILLANCE_S):
+        self.surveillance_s = surveillance_s
+        self._entrees = {}
+        # nom -> rechargement transmis aux processus qui servent le modèle
+        self._delegues = {}
+
+    def enregistrer(self, nom, chemin, chargeur):
+        """
+        Args:
+            chemin: Fichier de l'artefact
+            chargeur: Fonction (chemin, sha256) -> objet servi
+        """
+        self._entrees[nom] = _Entree(nom, chemin, chargeur)
+
+    def deleguer(self, nom, recharger):
+        """
+        Le modèle `nom` est servi par d'autres processus (pool d'inférence) :
+        un rechargement demandé ici doit être fait par eux
+
+        Args:
+            recharger: Coroutine (nom, force) -> métadonnées de chaque processus
+        """
+        self._delegues[nom] = recharger
+
+    def delegue(self, nom):
+        """Rechargement délégué du modèle `nom`, ou None s'il est servi par ce processus"""
+        return self._delegues.get(nom)
+
+    def _entree(self, nom):
+        try:
+            return self._entrees[nom]
+        except KeyError:
+            raise KeyError(f"Modèle inconnu: {nom}")
+
+    def obtenir(self, nom):
+        """Modèle servi, chargé au premier accès"""
+        entree = self._entree(nom)
+        courant = entree.courant
+        if courant is None:
+            return self.recharger(nom)["objet"]
+
+        if self.surveillance_s and time.monotonic() - entree.verifie_le > self.surveillance_s:
+            self._verifier(entree)
+        return courant[0]
+
+    def version(self, nom):
+        """Version (empreinte tronquée) du modèle servi, ou du fichier s'il n'est pas encore chargé"""
+        entree = self._entree(nom)
+        if entree.courant is not None:
+            return entree.courant[1]["version"]
+        return _empreinte(entree)[1][:16]
+
+    def _verifier(self, entree):
+        # Fichier modifié : rechargement en arrière-plan, la version actuelle reste servie
+        entree.verifie_le = time.monotonic()
+        try:
+            modifie = _stat(entree.chemin) != entree.stat
+        except OSError:
+            return
+        if modifie and not entree.rechargement_en_cours:
+            entree.rechargement_en_cours = True
+            threading.Thread(target=self._recharger_silencieux, args=(entree.nom,),
+                             name=f"rechargement-{entree.nom}", daemon=True).start()
+
+    def _recharger_silencieux(self, nom):
+        try:
+            self.recharger(nom)
+        except Exception:
+            traceback.print_exc()
+
+    def recharger(self, nom, force=False):
+        """
+        Charge le fichier courant et remplace le modèle servi s'il a changé
+
+        Raises:
+            Exception du chargeur : l'ancien modèle reste servi
+
+        Returns:
+            Métadonnées du modèle servi, et "objet"
+        """
+        entree = self._entree(nom)
+        with entree.verrou:
+            try:
+                stat, sha256 = _empreinte(entree)
+                if entree.courant is not None and not force and sha256 == entree.courant[1]["sha256"]:
+                    entree.stat = stat
+                    return {**entree.courant[1], "objet": entree.courant[0]}
+
+                memoire_avant = memoire_processus()
+                debut = time.perf_counter()
+                objet = entree.chargeur(entree.chemin, sha256)
+                metadonnees = {
+                    "chemin": str(entree.chemin),
+                    "version": sha256[:16],
+                    "sha256": sha256,
+                    "taille_octets": stat[1],
+                    "modifie_le": stat[0] / 1e9,
+                    "charge_le": time.time(),
+                    "duree_chargement_s": round(time.perf_counter() - debut, 3),
+                    "mmap": MODELES_MMAP,
+                    "memoire_avant": memoire_avant,
+                    "memoire_apres": memoire_processus(),
+                }
+                if entree.courant is not None:
+                    entree.rechargements += 1
+                    print(f"Modèle '{nom}' rechargé: {entree.courant[1]['version']} -> {metadonnees['version']}")
+                entree.courant = (objet, metadonnees)
+                entree.stat = stat
+                entree.erreur = None
+                return {**metadonnees, "objet": objet}
+
+            except Exception as e:
+                entree.erreur = str(e)
+                raise
+
+            finally:
+                entree.verifie_le = time.monotonic()
+                entree.rechargement_en_cours = False
+
+    def noms(self):
+        return list(self._entrees)
+
+    def etat(self):
+        modeles = {}
+        for nom, entree in self._entrees.items():
+            modeles[nom] = {
+                "charge": entree.courant is not None,
+                **(entree.courant[1] if entree.courant is not None else {"chemin": str(entree.chemin)}),
+                "rechargements": entree.rechargements,
+                "erreur": entree.erreur,
+            }
+        return {"memoire": memoire_processus(), "pid": os.getpid(), "modeles": modeles}
+
+
+registre = RegistreModeles()
+metriques.enregistrer("modeles", registre.etat)
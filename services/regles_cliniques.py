@@ -0,0 +1,189 @@
+"""
+Règles cliniques du score de risque (/medecin) et leur évaluation vectorisée
+
+Le score est décrit par une table déclarative : chaque règle porte sur un
+champ de PatientRisque, avec une condition, des points et un plafond
+éventuel. La table est compilée une fois en un évaluateur numpy qui score
+un lot en colonnes (un tableau par champ) en une passe, et en fonctions
+scalaires pour un patient seul ; les deux renvoient la contribution de
+chaque règle.
+
+Conditions :
+- egal / parmi : valeur égale à `valeur` / dans la liste `valeur` ;
+- inferieur / superieur : comparaison stricte au seuil `valeur` ;
+- par_unite : `points` par unité du champ (plafonné) ;
+- paliers : [(seuil, points), ...] par seuils décroissants, premier atteint ;
+- bareme : {modalité: points}, 0 pour une modalité absente.
+"""
+from typing import NamedTuple, Any
+import numpy as np
+
+MUTATIONS = ["BRCA1", "BRCA2", "Autre (TP53, PTEN, etc.)"]
+
+
+class Regle(NamedTuple):
+    nom: str
+    champ: str
+    condition: str
+    valeur: Any
+    points: float = 0.0
+    plafond: float | None = None
+
+
+REGLES = [
+    # Facteurs d'âge (0-15 points)
+    Regle("age", "age", "paliers", [(50, 15), (40, 10), (30, 5)]),
+    # Antécédents (0-35 points)
+    Regle("antecedents_familiaux", "antecedents_familiaux", "egal", "Oui", 20),
+    Regle("antecedents_personnels", "antecedents_personnels", "egal", "Oui", 15),
+    # Nombre de biopsies (0-10 points)
+    Regle("biopsies", "nombre_biopsies", "par_unite", None, 3, plafond=10),
+    # Âge des premières menstruations (0-5 points)
+    Regle("menstruations_precoces", "age_premieres_menstruations", "inferieur", 12, 5),
+    # Âge premier enfant et nombre d'enfants (0-8 points)
+    Regle("premier_enfant_tardif", "age_premier_enfant", "superieur", 30, 5),
+    Regle("nulliparite", "nombre_enfants", "egal", 0, 3),
+    # Statuts hormonaux (0-12 points)
+    Regle("statut_er", "statut_er", "egal", "Positif", 4),
+    Regle("statut_pr", "statut_pr", "egal", "Positif", 4),
+    Regle("expression_her2", "expression_her2", "egal", "Positif", 4),
+    # Densité mammaire (0-8 points), libellés BI-RADS ou lettre seule
+    Regle("densite_mammaire", "densite_mammaire", "bareme", {
+        "a (presque entièrement graisseuse)": 0, "A": 0,
+        "b (densité fibroglandulaire dispersée)": 2, "B": 2,
+        "c (densité hétérogène)": 5, "C": 5,
+        "d (extrêmement dense)": 8, "D": 8,
+    }),
+    # Mutation génétique (0-25 points - facteur majeur)
+    Regle("mutation_genetique", "mutation_genetique", "parmi", MUTATIONS, 25),
+    # Facteurs de style de vie (0-10 points)
+    Regle("imc", "imc", "superieur", 30, 3),
+    Regle("tabagisme", "tabagisme", "egal", "Fumeur", 3),
+    Regle("consommation_alcool", "consommation_alcool", "parmi",
+          ["Modérée (1-7 verres/semaine)", "Élevée (>7 verres/semaine)"], 2),
+    Regle("activite_physique", "activite_physique", "bareme", {
+        "Intense (>300 min/semaine)": 0,
+        "Modérée (150-300 min/semaine)": 0,
+        "Légère (<150 min/semaine)": 1,
+        "Sédentaire": 2,
+    }),
+]
+
+SCORE_MAX = 100
+
+# Catégories : (borne supérieure exclue, catégorie), la dernière sans borne
+CATEGORIES = [(25, "faible"), (50, "modere"), (75, "eleve"), (None, "tres eleve")]
+
+
+def _compiler(regle):
+    """
+    Returns:
+        (fonction colonne -> points float64, fonction valeur -> points) d'une règle
+    """
+    condition, valeur, points = regle.condition, regle.valeur, float(regle.points)
+
+    if condition == "egal":
+        return (lambda colonne: np.where(colonne == valeur, points, 0.0),
+                lambda v: points if v == valeur else 0.0)
+    if condition == "parmi":
+        modalites = set(valeur)
+        return (lambda colonne: np.where(np.isin(colonne, valeur), points, 0.0),
+                lambda v: points if v in modalites else 0.0)
+    if condition == "inferieur":
+        return (lambda colonne: np.where(colonne.astype(np.float64) < valeur, points, 0.0),
+                lambda v: points if v < valeur else 0.0)
+    if condition == "superieur":
+        return (lambda colonne: np.where(colonne.astype(np.float64) > valeur, points, 0.0),
+                lambda v: points if v > valeur else 0.0)
+    if condition == "par_unite":
+        return (lambda colonne: colonne.astype(np.float64) * points,
+                lambda v: v * points)
+    if condition == "paliers":
+        seuils = [seuil for seuil, _ in valeur]
+        valeurs = [float(p) for _, p in valeur]
+
+        def paliers(v):
+            for seuil, p in zip(seuils, valeurs):
+                if v >= seuil:
+                    return p
+            return 0.0
+        return (lambda colonne: np.select([colonne.astype(np.float64) >= seuil for seuil in seuils], valeurs, 0.0),
+                paliers)
+    if condition == "bareme":
+        non_nuls = {modalite: float(p) for modalite, p in valeur.items() if p}
+
+        def bareme(colonne):
+            # Une comparaison par modalité qui rapporte des points (plus rapide
+            # qu'un tri des chaînes du lot)
+            resultat = np.zeros(len(colonne), dtype=np.float64)
+            for modalite, p in non_nuls.items():
+                resultat[colonne == modalite] = p
+            return resultat
+        return bareme, lambda v: non_nuls.get(v, 0.0)
+
+    raise ValueError(f"Condition inconnue pour la règle {regle.nom}: {condition}")
+
+
+class MoteurRegles:
+    """
+    Évaluateur compilé d'une table de règles
+
+    Args:
+        regles: Liste de Regle
+        score_max: Plafond du score total
+    """
+
+    def __init__(self, regles=REGLES, score_max=SCORE_MAX, categories=CATEGORIES):
+        self.regles = list(regles)
+        self.noms = [regle.nom for regle in self.regles]
+        self.champs = sorted({regle.champ for regle in self.regles})
+        self.score_max = score_max
+        compilees = [_compiler(regle) for regle in self.regles]
+        self._fonctions = [vectorielle for vectorielle, _ in compilees]
+        self._scalaires = [
+            (regle.champ, scalaire, np.inf if regle.plafond is None else regle.plafond)
+            for regle, (_, scalaire) in zip(self.regles, compilees)
+        ]
+        self._plafonds = np.array(
+            [np.inf if regle.plafond is None else regle.plafond for regle in self.regles], dtype=np.float64
+        )
+        self._bornes = np.array([borne for borne, _ in categories if borne is not None], dtype=np.float64)
+        self._categories = np.array([categorie for _, categorie in categories], dtype=object)
+
+    def evaluer(self, colonnes):
+        """
+        Args:
+            colonnes: {champ: séquence de valeurs}, une valeur par patient
+
+        Returns:
+            (scores (n,), contributions (n, nb_regles)), en points
+        """
+        tableaux = {champ: np.asarray(colonnes[champ]) for champ in self.champs}
+        n = len(tableaux[self.champs[0]])
+        contributions = np.empty((n, len(self.regles)), dtype=np.float64)
+        for j, (regle, fonction) in enumerate(zip(self.regles, self._fonctions)):
+            contributions[:, j] = fonction(tableaux[regle.champ])
+        np.minimum(contributions, self._plafonds, out=contributions)
+        scores = np.minimum(contributions.sum(axis=1), self.score_max)
+        return scores, contributions
+
+    def categories(self, scores):
+        """Catégorie de risque de chaque score"""
+        return self._categories[np.searchsorted(self._bornes, scores, side="right")]
+
+    def evaluer_patient(self, data):
+        """
+        Même table évaluée sur les valeurs Python d'un seul PatientRisque
+        (un lot d'une ligne paierait le coût fixe des appels numpy)
+
+        Returns:
+            (score, {règle: points})
+        """
+        contributions = {
+            nom: float(min(fonction(getattr(data, champ)), plafond))
+            for nom, (champ, fonction, plafond) in zip(self.noms, self._scalaires)
+        }
+        return float(min(sum(contributions.values()), self.score_max)), contributions
+
+
+moteur = MoteurRegles()
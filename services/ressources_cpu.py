@@ -0,0 +1,135 @@
+"""
+Répartition des cœurs CPU entre les workers uvicorn d'un même nœud
+
+`configurer` doit être appelé au démarrage du worker, avant l'import de
+numpy/torch : il réserve un emplacement (index du worker), calcule le
+budget de threads, fixe les variables OMP/MKL/OpenBLAS, limite les pools
+BLAS (threadpoolctl) et épingle éventuellement le processus sur ses cœurs.
+`appliquer_torch` applique ensuite le budget aux threads intra/inter-op de torch.
+"""
+import os
+from pathlib import Path
+from dotenv import load_dotenv
+
+from . import metriques
+
+load_dotenv()
+
+# Nombre de workers uvicorn sur le nœud
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", os.getenv("WEB_CONCURRENCY", "1")))
+# Nombre de cœurs à partager (0 = tous les cœurs autorisés pour le processus)
+CPU_COEURS = int(os.getenv("CPU_COEURS", "0"))
+# Threads inter-op torch par worker
+CPU_INTEROP_THREADS = int(os.getenv("CPU_INTEROP_THREADS", "1"))
+# Threads BLAS (numpy/sklearn) par worker (0 = budget du worker)
+CPU_BLAS_THREADS = int(os.getenv("CPU_BLAS_THREADS", "0"))
+# Épingler chaque worker sur ses cœurs
+CPU_PINNING = os.getenv("CPU_PINNING", "0") == "1"
+# Dossier des verrous servant à attribuer un index à chaque worker
+CPU_SLOTS_DOSSIER = os.getenv("CPU_SLOTS_DOSSIER", "/tmp/cancer_cpu_slots")
+
+VARIABLES_THREADS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "NUMEXPR_NUM_THREADS")
+
+_configuration = None
+_fichier_slot = None
+
+
+def _reserver_slot(nb_workers):
+    """
+    Index du worker : premier verrou libre parmi nb_workers, gardé tant que le processus vit
+    """
+    global _fichier_slot
+    try:
+        import fcntl
+    except ImportError:
+        return os.getpid() % nb_workers
+
+    dossier = Path(CPU_SLOTS_DOSSIER)
+    dossier.mkdir(parents=True, exist_ok=True)
+    for index in range(nb_workers):
+        fichier = open(dossier / f"slot-{index}.lock", "w")
+        try:
+            fcntl.flock(fichier, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            fichier.close()
+            continue
+        _fichier_slot = fichier
+        return index
+
+    return os.getpid() % nb_workers
+
+
+def repartir_coeurs(coeurs, nb_workers, index):
+    """Cœurs attribués au worker `index` (partage circulaire s'il y a moins de cœurs que de workers)"""
+    if len(coeurs) < nb_workers:
+        return [coeurs[index % len(coeurs)]]
+    par_worker = len(coeurs) // nb_workers
+    return coeurs[index * par_worker:(index + 1) * par_worker]
+
+
+def configurer(nb_workers=CPU_WORKERS, nb_coeurs=CPU_COEURS, pinning=CPU_PINNING):
+    """
+    Calcule et applique le budget CPU du worker courant (idempotent)
+    """
+    global _configuration
+    if _configuration is not None:
+        return _configuration
+
+    disponibles = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(os.cpu_count() or 1))
+    if nb_coeurs > 0:
+        disponibles = disponibles[:nb_coeurs]
+
+    nb_workers = max(1, nb_workers)
+    index = _reserver_slot(nb_workers) if nb_workers > 1 else 0
+    coeurs = repartir_coeurs(disponibles, nb_workers, index)
+    threads = len(coeurs)
+    blas = CPU_BLAS_THREADS or threads
+
+    for variable in VARIABLES_THREADS:
+        os.environ[variable] = str(blas if variable != "OMP_NUM_THREADS" else threads)
+
+    if pinning and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, coeurs)
+
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(limits=blas)
+    except ImportError:
+        pass
+
+    _configuration = {
+        "worker": index,
+        "nb_workers": nb_workers,
+        "coeurs": coeurs if pinning else None,
+        "threads_intra_op": threads,
+        "threads_inter_op": CPU_INTEROP_THREADS,
+        "threads_blas": blas,
+        "pinning": pinning,
+    }
+    print(f"Budget CPU du worker {index}/{nb_workers}: {threads} thread(s), cœurs {coeurs if pinning else 'non épinglés'}")
+    return _configuration
+
+
+def appliquer_torch(torch):
+    """
+    Applique le budget de threads à torch (appelé juste après son import)
+
+    Sans `configurer` préalable (ex. processus d'inférence lancés par spawn),
+    le budget hérité via OMP_NUM_THREADS est utilisé.
+    """
+    if _configuration is not None:
+        threads = _configuration["threads_intra_op"]
+    elif os.getenv("OMP_NUM_THREADS"):
+        threads = int(os.environ["OMP_NUM_THREADS"])
+    else:
+        return
+
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(CPU_INTEROP_THREADS)
+    except RuntimeError:
+        # Déjà fixé, ou du travail parallèle a déjà commencé dans ce processus
+        pass
+
+
+metriques.enregistrer("cpu", lambda: _configuration or {})
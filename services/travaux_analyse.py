@@ -0,0 +1,237 @@
+"""
+Analyses asynchrones : soumission d'une image, suivi par polling ou SSE
+
+POST /analyse/jobs enregistre l'image dans la file et répond tout de suite
+avec l'identifiant du travail ; des workers asyncio locaux vident la file et
+publient l'étape, la progression puis le résultat (format compact ou JSON).
+"""
+import asyncio
+import json
+import os
+import uuid
+from dotenv import load_dotenv
+from fastapi import UploadFile, HTTPException
+
+from . import imagerie_service as im
+from . import metriques
+from .executeur_inference import executeur
+from .file_travaux import creer_backend, EN_ATTENTE, EN_COURS, TERMINE, ERREUR, ETATS_FINAUX
+
+load_dotenv()
+
+# Backend de la file : sqlite (partagé entre workers, persistant) ou memoire
+JOBS_BACKEND = os.getenv("ANALYSE_JOBS_BACKEND", "sqlite")
+JOBS_SQLITE = os.getenv("ANALYSE_JOBS_SQLITE", "analyse_jobs.db")
+# Analyses traitées en parallèle par worker uvicorn
+JOBS_WORKERS = int(os.getenv("ANALYSE_JOBS_WORKERS", "2"))
+# Travaux en attente ou en cours au-delà desquels les soumissions sont refusées (503)
+JOBS_FILE_MAX = int(os.getenv("ANALYSE_JOBS_FILE_MAX", "100"))
+# Durée de conservation des travaux terminés (s) et période du nettoyage
+JOBS_RETENTION_S = int(os.getenv("ANALYSE_JOBS_RETENTION_S", "3600"))
+JOBS_NETTOYAGE_S = int(os.getenv("ANALYSE_JOBS_NETTOYAGE_S", "60"))
+# Un travail en cours sans nouvelle depuis ce délai (worker arrêté) est remis en attente
+JOBS_BAIL_S = int(os.getenv("ANALYSE_JOBS_BAIL_S", "600"))
+# Attributions d'un travail avant son abandon (un travail qui fait tomber son worker n'est pas relancé indéfiniment)
+JOBS_TENTATIVES_MAX = int(os.getenv("ANALYSE_JOBS_TENTATIVES_MAX", "3"))
+# Intervalle de scrutation de la file partagée et des flux SSE (s)
+JOBS_SCRUTATION_S = float(os.getenv("ANALYSE_JOBS_SCRUTATION_S", "0.5"))
+SSE_PING_S = 15
+
+
+class TravauxAnalyse:
+    """
+    File de travaux d'analyse et pool de workers locaux
+
+    Les workers d'un processus sont réveillés immédiatement à chaque
+    soumission locale ; les travaux soumis à un autre worker uvicorn (file
+    SQLite partagée) sont découverts par scrutation.
+    """
+
+    def __init__(self, backend=JOBS_BACKEND, chemin=JOBS_SQLITE, workers=JOBS_WORKERS,
+                 file_max=JOBS_FILE_MAX, retention_s=JOBS_RETENTION_S):
+        self.nom_backend = backend
+        self.chemin = chemin
+        self.workers = max(1, workers)
+        self.file_max = file_max
+        self.retention_s = retention_s
+        self.backend = None
+        self.soumis = 0
+        self.termines = 0
+        self.echecs = 0
+        self._taches = []
+        self._nouveau = None
+        self._changements = {}
+
+    async def demarrer(self):
+        if self._taches:
+            return
+        self.backend = creer_backend(self.nom_backend, self.chemin)
+        self._nouveau = asyncio.Event()
+        self._taches = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._taches.append(asyncio.create_task(self._nettoyage()))
+
+    async def arreter(self):
+        for tache in self._taches:
+            tache.cancel()
+        await asyncio.gather(*self._taches, return_exceptions=True)
+        self._taches = []
+
+    def _signaler(self, travail_id):
+        # Réveille les flux SSE de ce processus qui suivent le travail
+        for evenement in self._changements.get(travail_id, ()):
+            evenement.set()
+
+    async def soumettre(self, image: UploadFile, format_reponse=im.FORMAT_COMPACT, masque="rle",
+                        threshold=0.5, min_area=50, mode=None):
+        """
+        Enregistre l'image dans la file et retourne le travail créé
+        """
+        im.verifier_extension(image)
+        await self.demarrer()
+
+        if await executeur.executer(self.backend.compter_en_attente) >= self.file_max:
+            raise HTTPException(
+                status_code=503,
+                detail="File d'analyse pleine, veuillez réessayer",
+                headers={"Retry-After": "5"},
+            )
+
+        # Le multipart n'a pas de sens pour un résultat stocké : compact à la place
+        if format_reponse == im.FORMAT_MULTIPART:
+            format_reponse = im.FORMAT_COMPACT
+
+        donnees = await executeur.executer(im.lire_octets_fichier, image)
+        travail_id = uuid.uuid4().hex
+        parametres = {"format": format_reponse, "masque": masque, "threshold": threshold, "min_area": min_area,
+                      "mode": im.choisir_mode(mode)}
+        await executeur.executer(self.backend.ajouter, travail_id, image.filename, donnees, parametres)
+        self.soumis += 1
+        self._nouveau.set()
+
+        return {
+            "job_id": travail_id,
+            "etat": EN_ATTENTE,
+            "url": f"/analyse/jobs/{travail_id}",
+            "evenements_url": f"/analyse/jobs/{travail_id}/events",
+        }
+
+    async def obtenir(self, travail_id):
+        if self.backend is None:
+            await self.demarrer()
+        travail = await executeur.executer(self.backend.obtenir, travail_id)
+        if travail is None:
+            raise HTTPException(status_code=404, detail="Travail introuvable ou expiré")
+        travail.pop("parametres", None)
+        return travail
+
+    async def _mettre_a_jour(self, travail_id, **champs):
+        await executeur.executer(self.backend.mettre_a_jour, travail_id, **champs)
+        self._signaler(travail_id)
+
+    async def _worker(self):
+        while True:
+            prise = await executeur.executer(self.backend.prendre)
+            if prise is None:
+                self._nouveau.clear()
+                try:
+                    await asyncio.wait_for(self._nouveau.wait(), JOBS_SCRUTATION_S)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            travail, donnees = prise
+            await self._traiter(travail, donnees)
+
+    async def _traiter(self, travail, donnees):
+        travail_id = travail["job_id"]
+        parametres = travail["parametres"]
+
+        async def progression(etape, pourcentage):
+            await self._mettre_a_jour(travail_id, etat=EN_COURS, etape=etape, progression=pourcentage)
+
+        try:
+            await progression("decodage", 5)
+            img = await executeur.executer(im.decoder_octets, donnees, travail["filename"])
+            del donnees
+
+            mask_bin, detections_info = await im.analyser_image(
+                img, parametres["threshold"], parametres["min_area"], progression,
+                parametres.get("mode", im.MODE_COMPLET)
+            )
+            await progression("mise_en_forme", 90)
+            resultat = await im.formater_reponse(
+                travail["filename"], img, mask_bin, detections_info, parametres["format"], parametres["masque"]
+            )
+            await self._mettre_a_jour(travail_id, etat=TERMINE, etape=None, progression=100, resultat=resultat)
+            self.termines += 1
+
+        except asyncio.CancelledError:
+            raise
+
+        except Exception as e:
+            detail = e.detail if isinstance(e, HTTPException) else str(e)
+            await self._mettre_a_jour(travail_id, etat=ERREUR, etape=None, erreur=f"Erreur lors de l'analyse: {detail}")
+            self.echecs += 1
+
+    async def _nettoyage(self):
+        while True:
+            await asyncio.sleep(JOBS_NETTOYAGE_S)
+            try:
+                supprimes = await executeur.executer(self.backend.nettoyer, self.retention_s, JOBS_BAIL_S,
+                                                     JOBS_TENTATIVES_MAX)
+                if supprimes:
+                    print(f"{supprimes} travail(aux) d'analyse expiré(s) supprimé(s)")
+            except Exception as e:
+                print(f"Échec du nettoyage des travaux d'analyse: {e}")
+
+    async def evenements(self, travail_id):
+        """
+        Flux SSE : un événement `progression` à chaque changement d'étape,
+        puis `resultat` ou `erreur`, et la fin du flux
+        """
+        dernier = None
+        evenement = asyncio.Event()
+        self._changements.setdefault(travail_id, set()).add(evenement)
+        attente = 0.0
+        try:
+            while True:
+                travail = await self.obtenir(travail_id)
+                etat = (travail["etat"], travail["etape"], travail["progression"])
+
+                if travail["etat"] in ETATS_FINAUX:
+                    nom = "resultat" if travail["etat"] == TERMINE else "erreur"
+                    yield f"event: {nom}\ndata: {json.dumps(travail)}\n\n"
+                    return
+
+                if etat != dernier:
+                    dernier = etat
+                    attente = 0.0
+                    donnees = {"job_id": travail_id, "etat": etat[0], "etape": etat[1], "progression": etat[2]}
+                    yield f"event: progression\ndata: {json.dumps(donnees)}\n\n"
+                elif attente >= SSE_PING_S:
+                    attente = 0.0
+                    yield ": ping\n\n"
+
+                evenement.clear()
+                try:
+                    await asyncio.wait_for(evenement.wait(), JOBS_SCRUTATION_S)
+                except asyncio.TimeoutError:
+                    attente += JOBS_SCRUTATION_S
+        finally:
+            abonnes = self._changements.get(travail_id, set())
+            abonnes.discard(evenement)
+            if not abonnes:
+                self._changements.pop(travail_id, None)
+
+    def statistiques(self):
+        return {
+            "backend": self.nom_backend,
+            "workers": self.workers,
+            "soumis": self.soumis,
+            "termines": self.termines,
+            "echecs": self.echecs,
+        }
+
+
+travaux = TravauxAnalyse()
+metriques.enregistrer("travaux_analyse", travaux.statistiques)
